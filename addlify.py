@@ -1,7 +1,16 @@
 import requests
 import json
-from bs4 import BeautifulSoup
+import logging
 import re
+import threading
+import time
+from instrumentation import METRICS
+from lazy_imports import lazy_import
+
+bs4 = lazy_import("bs4") # only the quote pages need parsing
+lxml_html = lazy_import("lxml.html") # and the order pages
+
+logger = logging.getLogger(__name__)
 
 class Addlify(requests.Session):
     """
@@ -11,6 +20,7 @@ class Addlify(requests.Session):
     
     TODO, the returns of functions have not been standardised. It is usually the response, but for specific calls might be data or even a success bool.
     """
+    STORE_URL = r"https://store.omron.com.au" # every URL below starts with this, see `base_url` in `__init__`
     URL_LIST_BACKEND_USERS = r"https://store.omron.com.au/backend-portal/users" # GET
     URL_LIST_CUSTOMERS = r"https://store.omron.com.au/backend-portal/customers/all-customer-data" # GET
     URL_GET_COMPANY = r'https://store.omron.com.au/backend-portal/customers/companies/{company_id}' # GET
@@ -51,8 +61,10 @@ class Addlify(requests.Session):
         Returns:
             tuple: A tuple containing a boolean indicating the success of the login operation and the response object.
         """
+        self._login_generation += 1  # see `.request`
         # no special headers needed, nothing sneaky required either
-        r = self.post(Addlify.URL_LOGIN, data={"emailAddress": emailAddress, "password": password})
+        # go straight to the session's post, the instance one is wrapped with the login check
+        r = requests.Session.post(self, Addlify.URL_LOGIN, data={"emailAddress": emailAddress, "password": password})
         # {'message': 'Invalid email address or password'}
         if r.status_code == 200 and r.text:
             try:
@@ -77,7 +89,7 @@ class Addlify(requests.Session):
             start_date (str): The start date of the order details to be retrieved.
             end_date (str): The end date of the order details to be retrieved.
         Returns:
-            dict: A dictionary containing the order details for a given date range.
+            response: The raw response, its JSON lists the orders (see `parse_order_list`).
         """
 
         # Format the URL correctly
@@ -86,13 +98,74 @@ class Addlify(requests.Session):
         # response.raise_for_status()  # Optional: Raises an error for bad responses
         return response
 
+    @staticmethod
+    def _looks_logged_out(response) -> bool:
+        """
+        Whether a response suggests the session cookie has expired, i.e. a 401 or a redirect to the login page. A 403
+        is a permission the user lacks, which logging in again doesn't change.
+        """
+        if response.status_code == 401:
+            return True
+        return bool(response.history) and "/auth/login" in str(response.url)
+
+    def request(self, method, url, *args, **kwargs):
+        """
+        Every GET/POST/PUT/DELETE ends up here. If the store has expired our session the request is retried once
+        after logging in again with the credentials given at construction, so long lived sessions keep working.
+        When a `recorder` was given, each request is also added to it.
+
+        The session is shared by browser tabs, jobs and thread pools, so many requests notice an expiry at once: the
+        login generation they started in tells the first one through the lock to log in and the others to just retry.
+        """
+        generation = self._login_generation
+        response = self._send(method, url, *args, **kwargs)
+        if self._credentials and url != Addlify.URL_LOGIN and self._looks_logged_out(response):
+            with self._login_lock:
+                if generation == self._login_generation:
+                    logger.info("Addlify session looks to have expired, logging in again.")
+                    self.login(*self._credentials)
+            if self.logged_in:
+                response = self._send(method, url, *args, **kwargs)
+        return response
+
+    def _send(self, method, url, *args, **kwargs):
+        # time every request per endpoint, and keep it in the recorder if there is one
+        template = url_template(url)
+        if self.base_url and url.startswith(Addlify.STORE_URL):
+            url = self.base_url + url[len(Addlify.STORE_URL):]
+        self.last_request = time.time()  # the session registry keeps sessions in use
+        start = time.perf_counter()
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except Exception as e:
+            elapsed = time.perf_counter() - start
+            METRICS.observe("addlify_request", elapsed, error=True, method=method.upper(), endpoint=template)
+            if self.recorder is not None:
+                self.recorder.record(method, url, template, None, 0, elapsed,
+                                     request_body=self._recordable_body(template, kwargs), error=repr(e))
+            raise
+        elapsed = time.perf_counter() - start
+        nbytes = len(response.content)
+        METRICS.observe("addlify_request", elapsed, nbytes=nbytes, error=response.status_code >= 400,
+                        method=method.upper(), endpoint=template)
+        if self.recorder is not None:
+            self.recorder.record(method, url, template, response.status_code, nbytes, elapsed,
+                                 request_body=self._recordable_body(template, kwargs), response_body=response.content)
+        return response
+
+    @staticmethod
+    def _recordable_body(template, kwargs):
+        # never keep a password in the debug buffer: `template` is from the url before `base_url` rewrote it
+        body = kwargs.get('json') or kwargs.get('data')
+        if template == Addlify.URL_LOGIN or _mentions_password(body):
+            return None
+        return body
+
     def require_login(self, method: callable):
         """
         A decorator to ensure that methods are executed only if the user is logged in.
         This method checks whether the user is logged in before proceeding. If the user 
-        is not logged in, it sets `self.response` to None and prints a message indicating 
-        that login is required. If the user is logged in, it executes the given method 
-        and stores the response in `self.response`.
+        is not logged in, it prints a message indicating that login is required and returns None.
 
         Args:
             method (callable): The method to be executed if the user is logged in.
@@ -103,32 +176,12 @@ class Addlify(requests.Session):
         def wrapper(*args, **kwargs):
             if not self.logged_in:
                 print("Not logged in. Please log in again / first.")
-                self.response = None
                 return None
-            self.response = method(*args, **kwargs)
-            return self.response
-        return wrapper
-
-    def cache_post_data(self, func):
-        """
-        A decorator to cache the data sent with a POST request.
-
-        Args:
-            func (function): The original POST function to be decorated.
-
-        Returns:
-            function: The decorated function that caches the POST data.
-        """
-        def wrapper(*args, **kwargs):
-            self.post_data = kwargs.get('data', {})
-            if not self.post_data:
-                # try json
-                self.post_data = kwargs.get('json', {})
-            return func(*args, **kwargs)
+            return method(*args, **kwargs)
         return wrapper
 
 
-    def __init__(self, email:str, password:str):
+    def __init__(self, email:str, password:str, recorder=None, base_url:str=None):
         """
         Initializes an Addlify session and attempts to log in with the provided email and password. 
         This method also decorates standard HTTP methods with a login check.
@@ -136,31 +189,34 @@ class Addlify(requests.Session):
         Args:
             email (str): The email address to log into Amplify.
             password (str): The password associated with the email to log into Amplify.
+            recorder (RequestRecorder, optional): A `request_recorder.RequestRecorder` to keep a bounded
+                history of requests in, for debugging. Nothing is kept if not given.
+            base_url (str, optional): Send requests here instead of `STORE_URL`, e.g. the local fake store in
+                `fake_backends` for benchmarking.
         """
         super().__init__()
         self.logged_in = None # bool for whether logged in or not
+        self.email = email # who the session is logged in as
+        self._credentials = None # kept so an expired session can log itself back in, see `.request`
+        self._login_lock = threading.Lock()
+        self._login_generation = 0
+        self.last_request = None # time of the last request sent, see `session_registry`
+        self.recorder = recorder
+        self.base_url = base_url.rstrip("/") if base_url else None
         
-        # cached data, mostly for deugging 
-        self.response = None # any request will replace this with the recieved response
-        self.post_data = None # any post request will replace this with the data sent
-        self.cache = {} # a bad practice, unstructured storing information as i go incase of failure and for debug
+        self.series_models = None # progress of `.get_all_model_ids`, so an interrupted crawl can carry on
         self.companies = None # the list of known company ids - store it since to call repetitively takes 20 seconds per each
         
         # log in 
         self.logged_in = self.login(email, password)
+        if self.logged_in:
+            self._credentials = (email, password)
         
         # Decorate the standard methods with the login check
         for method_name in ['get', 'post', 'put', 'delete']: #, 'head', 'options', 'patch']:
             original_method = getattr(self, method_name)
             decorated_method = self.require_login(original_method)
             setattr(self, method_name, decorated_method)
-        print("Use `.response` to view the last response (GET, POST, PUT, DELETE).")
-        
-        # Decorate the post request again
-        original_method = getattr(self, 'post')
-        decorated_method = self.cache_post_data(original_method)
-        setattr(self, 'post', decorated_method)
-        print("Use `.post_data` to view the data or json sent in the last POST.")
     
     
     def get_company_url(self, company_id):
@@ -291,7 +347,7 @@ class Addlify(requests.Session):
         print("This call can take up to 30 seconds, sorry!") 
         response = self.get(Addlify.URL_LIST_CUSTOMERS)
 
-        self.companies = response.json()['customerData']['allCustomers']['dataSource']
+        self.companies = parse_company_list(response.json())
         print(f"Found {len(self.companies)} companies.")
         return self.companies
         
@@ -308,46 +364,9 @@ class Addlify(requests.Session):
         Returns:
             dict: A dictionary with field names as keys and field values as values.
         """
-        # Construct the URL using the provided order ID.
         url = self.URL_GET_ORDER_DETAILS_ID.format(order_id=orderId)
-        
-        # Use a header with a User-Agent in case the site needs it.
-        # headers = {
-        #     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 " +
-        #                   "(KHTML, like Gecko) Chrome/90.0.4430.93 Safari/537.36",
-        #     "Accept": "text/html"
-        # }
-        
         response = self.get(url)
-        # Uncomment next line if you want to raise an error for a bad response
-        # response.raise_for_status()
-        
-        # Debug: print out part of the HTML to ensure you’ve received the expected page.
-        # print(response.text[:1000])
-        
-        html_content = response.text
-        # Sometimes using a different parser helps with badly formatted HTML.
-        soup = BeautifulSoup(html_content, "html.parser")
-        
-        # Option A: Using a CSS selector scoped to the container that holds the fields.
-        fields = {}
-        for header in soup.select("div.display-fields-container h6"):
-            key = header.get_text(strip=True)
-            # Try to locate the following <p> tag.
-            value_tag = header.find_next("p")
-            value = value_tag.get_text(strip=True) if value_tag else ""
-            fields[key] = value
-        
-        # Option B (alternative): If above still returns {} try removing the container filter.
-        # Uncomment these lines to test:
-        # fields = {}
-        # for header in soup.find_all("h6"):
-        #     key = header.get_text(strip=True)
-        #     value_tag = header.find_next("p")
-        #     value = value_tag.get_text(strip=True) if value_tag else ""
-        #     fields[key] = value
-        
-        return fields
+        return parse_order_page(response.text)
 
     def get_company_info(self, company_id:str):
         """
@@ -359,39 +378,10 @@ class Addlify(requests.Session):
         Returns:
             dict: A dictionary containing parsed company information extracted from the webpage.
         """
-        def _get_let_lines(response):
-            # get all the "let" variables defined in the script of the page
-            page_lines = [r.strip() for r in response.text.split("\n")]
-            start_ind = None
-            for i, l in enumerate(page_lines):
-                if l.startswith("<script>"):
-                    if page_lines[i+1].startswith("let "):
-                        start_ind = i+1
-                if start_ind:
-                    if l.startswith('</script>'):
-                        end_ind = i-1
-            if start_ind:
-                return page_lines[start_ind:end_ind]
-            return []
-
-        def _extract_data_from_let_lines(let_lines):
-            # turn the let lines into actual data that we can use
-            data = {}
-            for l in let_lines:
-                name_plus, var_plus = l.split(" = ", maxsplit=1)
-                name = name_plus.removeprefix("let ")
-                var_str = var_plus.removesuffix(";")
-                try:
-                    data[name] = json.loads(var_str)
-                except:
-                    data[name] = var_str
-            return data
         # get the company and extract the data into a dict
         url = self.get_company_url(company_id)
         response = self.get(url)
-        let_lines = _get_let_lines(response)
-        data = _extract_data_from_let_lines(let_lines)
-        return data
+        return parse_company_page(response.text)
     
 
     def delete_contact(self, company_id:str, contact_id:str):
@@ -599,12 +589,9 @@ class Addlify(requests.Session):
             get_company_info to find this.
         """
         # create the new url
-        example_date = "2024-09-08"
-        assert len(expiry_date) == len(example_date), f'Expiry date must be in the format yyyy-mm-dd e.g. {example_date}'
         new_quote_url = Addlify.URL_NEW_QUOTE.format(company_id=company_id)
         # request the site so it looks like youa re starting form the quote page
-        quote_info = {"projectId":project_id, "expiryDate":expiry_date, "title":title, 
-                      "customerContactId":customer_contact_id, "isSpr":is_SPR, "description":description}
+        quote_info = new_quote_payload(title, expiry_date, customer_contact_id, is_SPR, description, project_id)
         headers = {'Content-Type': 'application/json'}
         response = self.post(new_quote_url, json=quote_info, headers=headers) 
         return response
@@ -670,37 +657,10 @@ class Addlify(requests.Session):
         Returns:
             dict: the quote information.
         """
-        def _get_quote_body(response):
-            # extract the quote information from the response text
-            lines = [n.strip() for n in response.text.split("\n")]
-            # get the correct line
-            search_term = "var activeQuoteBody = "
-            for l in lines:
-                if l.startswith(search_term):
-                    break
-            # extract as data
-            l = l.split(search_term)[-1][:-1]
-            return json.loads(l)
-        
-        def _get_quote_participants(soup):
-            # extract participants
-            vars = Addlify.extract_script_vars(soup, ["var participants", "var customerContactDataSource"])
-            return vars
-
-        def _get_main_quote_data(soup):
-            # extract main quote info
-            vars = Addlify.extract_script_vars(soup, ['quote = {"id"'])
-            return vars
-        
         # request the url and get the data out of it
         quote_url = self.get_quote_url(company_id, quote_id)
         response = self.get(quote_url)
-        quote_info = _get_quote_body(response)
-        # update with additional quote info
-        soup = BeautifulSoup(response.text, 'lxml')
-        quote_info.update(_get_quote_participants(soup))
-        quote_info.update(_get_main_quote_data(soup))
-        return quote_info
+        return parse_quote_page(response.text)
     
 
     def _update_quote_line_item(self, company_id, quote_id, section_id, line_id, price, quantity, min_quantity):
@@ -714,6 +674,61 @@ class Addlify(requests.Session):
         return order_response
 
 
+    def new_quote_line_item(self, company_id, quote_id, section_id, model_id, price):
+        """
+        Creates a line item for a product on a quote, without setting its quantities (see `.add_item_to_quote`).
+
+        Args:
+            company_id (str): The unique identifier of the company.
+            quote_id (str): The unique identifier of the quote.
+            section_id (str): The section within the quote to add to.
+            model_id (str): The product's model id (this is NOT the sku or model number).
+            price (float): The special price.
+
+        Returns:
+            response: The response to creating the line, its JSON holds the new line's "id".
+        """
+        section_url = Addlify.URL_ADD_ITEM_TO_QUOTE_SECTION.format(company_id=company_id, quote_id=quote_id, section_id=section_id)
+        model_data = {'modelId':model_id, 'pricePerUnit':price}
+        return self.post(section_url, json=model_data, headers={'Content-Type':'application/json'})
+
+
+    def update_quote_line_item(self, company_id, quote_id, section_id, line_id, price, quantity, min_quantity):
+        """
+        Sets the price and quantities of a line already on a quote, e.g. one whose update failed in `.add_item_to_quote`.
+
+        Args:
+            company_id (str): The unique identifier of the company.
+            quote_id (str): The unique identifier of the quote.
+            section_id (str): The section the line is in.
+            line_id (str): The line id (from the response to adding the item).
+            price (float): The special price.
+            quantity (int): The number to buy.
+            min_quantity (int): The minimum number to buy.
+
+        Returns:
+            response: The response to the update.
+        """
+        return self._update_quote_line_item(company_id, quote_id, section_id, line_id, price, quantity, min_quantity)
+
+
+    def delete_quote_line_item(self, company_id, quote_id, section_id, line_id):
+        """
+        Removes a line from a quote.
+
+        Args:
+            company_id (str): The unique identifier of the company.
+            quote_id (str): The unique identifier of the quote.
+            section_id (str): The section the line is in.
+            line_id (str): The line id (e.g. from the section's "lineItems" in `.get_quote_info`).
+
+        Returns:
+            response: The response to the delete.
+        """
+        url = Addlify.URL_DELETE_QUOTED_ITEM.format(company_id=company_id, quote_id=quote_id, section_id=section_id, line_id=line_id)
+        return self.delete(url)
+
+
     def add_item_to_quote(self, company_id, quote_id, section_id, model_id, price, quantity, min_quantity):
         """
         Add a product to a quote. Note, this both creates a new line item in the quote (which creates a new line id) 
@@ -733,9 +748,7 @@ class Addlify(requests.Session):
             the quantities for that line.
         """
         # add the product to the quote section
-        section_url = Addlify.URL_ADD_ITEM_TO_QUOTE_SECTION.format(company_id=company_id, quote_id=quote_id, section_id=section_id)
-        model_data = {'modelId':model_id, 'pricePerUnit':price}
-        model_response = self.post(section_url, json=model_data, headers={'Content-Type':'application/json'})
+        model_response = self.new_quote_line_item(company_id, quote_id, section_id, model_id, price)
         line_id = model_response.json()['id']
         # update the line information
         order_response = self._update_quote_line_item(company_id, quote_id, section_id, line_id, price, quantity, min_quantity)
@@ -813,18 +826,13 @@ class Addlify(requests.Session):
         series_map: dict mapping slug -> display name
         """
         #  ——— identical cache‐bootstrapping from before ———
-        if 'series_models' not in self.cache:
-            self.cache['series_models'] = {}
+        if self.series_models is None:
             all_data, failed, done = {}, [], []
-            self.cache['series_models']['all_data']  = all_data
-            self.cache['series_models']['failed']    = failed
-            self.cache['series_models']['done']      = done
         else:
-            all_data = self.cache['series_models']['all_data']
+            all_data = self.series_models['all_data']
             done     = list(all_data.keys())
             failed   = []
-            self.cache['series_models']['failed'] = failed
-            self.cache['series_models']['done']   = done
+        self.series_models = {'all_data': all_data, 'failed': failed, 'done': done}
 
         #  —— now loop over slug/display-name pairs ——
         for slug, series_name in series_map.items():
@@ -834,17 +842,10 @@ class Addlify(requests.Session):
             if update_progress:
                 print(f"  Beginning {slug}")
 
-            # build the filter using the original series_name
-            payload = {
-                "restrictToSeriesNames": [series_name],
-                "specificationFieldFilters": [],
-                "itemsPerPage": 10000
-            }
-
             try:
                 response = self.get(
                     Addlify.URL_LIST_SERIES_MODELS,
-                    params={"filter": json.dumps(payload)}
+                    params=series_search_params(series_name)
                 )
             except Exception as e:
                 failed.append((slug, "Exception", str(e)))
@@ -863,4 +864,187 @@ class Addlify(requests.Session):
 
             done.append(slug)
 
-        return all_data, failed
\ No newline at end of file
+        return all_data, failed
+
+##------------------------------------------------------------------------
+## Page parsing, shared by `Addlify` and `async_addlify.AsyncAddlify`
+##------------------------------------------------------------------------
+
+def _template_pattern(template: str):
+    # each "{placeholder}" matches one path segment (or query value), the rest must match literally
+    parts = re.split(r"\{\w+\}", template)
+    return re.compile("[^/?&]+".join(re.escape(p) for p in parts) + r"(\?.*)?$")
+
+
+# most specific (longest) first, so e.g. a quote line item isn't reported as the quote itself
+_URL_TEMPLATES = sorted(
+    {v for k, v in vars(Addlify).items() if k.startswith("URL_") and isinstance(v, str)},
+    key=len, reverse=True,
+)
+_URL_PATTERNS = [(t, _template_pattern(t)) for t in _URL_TEMPLATES]
+
+
+def _mentions_password(body) -> bool:
+    """Whether a request body carries a password, as a dict key or anywhere in an encoded body."""
+    if isinstance(body, dict):
+        return any("password" in str(key).lower() for key in body)
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="replace")
+    return isinstance(body, str) and "password" in body.lower()
+
+
+def url_template(url: str) -> str:
+    """
+    Maps a concrete url back to the `Addlify.URL_*` template it was built from, e.g. for grouping requests by endpoint.
+    Urls that don't match any template are returned without their query string.
+    """
+    for template, pattern in _URL_PATTERNS:
+        if pattern.match(url):
+            return template
+    return url.split("?", 1)[0]
+
+
+def new_quote_payload(title: str, expiry_date: str, customer_contact_id: str, is_SPR: bool, description="", project_id="") -> dict:
+    """The JSON body for creating a quote, see `Addlify.new_quote`."""
+    example_date = "2024-09-08"
+    assert len(expiry_date) == len(example_date), f'Expiry date must be in the format yyyy-mm-dd e.g. {example_date}'
+    return {"projectId":project_id, "expiryDate":expiry_date, "title":title,
+            "customerContactId":customer_contact_id, "isSpr":is_SPR, "description":description}
+
+
+def parse_company_list(payload: dict) -> list:
+    """Pulls the list of companies out of the all-customer-data JSON."""
+    return payload['customerData']['allCustomers']['dataSource']
+
+
+def series_search_params(series_name: str) -> dict:
+    """The query params for listing every model of a series (filter built from the display name)."""
+    payload = {
+        "restrictToSeriesNames": [series_name],
+        "specificationFieldFilters": [],
+        "itemsPerPage": 10000
+    }
+    return {"filter": json.dumps(payload)}
+
+
+def parse_company_page(text: str) -> dict:
+    """
+    Turns the company page HTML into a dict, using the "let" variables defined in the page's script.
+    """
+    # get all the "let" variables defined in the script of the page
+    page_lines = [r.strip() for r in text.split("\n")]
+    start_ind = None
+    let_lines = []
+    for i, l in enumerate(page_lines):
+        if l.startswith("<script>"):
+            if page_lines[i+1].startswith("let "):
+                start_ind = i+1
+        if start_ind:
+            if l.startswith('</script>'):
+                end_ind = i-1
+    if start_ind:
+        let_lines = page_lines[start_ind:end_ind]
+
+    # turn the let lines into actual data that we can use
+    data = {}
+    for l in let_lines:
+        name_plus, var_plus = l.split(" = ", maxsplit=1)
+        name = name_plus.removeprefix("let ")
+        var_str = var_plus.removesuffix(";")
+        try:
+            data[name] = json.loads(var_str)
+        except:
+            data[name] = var_str
+    return data
+
+
+def parse_quote_page(text: str) -> dict:
+    """
+    Turns the quote page HTML into a dict: the active quote body plus the participants and main quote script vars.
+    """
+    # extract the quote information from the response text
+    lines = [n.strip() for n in text.split("\n")]
+    # get the correct line
+    search_term = "var activeQuoteBody = "
+    for l in lines:
+        if l.startswith(search_term):
+            break
+    # extract as data
+    l = l.split(search_term)[-1][:-1]
+    quote_info = json.loads(l)
+
+    # update with additional quote info
+    soup = bs4.BeautifulSoup(text, 'lxml')
+    quote_info.update(Addlify.extract_script_vars(soup, ["var participants", "var customerContactDataSource"]))
+    quote_info.update(Addlify.extract_script_vars(soup, ['quote = {"id"']))
+    return quote_info
+
+
+# the field headings of an order page sit in this container, each followed by its value, e.g.
+# <h6>Purchase Order Number</h6><p>212129726</p>
+_ORDER_FIELD_XPATH = "//div[contains(concat(' ', normalize-space(@class), ' '), ' display-fields-container ')]//h6"
+
+
+def _stripped_text(element) -> str:
+    # the same as bs4's get_text(strip=True): every text piece stripped, then joined
+    return "".join(piece.strip() for piece in element.itertext())
+
+
+def parse_order_page(text: str) -> dict:
+    """
+    Turns an order page's HTML into a dict of field name -> value, from the <h6> headings in the display fields
+    container and the <p> following each. Parsed with lxml directly, which is several times faster than bs4.
+    """
+    if not text or not text.strip():
+        return {}
+    tree = lxml_html.fromstring(text)
+    fields = {}
+    for header in tree.xpath(_ORDER_FIELD_XPATH):
+        value = header.xpath("following::p[1]")
+        fields[_stripped_text(header)] = _stripped_text(value[0]) if value else ""
+    return fields
+
+
+ORDER_LIST_KEYS = ("orders", "results", "data", "items", "dataSource")  # where a wrapped dateRange payload lists them
+
+
+def parse_order_list(payload) -> list:
+    """
+    Pulls the list of order dicts out of the dateRange JSON: the payload itself if it is a list, else the list under
+    one of ORDER_LIST_KEYS (looked up in nested dicts too), else the first non-empty list of dicts anywhere in it.
+
+    Raises:
+        ValueError: No order list in the payload, e.g. a dict of only empty lists such as {"errors": []}, which
+            must not be read as "no orders".
+    """
+    orders = _find_order_list(payload)
+    if orders is None:
+        raise ValueError(f"No order list in the dateRange response: {json.dumps(payload, default=str)[:200]}")
+    return orders
+
+
+def _find_order_list(payload):
+    if isinstance(payload, list):
+        return payload
+    if not isinstance(payload, dict):
+        return None
+    for key in ORDER_LIST_KEYS:
+        if isinstance(payload.get(key), list):
+            return payload[key]
+    for value in payload.values():
+        if isinstance(value, dict):
+            nested = _find_order_list(value)
+            if nested is not None:
+                return nested
+    for value in payload.values():
+        if isinstance(value, list) and value and isinstance(value[0], dict):
+            return value
+    return None
+
+
+def order_id_of(order: dict):
+    """The id of an order dict from `parse_order_list`, or None."""
+    for key in ("id", "orderId", "_id"):
+        if order.get(key) not in (None, ""):
+            return str(order[key])
+    return None
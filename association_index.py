@@ -0,0 +1,165 @@
+import itertools
+import math
+import threading
+import time
+
+DEFAULT_REBUILD_INTERVAL = 600.0  # seconds before the index is rebuilt from the sheets (picks up other processes' saves)
+QUOTE_WEIGHT = 1.0  # extra weight a bundle's associations get each time the bundle is quoted
+
+
+def _blank(value):
+    return value is None or (isinstance(value, float) and math.isnan(value)) or value == ""
+
+
+def bundle_edges(rows) -> tuple:
+    """The distinct (parent_model_id, dependent_model_id) pairs of one bundle revision's rows."""
+    edges = set()
+    for row in rows:
+        parent, dependent = row.get("parent_model_id"), row.get("dependent_model_id")
+        if row.get("mapping_type") in ("root", "bundle") or _blank(parent) or _blank(dependent):
+            continue
+        edges.add((str(parent), str(dependent)))
+    return tuple(sorted(edges))
+
+
+def split_quoted_bundles(bundle_names) -> list:
+    """The bundle names of a quote_log entry, which joins them with ', '."""
+    if _blank(bundle_names):
+        return []
+    return [n for n in str(bundle_names).split(", ") if n]
+
+
+class AssociationIndex:
+    """
+    Co-occurrence counts of dependent models per parent model, mined from the bundles and the quote log.
+
+    Each bundle's latest active revision contributes its parent -> dependent pairs with a weight of 1, plus
+    QUOTE_WEIGHT for every time the bundle was quoted. Counts are kept sparse, as {parent: {dependent: weight}},
+    and updated in place when a bundle is saved, deleted or quoted. `top_k` keeps a sorted list per parent that
+    is only re-sorted when that parent changed, so a lookup is a slice.
+    """
+
+    def __init__(self, rebuild_interval: float = DEFAULT_REBUILD_INTERVAL):
+        self.rebuild_interval = rebuild_interval
+        self.built_at = None
+        self._counts = {}  # parent -> {dependent: weight}
+        self._bundle_edges = {}  # bundle_name -> its edges
+        self._quotes = {}  # bundle_name -> times quoted
+        self._ranked = {}  # parent -> [(dependent, weight)], best first; dropped when the parent changes
+        self._lock = threading.Lock()
+
+    def stale(self) -> bool:
+        """True if the index was never built or is due for a rebuild."""
+        return self.built_at is None or time.time() - self.built_at > self.rebuild_interval
+
+    def rebuild(self, bundles_df, quote_log_df=None):
+        """
+        Recomputes the index from scratch.
+
+        Args:
+            bundles_df (pd.DataFrame): The bundles sheet.
+            quote_log_df (pd.DataFrame, optional): The quote log, for the quote weights.
+        """
+        quotes = {}
+        if quote_log_df is not None and not quote_log_df.empty and "bundle_name" in quote_log_df.columns:
+            for names in quote_log_df["bundle_name"].tolist():
+                for name in split_quoted_bundles(names):
+                    quotes[name] = quotes.get(name, 0) + 1
+
+        bundle_edges_by_name = {}
+        if not bundles_df.empty:
+            latest = bundles_df.groupby("bundle_name", observed=True)["bundle_version"].transform("max")
+            current = bundles_df[(bundles_df["bundle_version"] == latest) & (bundles_df["status"] == "active")]
+            # the same filtering as bundle_edges, done on the whole frame at once
+            edges = current[~current["mapping_type"].isin(["root", "bundle"])
+                            & current["parent_model_id"].notna() & current["dependent_model_id"].notna()]
+            edges = edges[["bundle_name", "parent_model_id", "dependent_model_id"]].astype(str).drop_duplicates()
+            for name, parent, dependent in zip(edges["bundle_name"], edges["parent_model_id"], edges["dependent_model_id"]):
+                if parent and dependent:
+                    bundle_edges_by_name.setdefault(name, []).append((parent, dependent))
+            bundle_edges_by_name = {name: tuple(sorted(e)) for name, e in bundle_edges_by_name.items()}
+
+        with self._lock:
+            self._counts, self._ranked, self._bundle_edges = {}, {}, {}
+            self._quotes = quotes
+            for name, edges in bundle_edges_by_name.items():
+                self._add(name, edges)
+            self.built_at = time.time()
+
+    def _weight(self, bundle_name):
+        return 1.0 + QUOTE_WEIGHT * self._quotes.get(bundle_name, 0)
+
+    def _add(self, bundle_name, edges, sign=1):
+        weight = sign * self._weight(bundle_name)
+        for parent, dependent in edges:
+            row = self._counts.setdefault(parent, {})
+            row[dependent] = row.get(dependent, 0.0) + weight
+            if row[dependent] <= 1e-9:
+                del row[dependent]
+            self._ranked.pop(parent, None)
+        if sign > 0:
+            self._bundle_edges[bundle_name] = edges
+
+    def set_bundle(self, bundle_name, rows):
+        """Replaces a bundle's contribution with that of its new revision's rows."""
+        edges = bundle_edges(rows)
+        with self._lock:
+            old = self._bundle_edges.pop(bundle_name, None)
+            if old:
+                self._add(bundle_name, old, sign=-1)
+            self._add(bundle_name, edges)
+
+    def remove_bundle(self, bundle_name):
+        """Drops a deleted or deprecated bundle's contribution."""
+        with self._lock:
+            old = self._bundle_edges.pop(bundle_name, None)
+            if old:
+                self._add(bundle_name, old, sign=-1)
+
+    def add_quote(self, bundle_names):
+        """Counts a quote of these bundles."""
+        with self._lock:
+            for name in bundle_names:
+                edges = self._bundle_edges.get(name)
+                if edges:
+                    self._add(name, edges, sign=-1)
+                self._quotes[name] = self._quotes.get(name, 0) + 1
+                if edges:
+                    self._add(name, edges)
+
+    def top_k(self, parent_model_id, k: int = 5, exclude=()) -> list:
+        """
+        Returns up to `k` (dependent_model_id, weight) pairs most often bundled with the parent, best first.
+
+        Args:
+            parent_model_id (str): The parent model.
+            k (int): How many suggestions.
+            exclude (iterable): Dependents to leave out, e.g. the ones already in the bundle.
+        """
+        if _blank(parent_model_id):
+            return []
+        parent = str(parent_model_id)
+        with self._lock:
+            ranked = self._ranked.get(parent)
+            if ranked is None:
+                row = self._counts.get(parent, {})
+                ranked = sorted(row.items(), key=lambda kv: (-kv[1], kv[0]))
+                self._ranked[parent] = ranked
+        exclude = set(exclude)
+        if not exclude:
+            return ranked[:k]
+        return list(itertools.islice((pair for pair in ranked if pair[0] not in exclude), k))
+
+    def stats(self) -> dict:
+        """Sizes of the index, for the admin pages."""
+        with self._lock:
+            return {
+                "parents": len(self._counts),
+                "pairs": sum(len(row) for row in self._counts.values()),
+                "bundles": len(self._bundle_edges),
+                "built_at": self.built_at,
+            }
+
+
+# the process-wide index, shared by every Streamlit session
+ASSOCIATION_INDEX = AssociationIndex()
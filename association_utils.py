@@ -1,5 +1,7 @@
 import re
-import pandas as pd
+from lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
 
 def filter_and_sum(df, search_terms, exclusion_terms=None,
                    column_name='Description', sum_columns=None):
@@ -0,0 +1,229 @@
+import asyncio
+import json
+
+import time
+
+import httpx
+
+from addlify import (
+    Addlify,
+    new_quote_payload,
+    parse_company_list,
+    parse_company_page,
+    parse_order_list,
+    parse_order_page,
+    parse_quote_page,
+    series_search_params,
+    url_template,
+)
+from instrumentation import METRICS
+
+DEFAULT_MAX_CONCURRENCY = 10
+
+
+class AsyncAddlify:
+    """
+    An asyncio counterpart of `Addlify`, built on `httpx.AsyncClient`.
+
+    It offers the quoting/crawling surface of `Addlify` (`new_quote`, `add_item_to_quote`, `get_company_info`,
+    `get_quote_info`, `list_companies`, `get_all_model_ids`, the order lookups) but keeps no "last response"/"last
+    post" state, so any number of calls can be in flight from one event loop. At most `max_concurrency` requests hit
+    the store at once.
+
+    Usage:
+        async with AsyncAddlify(email, password) as adder:
+            infos = await asyncio.gather(*(adder.get_company_info(c) for c in company_ids))
+    """
+
+    def __init__(self, email: str, password: str, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, timeout: float = 60,
+                 base_url: str = None):
+        self._credentials = (email, password)
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self._client = httpx.AsyncClient(timeout=timeout, follow_redirects=True)
+        self._limit = asyncio.Semaphore(max_concurrency)
+        self._login_lock = asyncio.Lock()
+        self._login_generation = 0
+        self.logged_in = False
+
+    async def __aenter__(self):
+        if not await self.login():
+            await self.aclose()
+            raise RuntimeError("Login failed!")
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def login(self) -> bool:
+        """Logs into the Amplify portal with the credentials given at construction. Returns the success bool."""
+        email, password = self._credentials
+        r = await self._client.post(self._resolve(Addlify.URL_LOGIN), data={"emailAddress": email, "password": password})
+        try:
+            self.logged_in = r.status_code == 200 and r.json().get('message') == 'Success'
+        except json.JSONDecodeError:
+            self.logged_in = False
+        self._login_generation += 1
+        return self.logged_in
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        Sends a request, logging in again and retrying once if the session looks to have expired.
+        """
+        if not self.logged_in:
+            raise RuntimeError("Not logged in. Please log in again / first.")
+        generation = self._login_generation
+        response = await self._send(method, url, **kwargs)
+        if Addlify._looks_logged_out(response):
+            async with self._login_lock:
+                # many requests will notice the expiry at once, only the first one needs to log back in
+                if generation == self._login_generation:
+                    await self.login()
+            response = await self._send(method, url, **kwargs)
+        return response
+
+    def _resolve(self, url: str) -> str:
+        # point at `base_url` instead of the real store if one was given (e.g. the fake store for benchmarks)
+        if self.base_url and url.startswith(Addlify.STORE_URL):
+            return self.base_url + url[len(Addlify.STORE_URL):]
+        return url
+
+    async def _send(self, method: str, url: str, **kwargs) -> httpx.Response:
+        labels = {"method": method.upper(), "endpoint": url_template(url)}
+        url = self._resolve(url)
+        async with self._limit:
+            # timed once we hold a slot, so the histogram shows the store's latency rather than our queueing
+            start = time.perf_counter()
+            try:
+                response = await self._client.request(method, url, **kwargs)
+            except Exception:
+                METRICS.observe("addlify_request", time.perf_counter() - start, error=True, **labels)
+                raise
+            elapsed = time.perf_counter() - start
+        METRICS.observe("addlify_request", elapsed, nbytes=len(response.content),
+                        error=response.status_code >= 400, **labels)
+        return response
+
+    ##-----------
+    ## Companies
+    ##-----------
+
+    async def list_companies(self) -> list:
+        """Fetches the list of all companies (this call is slow on the store's side)."""
+        response = await self.request("GET", Addlify.URL_LIST_CUSTOMERS)
+        return parse_company_list(response.json())
+
+    async def get_company_info(self, company_id: str) -> dict:
+        """Fetches and parses company information, see `Addlify.get_company_info`."""
+        response = await self.request("GET", Addlify.URL_GET_COMPANY.format(company_id=company_id))
+        return parse_company_page(response.text)
+
+    ##-----------
+    ## Quotes
+    ##-----------
+
+    async def new_quote(self, company_id: str, title: str, expiry_date: str, customer_contact_id: str, is_SPR: bool,
+                        description="", project_id="") -> httpx.Response:
+        """Adds a new quote against a customer and contact, see `Addlify.new_quote`."""
+        quote_info = new_quote_payload(title, expiry_date, customer_contact_id, is_SPR, description, project_id)
+        return await self.request("POST", Addlify.URL_NEW_QUOTE.format(company_id=company_id), json=quote_info)
+
+    async def get_quote_info(self, company_id: str, quote_id: str) -> dict:
+        """Gets the information for a quote, see `Addlify.get_quote_info`."""
+        response = await self.request("GET", Addlify.URL_GET_QUOTE.format(company_id=company_id, quote_id=quote_id))
+        # the page is parsed with bs4/lxml, keep that off the event loop
+        return await asyncio.to_thread(parse_quote_page, response.text)
+
+    async def _update_quote_line_item(self, company_id, quote_id, section_id, line_id, price, quantity, min_quantity):
+        url = Addlify.URL_UPDATE_QUOTED_ITEM_DETAILS.format(company_id=company_id, quote_id=quote_id,
+                                                            section_id=section_id, line_id=line_id)
+        order_data = {"pricePerUnit": price, "desiredQuantity": quantity, "minimumQuantity": min_quantity}
+        return await self.request("PUT", url, data=order_data)
+
+    async def update_quote_line_item(self, company_id, quote_id, section_id, line_id, price, quantity, min_quantity):
+        """Sets the price and quantities of a line already on a quote, see `Addlify.update_quote_line_item`."""
+        return await self._update_quote_line_item(company_id, quote_id, section_id, line_id, price, quantity, min_quantity)
+
+    async def delete_quote_line_item(self, company_id, quote_id, section_id, line_id) -> httpx.Response:
+        """Removes a line from a quote, see `Addlify.delete_quote_line_item`."""
+        url = Addlify.URL_DELETE_QUOTED_ITEM.format(company_id=company_id, quote_id=quote_id,
+                                                    section_id=section_id, line_id=line_id)
+        return await self.request("DELETE", url)
+
+    async def add_item_to_quote(self, company_id, quote_id, section_id, model_id, price, quantity, min_quantity):
+        """
+        Adds a product to a quote section, then sets its quantities, see `Addlify.add_item_to_quote`.
+
+        Returns:
+            tuple(response, response): The line item creation response & the quantity update response.
+        """
+        section_url = Addlify.URL_ADD_ITEM_TO_QUOTE_SECTION.format(company_id=company_id, quote_id=quote_id,
+                                                                   section_id=section_id)
+        model_response = await self.request("POST", section_url, json={'modelId': model_id, 'pricePerUnit': price})
+        model_response.raise_for_status()
+        line_id = model_response.json()['id']
+        order_response = await self._update_quote_line_item(company_id, quote_id, section_id, line_id,
+                                                             price, quantity, min_quantity)
+        return model_response, order_response
+
+    ##-----------
+    ## Orders
+    ##-----------
+
+    async def get_orders_by_date(self, start_date: str, end_date: str) -> list:
+        """The order dicts placed in a date range (yyyy-mm-dd, both inclusive), see `Addlify.get_order_details_by_date`."""
+        url = Addlify.URL_GET_ORDERS_BY_DATE_DETAILS.format(start_date=start_date, end_date=end_date)
+        response = await self.request("GET", url)
+        response.raise_for_status()
+        return parse_order_list(response.json())
+
+    async def get_order_page(self, order_id: str) -> str:
+        """The raw HTML of an order's page, for parsing off the event loop with `parse_order_page`."""
+        response = await self.request("GET", Addlify.URL_GET_ORDER_DETAILS_ID.format(order_id=order_id))
+        response.raise_for_status()
+        return response.text
+
+    async def get_order_details_by_id(self, order_id: str) -> dict:
+        """The fields of an order's page, see `Addlify.get_order_details_by_id`."""
+        text = await self.get_order_page(order_id)
+        return await asyncio.to_thread(parse_order_page, text)
+
+    ##---------------------
+    ## Getting model data
+    ##---------------------
+
+    async def _get_series_models(self, series_name: str):
+        response = await self.request("GET", Addlify.URL_LIST_SERIES_MODELS, params=series_search_params(series_name))
+        if response.status_code != 200:
+            return None, (response.status_code, response.reason_phrase)
+        try:
+            return response.json().get("results", []), None
+        except ValueError as je:
+            return None, ("JSONDecodeError", str(je))
+
+    async def get_all_model_ids(self, series_map: dict, skip: set = None):
+        """
+        Crawls the models of every series concurrently.
+
+        Args:
+            series_map (dict): Mapping of slug -> series display name.
+            skip (set, optional): Slugs already fetched (e.g. by an earlier, interrupted run).
+
+        Returns:
+            tuple(dict, list): slug -> list of models, and the (slug, reason, detail) tuples that failed.
+        """
+        slugs = [slug for slug in series_map if not skip or slug not in skip]
+        results = await asyncio.gather(*(self._get_series_models(series_map[s]) for s in slugs), return_exceptions=True)
+        all_data, failed = {}, []
+        for slug, result in zip(slugs, results):
+            if isinstance(result, Exception):
+                failed.append((slug, "Exception", str(result)))
+                continue
+            models, error = result
+            if error:
+                failed.append((slug, *error))
+            else:
+                all_data[slug] = models
+        return all_data, failed
@@ -0,0 +1,161 @@
+"""
+End-to-end benchmarks of the app's data paths against the local fakes in `fake_backends`.
+
+Measures login, bundle save and bundle listing at several `bundles` sheet sizes, and quote creation with N line
+items, then compares the medians with a stored baseline.
+
+    python benchmark.py --save-baseline           # record benchmark_baseline.json on this machine
+    python benchmark.py                           # later: exits 1 if anything regressed past --tolerance
+    python benchmark.py --store-latency 0.05      # simulate a slow store round trip
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+from addlify import Addlify
+from fake_backends import FakeAddlifyServer, FakeGSheetsConnection, fake_bundle_rows
+import bundle_store
+import quoting_utils
+from sheet_quota import SHEET_QUOTA
+
+DEFAULT_BASELINE_PATH = "benchmark_baseline.json"
+BENCH_USER = "bench@example.com"
+
+
+def _time(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        # the clients print progress, which would only add noise here
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+        times.append(time.perf_counter() - start)
+    return {"median_s": statistics.median(times), "min_s": min(times), "runs": repeat}
+
+
+def bench_login(store, repeat):
+    def run():
+        adder = Addlify(BENCH_USER, "pw", base_url=store.url)
+        assert adder.logged_in
+        adder.close()
+    return _time(run, repeat)
+
+
+def bench_bundle_save(sheet_rows, repeat, sheet_latency):
+    rows = fake_bundle_rows(sheet_rows)
+    items = [{"dependent_model_id": f"model-new-{i}", "mapping_type": "Objective", "multiple": 1,
+              "quantity": 1, "min_quantity": 1, "price_override": 1.0} for i in range(5)]
+
+    def run():
+        # a fresh sheet each time so the sheet size stays what we are measuring
+        bundle_store.use_connection(FakeGSheetsConnection({"bundles": rows}, latency=sheet_latency))
+        bundle_store.save_bundle("Bundle 1", items, BENCH_USER)
+    return _time(run, repeat)
+
+
+def bench_bundle_list(sheet_rows, repeat, sheet_latency):
+    bundle_store.use_connection(FakeGSheetsConnection({"bundles": fake_bundle_rows(sheet_rows)}, latency=sheet_latency))
+    return _time(lambda: bundle_store.load_bundles(), repeat)
+
+
+def bench_quote(store, n_lines, repeat):
+    with contextlib.redirect_stdout(io.StringIO()):
+        adder = Addlify(BENCH_USER, "pw", base_url=store.url)
+
+    def run():
+        quote_id, _ = quoting_utils.create_new_quote(adder, "company-1", "Bench quote", "2030-01-01", "contact-1")
+        info = quoting_utils.get_quote_info(adder, "company-1", quote_id)
+        section_id = info["sections"][-1]["id"]
+        for i in range(n_lines):
+            quoting_utils.add_line_item_to_quote(adder, "company-1", quote_id, section_id,
+                                                 product_id=f"model-{i}", price=10.0, quantity=1, min_quantity=1)
+    result = _time(run, repeat)
+    adder.close()
+    return result
+
+
+def run_benchmarks(sheet_sizes, line_counts, repeat, store_latency, sheet_latency):
+    results = {}
+    with FakeAddlifyServer(latency=store_latency) as store:
+        results["login"] = bench_login(store, repeat)
+        for n in line_counts:
+            results[f"quote/{n}_lines"] = bench_quote(store, n, repeat)
+    # the fake sheet has no quota to protect, and throttling would swamp what is being measured
+    SHEET_QUOTA.configure({"read": 0, "write": 0})
+    try:
+        for n in sheet_sizes:
+            results[f"bundle_save/{n}_rows"] = bench_bundle_save(n, repeat, sheet_latency)
+            results[f"bundle_list/{n}_rows"] = bench_bundle_list(n, repeat, sheet_latency)
+    finally:
+        bundle_store.use_connection(None)
+    return results
+
+
+def compare(results, baseline, tolerance, min_delta=0.001):
+    """
+    Returns a list of (name, baseline_s, now_s, ratio) for every benchmark slower than baseline * (1 + tolerance)
+    and by more than `min_delta` seconds (sub-millisecond benchmarks are mostly noise).
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, now = baseline[name]["median_s"], result["median_s"]
+        if before > 0 and now > before * (1 + tolerance) and now - before > min_delta:
+            regressions.append((name, before, now, now / before))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000], help="bundles sheet sizes (rows)")
+    parser.add_argument("--lines", type=int, nargs="+", default=[10, 50], help="quote sizes (line items)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--store-latency", type=float, default=0.0, help="seconds added to every fake store request")
+    parser.add_argument("--sheet-latency", type=float, default=0.0, help="seconds added to every fake sheet call")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="overwrite the baseline with this run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before flagging, 0.25 = 25%%")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+    parser.add_argument("--output", help="also write this run's results to a JSON file")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.lines, args.repeat, args.store_latency, args.sheet_latency)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    print(f"{'benchmark':<28}{'median ms':>12}{'baseline ms':>14}{'change':>10}")
+    for name, result in results.items():
+        before = baseline.get(name, {}).get("median_s")
+        change = f"{(result['median_s'] / before - 1) * 100:+.0f}%" if before else ""
+        before_ms = f"{before * 1000:.1f}" if before else "-"
+        print(f"{name:<28}{result['median_s'] * 1000:>12.1f}{before_ms:>14}{change:>10}")
+
+    run = {"created_at": time.time(), "args": vars(args), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(run, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(run, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms / 1000)
+    for name, before, now, ratio in regressions:
+        print(f"REGRESSION {name}: {before * 1000:.1f}ms -> {now * 1000:.1f}ms ({ratio:.2f}x)")
+    if not baseline:
+        print(f"No baseline at {args.baseline}, run with --save-baseline to record one.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
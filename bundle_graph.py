@@ -0,0 +1,244 @@
+import math
+import threading
+
+from lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
+
+# a row with this mapping_type includes another bundle (named in dependent_group_name) instead of a model
+BUNDLE_REFERENCE = "bundle"
+
+# the columns a flattened line item carries, in the order the quote page shows them
+LINE_COLUMNS = ("dependent_model_id", "dependent_group_name", "quantity", "min_quantity", "price_override", "mapping_type")
+
+
+class BundleGraphError(ValueError):
+    """Raised when a bundle can't be expanded, e.g. it includes a bundle that doesn't exist (any more)."""
+
+
+class BundleCycleError(BundleGraphError):
+    """Raised when a bundle (directly or through the bundles it includes) depends on itself."""
+
+    def __init__(self, path):
+        self.path = list(path)
+        super().__init__("Circular bundle dependency: " + " -> ".join(str(p) for p in self.path))
+
+
+def _blank(value):
+    return value is None or (isinstance(value, float) and math.isnan(value)) or value == ""
+
+
+def _number(value, default):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return default
+    return default if math.isnan(value) else value
+
+
+def _plain(value):
+    return None if _blank(value) else value
+
+
+def _is_root(row):
+    return row.get("mapping_type") == "root" or _blank(row.get("parent_model_id"))
+
+
+class BundleGraph:
+    """
+    The bundles sheet as a graph, for expanding bundles into the line items a quote needs.
+
+    Inside a revision, rows are edges `parent_model_id -> dependent_model_id`; a row whose parent is another
+    row's dependent hangs below it, so dependencies can go any number of levels deep; a row repeating a model it
+    hangs below (the parent model listed again as a dependent) is a line of its own. A row with mapping_type
+    "bundle" includes the latest active revision of the bundle named in its `dependent_group_name`, so bundles can
+    contain bundles. Quantities multiply down the tree: a line's quantity is its own `quantity * multiple` times
+    the quantity of whatever it hangs below.
+
+    `expand` memoizes the flattened lines per revision (bundle_id, bundle_version), so quoting a big composite
+    bundle is a dict lookup after the first time. Build a new graph when the sheet changes; pass the old one as
+    `previous` to keep the expansions that are still valid.
+    """
+
+    def __init__(self, df, previous=None):
+        self._rows = {}  # (bundle_id, version) -> list of row dicts
+        self._latest = {}  # bundle_name -> (bundle_id, version) of its latest active revision
+        self._names = {}  # (bundle_id, version) -> bundle_name
+        self._memo = {}  # (bundle_id, version) -> (lines, {included bundle_name: revision it resolved to})
+        self._lock = threading.Lock()
+        if not df.empty:
+            self._index(df)
+        if previous is not None:
+            self._inherit(previous)
+
+    def _index(self, df):
+        columns = [c for c in ("bundle_id", "bundle_name", "bundle_version", "status", "parent_model_id",
+                               "dependent_model_id", "dependent_group_name", "mapping_type", "multiple",
+                               "quantity", "min_quantity", "price_override") if c in df.columns]
+        records = df[columns].astype(object).to_dict("records")
+        latest_version = {}
+        for row in records:
+            if _blank(row.get("bundle_id")) or _blank(row.get("bundle_version")):
+                continue
+            key = (str(row["bundle_id"]), int(row["bundle_version"]))
+            self._rows.setdefault(key, []).append(row)
+            self._names[key] = row["bundle_name"]
+            if int(row["bundle_version"]) >= latest_version.get(row["bundle_name"], (0,))[0]:
+                latest_version[row["bundle_name"]] = (int(row["bundle_version"]), key, row.get("status"))
+        self._latest = {name: key for name, (_, key, status) in latest_version.items() if status == "active"}
+
+    def _inherit(self, previous):
+        # an expansion stays valid if its revision is unchanged and every bundle it included still resolves to the
+        # same revision
+        for key, (lines, resolved) in previous._memo.items():
+            if key in self._rows and all(self._latest.get(name) == rev for name, rev in resolved.items()):
+                self._memo[key] = (lines, resolved)
+
+    def revision_of(self, bundle_name, version=None):
+        """The (bundle_id, version) key of a bundle's latest active revision, or of a given version."""
+        if version is None:
+            key = self._latest.get(bundle_name)
+            if key is None:
+                raise BundleGraphError(f"Bundle '{bundle_name}' not found or not active.")
+            return key
+        for key, name in self._names.items():
+            if name == bundle_name and key[1] == int(version):
+                return key
+        raise BundleGraphError(f"Bundle '{bundle_name}' has no version {version}.")
+
+    def expand(self, bundle_name, version=None):
+        """
+        Returns the bundle's flattened line items: one dict per model with the multiplied quantity (rounded up to a
+        whole unit and at least `min_quantity`), the price override and the mapping type.
+
+        Args:
+            bundle_name (str): The bundle to expand.
+            version (int, optional): A specific revision, defaults to the latest active one.
+
+        Returns:
+            list: The line item dicts, see LINE_COLUMNS. Safe to modify.
+        """
+        key = self.revision_of(bundle_name, version)
+        with self._lock:
+            lines, _ = self._expand_revision(key, ())
+        # whole units only, and never below the line's minimum
+        return [dict(line, quantity=max(math.ceil(line["quantity"] - 1e-9), line["min_quantity"])) for line in lines]
+
+    def expansion_key(self, bundle_name, version=None):
+        """
+        A key that changes whenever the bundle's expansion would: its revision plus the revisions every bundle it
+        includes resolved to. For caching things derived from `expand`.
+        """
+        key = self.revision_of(bundle_name, version)
+        with self._lock:
+            _, resolved = self._expand_revision(key, ())
+        return key, tuple(sorted(resolved.items()))
+
+    def includes(self, bundle_name):
+        """The names of every bundle `bundle_name` includes, directly or further down."""
+        seen = set()
+        stack = [self.revision_of(bundle_name)]
+        while stack:
+            for row in self._rows.get(stack.pop(), ()):
+                name = row.get("dependent_group_name")
+                if row.get("mapping_type") == BUNDLE_REFERENCE and name not in seen:
+                    seen.add(name)
+                    if name in self._latest:
+                        stack.append(self._latest[name])
+        return seen
+
+    def check(self, bundle_name, rows):
+        """
+        Raises BundleGraphError (BundleCycleError for cycles) if the bundle with these rows couldn't be expanded,
+        e.g. before saving it.
+        """
+        rows = [dict(r, bundle_name=bundle_name) for r in rows]
+        for row in rows:
+            name = row.get("dependent_group_name")
+            if row.get("mapping_type") != BUNDLE_REFERENCE:
+                continue
+            if name == bundle_name:
+                raise BundleCycleError([bundle_name, name])
+            if name not in self._latest:
+                raise BundleGraphError(f"Included bundle '{name}' not found or not active.")
+            if bundle_name in self.includes(name):
+                raise BundleCycleError([bundle_name, name, "...", bundle_name])
+        # and bundles included further down the bundle's own rows
+        with self._lock:
+            self._flatten(rows, (bundle_name,), {})
+
+    def _expand_revision(self, key, path):
+        name = self._names[key]
+        if name in path:
+            raise BundleCycleError(list(path) + [name])
+        cached = self._memo.get(key)
+        if cached is not None:
+            return cached
+        resolved = {}
+        lines = self._merge(self._flatten(self._rows[key], path + (name,), resolved))
+        self._memo[key] = (lines, resolved)
+        return lines, resolved
+
+    def _flatten(self, rows, path, resolved):
+        """Walks one revision's rows from its roots; returns (line, quantity factor) pairs before merging."""
+        children = {}
+        roots = []
+        dependents = {r.get("dependent_model_id") for r in rows}
+        for row in rows:
+            parent = row.get("parent_model_id")
+            if _is_root(row):
+                roots.append(row)
+            elif parent in dependents:
+                children.setdefault(parent, []).append(row)
+            else:
+                roots.append(row)  # its parent isn't in the bundle, treat it as top level
+
+        out = []
+
+        def visit(row, factor, models):
+            quantity = factor * _number(row.get("quantity"), 1) * _number(row.get("multiple"), 1)
+            if row.get("mapping_type") == BUNDLE_REFERENCE:
+                name = row.get("dependent_group_name")
+                if name not in self._latest:
+                    raise BundleGraphError(f"Bundle '{path[-1]}' includes '{name}', which is not found or not active.")
+                resolved[name] = self._latest[name]
+                sub_lines, sub_resolved = self._expand_revision(self._latest[name], path)
+                resolved.update(sub_resolved)
+                out.extend((line, quantity * line["quantity"]) for line in sub_lines)
+                return
+            model = row.get("dependent_model_id")
+            visited.add(id(row))
+            out.append((row, quantity))
+            if model in models:
+                return  # repeats a model it hangs below, e.g. more of the head unit: a line, not a loop
+            for child in children.get(model, ()):
+                visit(child, quantity, models + (model,))
+
+        visited = set()
+        for row in roots:
+            visit(row, 1.0, ())
+        for row in rows:
+            if id(row) not in visited and row.get("mapping_type") != BUNDLE_REFERENCE:
+                # rows only reachable through each other have no root to hang below, they're plain lines
+                out.append((row, _number(row.get("quantity"), 1) * _number(row.get("multiple"), 1)))
+        return out
+
+    @staticmethod
+    def _merge(pairs):
+        # one line per model: quantities add up, the first price and mapping win, the largest minimum applies.
+        # quantities stay fractional here so an included bundle can be scaled without compounding rounding
+        merged = {}
+        for source, quantity in pairs:
+            model = source.get("dependent_model_id")
+            min_quantity = int(_number(source.get("min_quantity"), 1))
+            line = merged.get(model)
+            if line is None:
+                merged[model] = line = {c: _plain(source.get(c)) for c in LINE_COLUMNS}
+                line["quantity"] = 0.0
+                line["min_quantity"] = min_quantity
+                if line["price_override"] is not None:
+                    line["price_override"] = round(float(line["price_override"]), 2)
+            else:
+                line["min_quantity"] = max(line["min_quantity"], min_quantity)
+            line["quantity"] += quantity
+        return tuple(merged.values())
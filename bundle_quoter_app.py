@@ -1,14 +1,32 @@
 import streamlit as st
-import pandas as pd
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import datetime
-import io
-from streamlit_gsheets import GSheetsConnection
-import re
+import functools
+import json
+import os
+from lazy_imports import lazy_import
+
+# heavy libraries load on first use, so a cold start only pays for what the rendered page needs
+pd = lazy_import("pandas")
 
 # Internal imports
 import bundle_store
 import quoting_utils
 import association_utils
+import bundle_graph
+import bundle_schema
+import catalogue
+import company_search
+import exporter
+import pricing
+import quote_diff
+import quote_plan
+import instrumentation
+import job_queue
+import sheet_quota
+import single_flight
+import tracer
+from quote_journal import QuoteJournal
 
 st.set_page_config(page_title="Bundle Quoter", layout="wide")
 
@@ -16,6 +34,42 @@ SPECIAL_USERS = ["amrit.ramadugu@omron.com", "arvey.e@ssa.omron.com", "chandan.k
 
 # --- Helper Functions ---
 
+@st.cache_resource
+def start_metrics_server():
+    """Exposes /metrics and /metrics.json for a local scraper, if BUNDLE_QUOTER_METRICS_PORT is set."""
+    port = os.environ.get("BUNDLE_QUOTER_METRICS_PORT")
+    if port:
+        return instrumentation.serve_metrics(int(port))
+    return None
+
+def timed_render(part):
+    """Decorator recording each render of a page part (e.g. a fragment's own reruns) as the "render" metric."""
+    def decorate(render):
+        @functools.wraps(render)
+        def timed(*args, **kwargs):
+            with tracer.rerun(part), instrumentation.METRICS.timer("render", part=part):
+                return render(*args, **kwargs)
+        return timed
+    return decorate
+
+@st.cache_resource
+def start_tracer():
+    """Instruments the data layer for the rerun tracer, if BUNDLE_QUOTER_TRACE is set (see tracer.py)."""
+    if tracer.TRACER is not None:
+        tracer.install(tracer.TRACER)
+    return tracer.TRACER
+
+def session_id():
+    """This Streamlit session's id, None outside a script run."""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+def track_session():
+    """Marks this session as in use for the session janitor, which trims sessions left idle (see catalogue.py)."""
+    ctx = get_script_run_ctx()
+    if ctx is not None:
+        catalogue.SESSION_JANITOR.touch(ctx.session_id, ctx.session_state)
+
 def is_special_user():
     """Checks if the current user is a special user."""
     return st.session_state.get("user_id") in SPECIAL_USERS
@@ -24,10 +78,11 @@ def initialize_session_state():
     """Initialize session state variables."""
     if "adder" not in st.session_state:
         st.session_state.adder = None
-    if "companies" not in st.session_state:
-        st.session_state.companies = []
-    if "models" not in st.session_state:
-        st.session_state.models = []
+    # the company and models lists are shared catalogues (see catalogue.py), a session only keeps their version
+    if "companies_version" not in st.session_state:
+        st.session_state.companies_version = None
+    if "models_version" not in st.session_state:
+        st.session_state.models_version = None
     if "user_id" not in st.session_state:
         st.session_state.user_id = ""
     if "bundle_builder_items" not in st.session_state:
@@ -43,11 +98,24 @@ def render_sidebar():
     st.sidebar.header("🔑 Login to Addlify")
     if st.session_state.adder:
         st.sidebar.success(f"Logged in as {st.session_state.user_id}")
+        recorder = getattr(st.session_state.adder, "recorder", None)
+        if recorder is not None and is_special_user():
+            st.sidebar.download_button(
+                "Download request log", recorder.to_json(), file_name="addlify_requests.json", mime="application/json"
+            )
+        if st.session_state.get("companies_job_id"):
+            with st.sidebar:
+                render_companies_job(st.session_state.companies_job_id)
+        elif st.sidebar.button("Refresh companies"):
+            refresh_companies()
         if st.sidebar.button("Logout"):
+            quoting_utils.logout_of_addlify(st.session_state.user_id, holder=session_id())
             st.session_state.adder = None
             st.session_state.user_id = ""
-            st.session_state.companies = []
-            st.session_state.models = []
+            st.session_state.companies_version = None
+            st.session_state.pop("recent_companies", None)
+            st.session_state.pop("contacts_by_company", None)
+            st.session_state.models_version = None
             st.rerun()
     else:
         email = st.sidebar.text_input("Email", key="login_email")
@@ -57,7 +125,7 @@ def render_sidebar():
                 st.sidebar.error("Please enter your email address to log in.")
             else:
                 with st.spinner("Logging in..."):
-                    adder, message = quoting_utils.login_to_addlify(email, password)
+                    adder, message = quoting_utils.login_to_addlify(email, password, holder=session_id())
                     if adder:
                         st.session_state.adder = adder
                         st.session_state.user_id = email  # Set user_id to Addlify email
@@ -65,8 +133,10 @@ def render_sidebar():
                         bundle_store.log_user_login(st.session_state.user_id)
                         # Preload data on login
                         with st.spinner("Loading companies and models..."):
-                            st.session_state.companies = quoting_utils.fetch_all_companies(adder)
-                            st.session_state.models = pd.DataFrame(quoting_utils.load_models())
+                            companies = quoting_utils.fetch_all_companies(adder)
+                            st.session_state.companies_version = catalogue.CATALOGUES.publish("companies", companies).version
+                            models = quoting_utils.load_models()
+                            st.session_state.models_version = catalogue.CATALOGUES.publish("models", models).version
                         st.rerun()
                     else:
                         st.sidebar.error(message)
@@ -76,7 +146,7 @@ def render_sidebar():
     # --- Navigation ---
     navigation_options = ["Bundle Builder", "My Bundles", "All Bundles", "Promotion Bundles", "Quote Page"]
     if is_special_user():
-        navigation_options.extend(["User Login Log", "Quote Log"])
+        navigation_options.extend(["User Login Log", "Quote Log", "Bundle Archive", "Export", "Metrics", "Background Jobs"])
 
     page = st.sidebar.radio(
         "Navigation",
@@ -85,6 +155,134 @@ def render_sidebar():
     )
     return page
 
+# --- Models ---
+
+def get_models_catalogue():
+    """The models catalogue this session loaded, or None before login."""
+    if st.session_state.get("models_version") is None:
+        return None
+    models = catalogue.CATALOGUES.get("models", st.session_state.models_version)
+    if models is None:
+        # dropped after newer crawls were published; the models file is the same for everyone, so load it again
+        models = catalogue.CATALOGUES.publish("models", quoting_utils.load_models())
+        st.session_state.models_version = models.version
+    return models
+
+def get_models():
+    """The loaded models as a DataFrame (shared by every session, don't modify it), empty before login."""
+    models = get_models_catalogue()
+    if models is None:
+        return pd.DataFrame()
+    return models.derived("frame", pd.DataFrame)
+
+def _model_options(models):
+    records = models.to_dict('records')
+    labels = [f"{m['modelNumber']} (SKU: {m['skuCode']})" for m in records]
+    return records, labels, {m['id']: i for i, m in enumerate(records)}
+
+def get_model_options():
+    """
+    The loaded models as (records, labels, position by model id) for the model selectboxes, converted once per
+    models list instead of once per selectbox on every rerun.
+    """
+    models = get_models_catalogue()
+    frame = models.derived("frame", pd.DataFrame)
+    return models.derived("options", lambda data: _model_options(frame))
+
+# --- Pricing ---
+
+def _list_prices(models):
+    prices = pricing.list_prices_from_models(models)
+    return prices, quote_plan.prices_token(prices)
+
+def _list_prices_entry():
+    # (prices, token), computed once per models catalogue
+    models = get_models_catalogue()
+    if models is None:
+        return None, None
+    frame = models.derived("frame", pd.DataFrame)
+    return models.derived("list_prices", lambda data: _list_prices(frame))
+
+def get_list_prices():
+    """List price per model id from the loaded models, if the models list has prices."""
+    return _list_prices_entry()[0]
+
+def get_quote_plan(bundle_name):
+    """The bundle's compiled quote plan, priced with the loaded list prices."""
+    prices, token = _list_prices_entry()
+    return bundle_store.get_quote_plan(bundle_name, list_prices=prices, token=token)
+
+def render_bundle_cost(bundle_name, bundle_details):
+    """Shows a bundle's total cost, with included bundles and multiples applied."""
+    try:
+        priced = get_quote_plan(bundle_name).lines
+    except bundle_graph.BundleGraphError:
+        priced = pricing.price_lines(bundle_details, apply_multiple=True, list_prices=get_list_prices())
+    summary = pricing.summarize(priced)
+    discount = f"-${summary['discount']:,.2f} vs list" if summary['discount'] else None
+    st.metric("Total Bundle Cost", f"${summary['total']:,.2f}", delta=discount, delta_color="off")
+    if summary['missing_prices']:
+        st.caption(f"{summary['missing_prices']} item(s) have no price and are counted as $0.")
+
+# --- Company Search ---
+
+@st.fragment(run_every=1)
+def render_companies_job(job_id):
+    """Polls the background company list refresh and swaps the new list in when it's done."""
+    job = quoting_utils.get_job_queue().get(job_id)
+    if job is None or job["status"] in job_queue.FINISHED:
+        st.session_state.companies_job_id = None
+        if job is not None and job["status"] == job_queue.DONE:
+            st.session_state.companies_version = catalogue.CATALOGUES.publish("companies", job["result"]).version
+        st.rerun(scope="app")
+    st.progress(job["progress"], text=job["message"] or "Waiting for a worker...")
+
+def refresh_companies():
+    """Fetches this user's company list again in the background; the sidebar follows the job."""
+    if not st.session_state.get("companies_job_id"):
+        st.session_state.companies_job_id = quoting_utils.get_job_queue().submit(
+            "refresh_companies", owner=st.session_state.user_id, resources={"adder": st.session_state.adder}
+        )
+    st.rerun()
+
+def get_companies_catalogue():
+    """
+    The company list this session fetched (shared by every session holding the same list, don't modify its data),
+    or None before login or while it's fetched again.
+    """
+    if st.session_state.get("companies_version") is None:
+        return None
+    companies = catalogue.CATALOGUES.get("companies", st.session_state.companies_version)
+    if companies is None:
+        # dropped after newer lists were published; the latest may be another user's, so fetch ours again
+        st.session_state.companies_version = None
+        refresh_companies()
+    return companies
+
+def get_company_index(companies):
+    """The search index over a company list, built once per list and shared by every session."""
+    return companies.derived("index", company_search.CompanyIndex)
+
+def get_recent_companies():
+    """The companies this user quoted most recently, newest first (seeded from the quote log once per session)."""
+    if "recent_companies" not in st.session_state:
+        st.session_state.recent_companies = company_search.recent_company_ids(
+            bundle_store.get_quote_log_df(), st.session_state.user_id
+        )
+    return st.session_state.recent_companies
+
+def get_contacts(company_id):
+    """The company's contacts, fetched from Addlify once per company and session rather than on every rerun."""
+    cache = st.session_state.setdefault("contacts_by_company", {})
+    if company_id not in cache:
+        cache[company_id] = quoting_utils.get_contacts_for(st.session_state.adder, company_id)
+    return cache[company_id]
+
+def remember_company(company_id):
+    """Moves a company to the front of the recent companies."""
+    recent = [c for c in get_recent_companies() if c != company_id]
+    st.session_state.recent_companies = [company_id] + recent[:company_search.DEFAULT_LIMIT - 1]
+
 # --- Page Implementations ---
 
 def page_bundle_builder():
@@ -98,12 +296,13 @@ def page_bundle_builder():
         st.session_state.bundle_name = ""
         st.session_state.bundle_desc = ""
         st.session_state.bundle_builder_items = [{"parent_model_id": None, "dependents": []}]
+        st.session_state.included_bundles = []
 
     if not st.session_state.get("adder"):
         st.warning("Please log in to Addlify via the sidebar to create bundles.")
         return
 
-    models_df = st.session_state.get("models", pd.DataFrame())
+    models_df = get_models()
     if models_df.empty:
         st.warning("Models not loaded. Please log in to load model data.")
         return
@@ -118,64 +317,26 @@ def page_bundle_builder():
 
     st.subheader("Bundle Items")
 
-    items = st.session_state.bundle_builder_items
-    
-    # --- Parent Selection ---
-    parent_item = items[0]
-    st.markdown("**Parent Product**")
-    parent_cols = st.columns([4, 1])
-    parent_model = parent_cols[0].selectbox(
-        "Select Parent Model",
-        options=models_df.to_dict('records'),
-        format_func=lambda m: f"{m['modelNumber']} (SKU: {m['skuCode']})",
-        key="parent_model_select"
-    )
-    parent_item['price_override'] = parent_cols[1].number_input(
-        "Price Override", min_value=0.0, value=parent_item.get('price_override', 0.0), 
-        step=0.01, key="parent_price_override"
-    )
-    parent_item['parent_model_id'] = parent_model['id'] if parent_model else None
-    parent_item['parent_group_name'] = parent_model['modelNumber'] if parent_model else ""
-
+    # the parent and each dependent row are fragments: changing one of their widgets reruns just that part
+    render_parent_item()
 
-    # --- Dependent Selection ---
     st.markdown("**Dependent Products**")
-    
-    for i, dep in enumerate(parent_item.get('dependents', [])):
-        st.markdown(f"---")
-        cols = st.columns([4, 2, 2, 1])
-        dep_model = cols[0].selectbox(
-            f"Dependent Model #{i+1}",
-            options=models_df.to_dict('records'),
-            format_func=lambda m: f"{m['modelNumber']} (SKU: {m['skuCode']})",
-            key=f"dep_model_{i}",
-            index=dep.get('model_index', 0)
-        )
-        
-        dep['dependent_model_id'] = dep_model['id'] if dep_model else None
-        dep['dependent_group_name'] = dep_model['modelNumber'] if dep_model else ""
-        dep['model_index'] = models_df.to_dict('records').index(dep_model) if dep_model else 0
-
-        if is_special_user():
-            dep['mapping_type'] = cols[1].selectbox(
-                "Mapping", ["Objective", "Subjective"], key=f"map_type_{i}",
-                index=["Objective", "Subjective"].index(dep.get('mapping_type', 'Objective'))
-            )
-            dep['multiple'] = cols[2].number_input("Multiple", min_value=0.1, value=dep.get('multiple', 1.0), step=0.1, key=f"multiple_{i}")
-        else:
-            dep['mapping_type'] = "Objective"
-            dep['multiple'] = 1.0
-
-        dep['quantity'] = cols[2].number_input("Default Qty", min_value=1, value=dep.get('quantity', 1), step=1, key=f"qty_{i}")
-        dep['price_override'] = cols[3].number_input("Price Override", min_value=0.0, value=dep.get('price_override', 0.0), step=0.01, key=f"price_{i}")
-
-        if cols[3].button("❌", key=f"remove_dep_{i}"):
-            parent_item['dependents'].pop(i)
-            st.rerun()
-
-    if st.button("➕ Add Dependent"):
-        parent_item.setdefault('dependents', []).append({})
-        st.rerun()
+    for i in range(len(st.session_state.bundle_builder_items[0].get('dependents', []))):
+        render_dependent(i)
+
+    st.button("➕ Add Dependent", on_click=add_dependent)
+
+    # --- Included Bundles ---
+    st.markdown("**Included Bundles**")
+    existing_bundles = bundle_store.load_bundles()
+    bundle_options = [] if existing_bundles.empty else sorted(n for n in existing_bundles['bundle_name'].unique() if n != bundle_name)
+    parent_item = st.session_state.bundle_builder_items[0]
+    parent_item['included_bundles'] = st.multiselect(
+        "Add the items of other bundles to this one",
+        options=bundle_options,
+        default=[b for b in parent_item.get('included_bundles', []) if b in bundle_options],
+        key="included_bundles"
+    )
 
     # --- Save Bundle ---
     st.markdown("---")
@@ -211,14 +372,109 @@ def page_bundle_builder():
                     "min_quantity": dep.get('min_quantity', 1),
                     "price_override": dep.get('price_override', 0.0)
                 })
+            # Included bundles hang below the parent and are expanded when quoting
+            for included in parent_item.get('included_bundles', []):
+                bundle_items_to_save.append({
+                    "parent_model_id": parent_item['parent_model_id'],
+                    "parent_group_name": parent_item['parent_group_name'],
+                    "dependent_model_id": None,
+                    "dependent_group_name": included,
+                    "mapping_type": bundle_graph.BUNDLE_REFERENCE,
+                    "multiple": 1,
+                    "quantity": 1,
+                    "min_quantity": 1,
+                    "price_override": None
+                })
 
-            bundle_id, version = bundle_store.save_bundle(
-                bundle_name, bundle_items_to_save, st.session_state.user_id,
-                description=bundle_desc, bundle_type=bundle_type
-            )
+            try:
+                bundle_id, version = bundle_store.save_bundle(
+                    bundle_name, bundle_items_to_save, st.session_state.user_id,
+                    description=bundle_desc, bundle_type=bundle_type
+                )
+            except (bundle_store.BundleConflictError, bundle_graph.BundleGraphError) as e:
+                st.error(str(e))
+                return
             st.session_state.bundle_saved_success = f"✅ Bundle '{bundle_name}' saved as Version {version} (ID: {bundle_id})"
             st.rerun()
 
+def add_dependent(model_index=None):
+    """Appends a dependent row to the bundle being built (a button callback, so no extra rerun is needed)."""
+    dep = {} if model_index is None else {'model_index': model_index}
+    st.session_state.bundle_builder_items[0].setdefault('dependents', []).append(dep)
+
+@st.fragment
+@timed_render("bundle_builder_parent")
+def render_parent_item():
+    """The parent model, its price override and the dependents suggested for it."""
+    parent_item = st.session_state.bundle_builder_items[0]
+    records, labels, positions = get_model_options()
+    st.markdown("**Parent Product**")
+    parent_cols = st.columns([4, 1])
+    parent_position = parent_cols[0].selectbox(
+        "Select Parent Model",
+        options=range(len(records)),
+        format_func=labels.__getitem__,
+        key="parent_model_select"
+    )
+    parent_model = records[parent_position] if parent_position is not None else None
+    parent_item['price_override'] = parent_cols[1].number_input(
+        "Price Override", min_value=0.0, value=parent_item.get('price_override', 0.0), 
+        step=0.01, key="parent_price_override"
+    )
+    parent_item['parent_model_id'] = parent_model['id'] if parent_model else None
+    parent_item['parent_group_name'] = parent_model['modelNumber'] if parent_model else ""
+
+    # --- Suggested Dependents ---
+    already_added = [d.get('dependent_model_id') for d in parent_item.get('dependents', [])]
+    suggestions = bundle_store.suggest_dependents(parent_item['parent_model_id'], k=5, exclude=already_added)
+    suggestions = [(model_id, weight) for model_id, weight in suggestions if model_id in positions]
+    if suggestions:
+        st.caption("Often bundled with this parent:")
+        suggestion_cols = st.columns(len(suggestions))
+        for col, (model_id, weight) in zip(suggestion_cols, suggestions):
+            model_index = positions[model_id]
+            if col.button(f"➕ {records[model_index]['modelNumber']}", key=f"suggest_{model_id}", help=f"Association weight {weight:g}"):
+                add_dependent(model_index)
+                st.rerun()  # the new row is outside this fragment
+
+@st.fragment
+@timed_render("bundle_builder_dependent")
+def render_dependent(i):
+    """One dependent row of the bundle being built."""
+    dep = st.session_state.bundle_builder_items[0]['dependents'][i]
+    records, labels, _ = get_model_options()
+    st.markdown(f"---")
+    cols = st.columns([4, 2, 2, 1])
+    dep_position = cols[0].selectbox(
+        f"Dependent Model #{i+1}",
+        options=range(len(records)),
+        format_func=labels.__getitem__,
+        key=f"dep_model_{i}",
+        index=dep.get('model_index', 0)
+    )
+    dep_model = records[dep_position] if dep_position is not None else None
+
+    dep['dependent_model_id'] = dep_model['id'] if dep_model else None
+    dep['dependent_group_name'] = dep_model['modelNumber'] if dep_model else ""
+    dep['model_index'] = dep_position if dep_model else 0
+
+    if is_special_user():
+        dep['mapping_type'] = cols[1].selectbox(
+            "Mapping", ["Objective", "Subjective"], key=f"map_type_{i}",
+            index=["Objective", "Subjective"].index(dep.get('mapping_type', 'Objective'))
+        )
+        dep['multiple'] = cols[2].number_input("Multiple", min_value=0.1, value=dep.get('multiple', 1.0), step=0.1, key=f"multiple_{i}")
+    else:
+        dep['mapping_type'] = "Objective"
+        dep['multiple'] = 1.0
+
+    dep['quantity'] = cols[2].number_input("Default Qty", min_value=1, value=dep.get('quantity', 1), step=1, key=f"qty_{i}")
+    dep['price_override'] = cols[3].number_input("Price Override", min_value=0.0, value=dep.get('price_override', 0.0), step=0.01, key=f"price_{i}")
+
+    if cols[3].button("❌", key=f"remove_dep_{i}"):
+        st.session_state.bundle_builder_items[0]['dependents'].pop(i)
+        st.rerun()  # the rows below move up, so the whole list is drawn again
+
 def page_my_bundles():
     """Page for viewing and managing the user's own bundles."""
     st.header("📚 My Bundles")
@@ -241,11 +497,10 @@ def page_my_bundles():
         bundle_details = bundle_store.get_bundle_details(selected_bundle_name)
         st.subheader(f"Details for: {selected_bundle_name} (v{bundle_details['bundle_version'].iloc[0]}) ")
         
-        total_cost = (bundle_details['price_override'] * bundle_details['quantity']).sum()
-        st.metric("Total Bundle Cost", f"${total_cost:,.2f}")
+        render_bundle_cost(selected_bundle_name, bundle_details)
 
         display_df = bundle_details.copy()
-        display_df['Role'] = display_df['mapping_type'].apply(lambda x: 'Parent' if x == 'root' else 'Dependent')
+        display_df['Role'] = display_df['mapping_type'].apply(lambda x: {'root': 'Parent', 'bundle': 'Included Bundle'}.get(x, 'Dependent'))
         
         columns_to_show = ['Role', 'dependent_group_name', 'quantity', 'price_override']
         if is_special_user():
@@ -270,6 +525,14 @@ def page_my_bundles():
             st.session_state.page_selection = "Quote Page"
             st.rerun()
 
+        with st.expander("Version history"):
+            if st.checkbox("Load all versions, archived ones included", key="load_bundle_history"):
+                history = bundle_store.get_bundle_history(selected_bundle_name)
+                st.dataframe(history.groupby('bundle_version', as_index=False).agg(
+                    status=('status', 'first'), created_by=('created_by', 'first'),
+                    created_at=('created_at', 'first'), items=('dependent_model_id', 'count'),
+                ), use_container_width=True)
+
 def page_all_bundles():
     """Page for viewing all bundles from all users."""
     st.header("🌐 All Bundles")
@@ -288,11 +551,10 @@ def page_all_bundles():
         bundle_details = bundle_store.get_bundle_details(selected_bundle_name)
         st.subheader(f"Details for: {selected_bundle_name} (v{bundle_details['bundle_version'].iloc[0]}) by {bundle_details['created_by'].iloc[0]}")
         
-        total_cost = (bundle_details['price_override'] * bundle_details['quantity']).sum()
-        st.metric("Total Bundle Cost", f"${total_cost:,.2f}")
+        render_bundle_cost(selected_bundle_name, bundle_details)
 
         display_df = bundle_details.copy()
-        display_df['Role'] = display_df['mapping_type'].apply(lambda x: 'Parent' if x == 'root' else 'Dependent')
+        display_df['Role'] = display_df['mapping_type'].apply(lambda x: {'root': 'Parent', 'bundle': 'Included Bundle'}.get(x, 'Dependent'))
         
         columns_to_show = ['Role', 'dependent_group_name', 'quantity', 'price_override']
         if is_special_user():
@@ -328,11 +590,10 @@ def page_promotion_bundles():
         bundle_details = bundle_store.get_bundle_details(selected_bundle_name)
         st.subheader(f"Details for: {selected_bundle_name} (v{bundle_details['bundle_version'].iloc[0]}) by {bundle_details['created_by'].iloc[0]}")
         
-        total_cost = (bundle_details['price_override'] * bundle_details['quantity']).sum()
-        st.metric("Total Bundle Cost", f"${total_cost:,.2f}")
+        render_bundle_cost(selected_bundle_name, bundle_details)
 
         display_df = bundle_details.copy()
-        display_df['Role'] = display_df['mapping_type'].apply(lambda x: 'Parent' if x == 'root' else 'Dependent')
+        display_df['Role'] = display_df['mapping_type'].apply(lambda x: {'root': 'Parent', 'bundle': 'Included Bundle'}.get(x, 'Dependent'))
         
         columns_to_show = ['Role', 'dependent_group_name', 'quantity', 'price_override']
         if is_special_user():
@@ -354,20 +615,26 @@ def page_quote():
         st.stop()
 
     # --- Company and Contact Selection ---
-    companies = st.session_state.get("companies", [])
-    if not companies:
+    companies = get_companies_catalogue()
+    if companies is None or not companies.data:
         st.error("Company list not loaded.")
         st.stop()
 
-    selected_company = st.selectbox(
+    index = get_company_index(companies)
+    company_query = st.text_input("Search Companies", key="quote_company_search", placeholder="Name or Amplify ID")
+    matches = index.search(company_query, recent=get_recent_companies())
+    if not matches:
+        st.warning(f"No companies match '{company_query}'.")
+        st.stop()
+    selected_position = st.selectbox(
         "Select Company",
-        options=companies,
-        format_func=lambda c: f"{c['displayName']} ({c['amplifyId']})",
+        options=matches,
+        format_func=index.labels.__getitem__,
         key="quote_company"
     )
-    company_id = selected_company["customerId"]
+    company_id = companies.data[selected_position]["customerId"]
 
-    contacts = quoting_utils.get_contacts_for(st.session_state.adder, company_id)
+    contacts = get_contacts(company_id)
     selected_contact = st.selectbox(
         "Select Contact",
         options=contacts,
@@ -394,24 +661,19 @@ def page_quote():
     if not selected_bundles:
         st.info("Select one or more bundles to see the line items.")
     else:
-        line_items = []
+        plans = []
         for bundle_name in selected_bundles:
-            bundle_details = bundle_store.get_bundle_details(bundle_name)
-            if bundle_details is not None:
-                line_items.extend(bundle_details.to_dict('records'))
-        
-        if 'quote_line_items' not in st.session_state or st.session_state.get('last_selected_bundles') != selected_bundles:
-            st.session_state.quote_line_items = line_items
+            try:
+                plans.append(get_quote_plan(bundle_name))
+            except bundle_graph.BundleGraphError as e:
+                st.error(str(e))
+
+        if 'quote_plans' not in st.session_state or st.session_state.get('last_selected_bundles') != selected_bundles:
+            st.session_state.quote_plans = plans
             st.session_state.last_selected_bundles = selected_bundles
 
-        items_df = pd.DataFrame(st.session_state.quote_line_items)
-        
-        edited_items = st.data_editor(
-            items_df[['dependent_group_name', 'quantity', 'price_override']],
-            num_rows="dynamic",
-            key="quote_items_editor"
-        )
-        st.session_state.quote_line_items_edited = edited_items
+        # editing a quantity or price reruns only the editor and the totals
+        render_quote_lines()
 
     # --- Create Quote Button ---
     if st.button("🚀 Create Quote in Addlify", type="primary"):
@@ -420,51 +682,199 @@ def page_quote():
         elif 'quote_line_items_edited' not in st.session_state or st.session_state.quote_line_items_edited.empty:
             st.error("No line items to quote.")
         else:
-            with st.spinner("Creating quote..."):
-                try:
-                    expiry_str = expiry_date.strftime("%Y-%m-%d")
-                    quote_id, quote_url = quoting_utils.create_new_quote(
-                        st.session_state.adder, company_id, quote_title, expiry_str, contact_id
-                    )
-                    
-                    info = quoting_utils.get_quote_info(st.session_state.adder, company_id, quote_id)
-                    section_id = info.get("sections", [])[-1]["id"]
-
-                    errors = []
-                    final_items = pd.merge(
-                        pd.DataFrame(st.session_state.quote_line_items),
-                        st.session_state.quote_line_items_edited,
-                        on='dependent_group_name',
-                        suffixes=('', '_edited')
-                    )
-
-                    for _, item in final_items.iterrows():
-                        try:
-                            quoting_utils.add_line_item_to_quote(
-                                st.session_state.adder, company_id, quote_id, section_id,
-                                product_id=item['dependent_model_id'],
-                                price=item['price_override_edited'],
-                                quantity=item['quantity_edited'],
-                                min_quantity=item.get('min_quantity', 1)
-                            )
-                        except Exception as e:
-                            errors.append({'item': item['dependent_group_name'], 'error': str(e)})
-                    
-                    total_value = quoting_utils.calculate_total_value(final_items.to_dict('records'))
-                    bundle_store.log_quote(st.session_state.user_id, ", ".join(selected_bundles), total_value, quote_url)
-
-                    st.success(f"Quote created successfully! [View on Addlify]({quote_url})")
-                    if errors:
-                        st.error("Some line items failed to add:")
-                        st.json(errors)
-
-                except Exception as e:
-                    st.error(f"Failed to create quote: {e}")
+            priced_items = quote_plan.build_quote(
+                st.session_state.quote_plans, st.session_state.quote_line_items_edited
+            )
+            line_columns = ['bundle_name', 'dependent_group_name', 'dependent_model_id', 'unit_price',
+                            'effective_quantity', 'min_quantity', 'missing_price']
+            lines = priced_items[line_columns]
+            params = {
+                "company_id": company_id,
+                "title": quote_title,
+                "expiry_date": expiry_date.strftime("%Y-%m-%d"),
+                "contact_id": contact_id,
+                "lines": lines.astype(object).where(lines.notna(), None).to_dict("records"),
+                "bundle_names": selected_bundles,
+                "total_value": pricing.summarize(priced_items[~priced_items['missing_price']])['total'],
+                "user_id": st.session_state.user_id,
+            }
+            st.session_state.quote_job_id = quoting_utils.get_job_queue().submit(
+                "create_quote", params, owner=st.session_state.user_id, resources={"adder": st.session_state.adder}
+            )
+            remember_company(company_id)
+
+    # --- Quote Creation Progress ---
+    if st.session_state.get("quote_job_id"):
+        render_quote_job(st.session_state.quote_job_id)
+    message = st.session_state.pop("quote_job_message", None)
+    if message is not None:
+        getattr(st, message[0])(message[1])
+
+    # --- Update an Existing Quote ---
+    if selected_bundles and 'quote_line_items_edited' in st.session_state:
+        render_quote_update(company_id)
+
+    # --- Last Quote's Line Items ---
+    if st.session_state.get("quote_journal") is not None:
+        render_quote_journal(st.session_state.quote_journal)
+
+@st.fragment
+@timed_render("quote_lines")
+def render_quote_lines():
+    """The selected bundles' line items for editing, with the quote's totals."""
+    items_df = quote_plan.build_quote(st.session_state.quote_plans)
+
+    edited_items = st.data_editor(
+        items_df[['dependent_group_name', 'quantity', 'price_override']],
+        num_rows="dynamic",
+        key="quote_items_editor"
+    )
+    st.session_state.quote_line_items_edited = edited_items
+
+    # --- Pricing Preview ---
+    summary = pricing.summarize(quote_plan.build_quote(st.session_state.quote_plans, edited_items))
+    cols = st.columns(3)
+    cols[0].metric("Quote Total", f"${summary['total']:,.2f}")
+    if summary['list_total']:
+        cols[1].metric("List Total", f"${summary['list_total']:,.2f}")
+        cols[2].metric("Discount", f"${summary['discount']:,.2f}", delta=f"{summary['discount_pct']:.1f}%", delta_color="off")
+    if summary['subtotals'] is not None and len(summary['subtotals']) > 1:
+        st.dataframe(summary['subtotals'], use_container_width=True, hide_index=True)
+    if summary['below_min_quantity']:
+        st.warning(f"{summary['below_min_quantity']} line(s) are below their minimum quantity and will be raised to it.")
+    if summary['missing_prices']:
+        st.warning(f"{summary['missing_prices']} line(s) have no price and will not be added to the quote.")
+
+@st.fragment(run_every=1)
+def render_quote_job(job_id):
+    """Polls the background quote creation job; once it's finished the page shows its line item results."""
+    job = quoting_utils.get_job_queue().get(job_id)
+    if job is None or job["status"] in job_queue.FINISHED:
+        st.session_state.quote_job_id = None
+        if job is not None and job["status"] == job_queue.DONE and job["result"].get("error"):
+            # the quote exists without its lines, creating it again would duplicate it
+            st.session_state.quote_job_message = ("error", f"{job['result']['error']} Add them to quote {job['result']['quote_id']} with \"Update an existing quote instead\". [View on Addlify]({job['result']['quote_url']})")
+        elif job is not None and job["status"] == job_queue.DONE:
+            st.session_state.quote_journal = QuoteJournal.from_dict(job["result"])
+            st.session_state.quote_job_message = ("success", f"Quote created successfully! [View on Addlify]({job['result']['quote_url']})")
+            if job["result"].get("log_error"):
+                st.session_state.quote_job_message = ("warning", f"Quote created ([View on Addlify]({job['result']['quote_url']})), but it couldn't be added to the quote log: {job['result']['log_error']}")
+        elif job is not None:
+            st.session_state.quote_job_message = ("error", f"Failed to create quote: {job['error'].splitlines()[0]}")
+        st.rerun(scope="app")
+    st.progress(job["progress"], text=job["message"] or "Waiting for a worker...")
+
+def render_quote_update(company_id):
+    """
+    Revises an existing quote to the line items above, sending only the lines that differ. A revision isn't a new
+    quote, so it isn't added to the quote log.
+    """
+    with st.expander("Update an existing quote instead"):
+        last_journal = st.session_state.get("quote_journal")
+        quote_id = st.text_input(
+            "Quote ID", value=last_journal.quote_id if last_journal is not None else "", key="update_quote_id"
+        )
+        target = quote_plan.payloads(quote_plan.build_quote(
+            st.session_state.quote_plans, st.session_state.quote_line_items_edited
+        ))
+        if st.button("Compare with quote", disabled=not quote_id):
+            try:
+                info = quoting_utils.get_quote_info(st.session_state.adder, company_id, quote_id)
+                section_id = info.get("sections", [])[-1]["id"]
+                delta = quote_diff.diff_quote(quote_diff.existing_lines(info, section_id), target)
+                st.session_state.quote_update = (company_id, quote_id, section_id, delta, target)
+            except Exception as e:
+                st.session_state.pop("quote_update", None)
+                st.error(f"Could not load quote {quote_id}: {e}")
+
+        pending = st.session_state.get("quote_update")
+        if pending is None or pending[:2] != (company_id, quote_id):
+            return
+        _, _, section_id, delta, compared = pending
+        if compared != target:
+            # the delta was computed for other line items, applying it would send the old ones
+            st.session_state.pop("quote_update", None)
+            st.info("The line items changed since the comparison. Compare with the quote again.")
+            return
+        counts = delta.summary()
+        cols = st.columns(4)
+        cols[0].metric("Add", counts["add"])
+        cols[1].metric("Update", counts["update"])
+        cols[2].metric("Delete", counts["delete"])
+        cols[3].metric("Unchanged", counts["unchanged"])
+        if not len(delta):
+            st.success("The quote already matches these line items.")
+            return
+        if st.button(f"Apply {len(delta)} change(s)", type="primary"):
+            progress = st.progress(0.0, text="Updating quote...")
+            results = quote_diff.apply_quote_diff(
+                st.session_state.adder, company_id, quote_id, section_id, delta,
+                on_call=lambda done, total, result: progress.progress(done / total, text=f"Sent {done}/{total} changes")
+            )
+            progress.empty()
+            st.session_state.pop("quote_update", None)
+            failed = [r for r in results if r["error"]]
+            quote_url = quoting_utils.get_public_quote_url(company_id, quote_id)
+            remember_company(company_id)
+            if failed:
+                st.error(f"{len(failed)} of {len(results)} change(s) failed. Compare again to retry them.")
+                st.dataframe(pd.DataFrame(failed), use_container_width=True, hide_index=True)
+            else:
+                st.success(f"Quote updated with {len(results)} change(s). [View on Addlify]({quote_url})")
+
+def render_quote_journal(journal):
+    """Shows the outcome of the last quote's line items, with the failed-line report and a retry for them."""
+    counts = journal.counts()
+    st.subheader("Line Item Results")
+    cols = st.columns(3)
+    cols[0].metric("Added", counts["added"])
+    cols[1].metric("Failed", counts["failed"])
+    cols[2].metric("Skipped", counts["skipped"])
+    problems = journal.to_frame(("failed", "skipped"))
+    if not problems.empty:
+        st.error(f"{len(problems)} line item(s) were not added to [the quote]({journal.quote_url}).")
+        st.dataframe(problems, use_container_width=True, hide_index=True)
+    with st.expander("All line items"):
+        st.dataframe(journal.to_frame(), use_container_width=True, hide_index=True)
+
+    col1, col2 = st.columns(2)
+    # written only when asked for, not on every rerun of the quote page
+    if col1.button("Prepare line item report (.xlsx)"):
+        path = exporter.export_tables(journal.tables(), "xlsx")
+        try:
+            with open(path, "rb") as f:
+                col1.download_button("Download line item report (.xlsx)", f.read(),
+                                     file_name=f"quote_{journal.quote_id}_line_items.xlsx", on_click="ignore")
+        finally:
+            os.remove(path)
+    if st.session_state.get("quote_retry_job_id"):
+        with col2:
+            render_quote_retry_job(st.session_state.quote_retry_job_id)
+    elif counts["failed"] and col2.button(f"Retry {counts['failed']} failed line item(s)"):
+        st.session_state.quote_retry_job_id = quoting_utils.get_job_queue().submit(
+            "retry_quote_lines", {"journal": journal.to_dict()}, owner=st.session_state.user_id,
+            resources={"adder": st.session_state.adder}
+        )
+        st.rerun()
+
+@st.fragment(run_every=1)
+def render_quote_retry_job(job_id):
+    """Polls the background retry of the failed line items; once it's finished the page shows the new results."""
+    job = quoting_utils.get_job_queue().get(job_id)
+    if job is None or job["status"] in job_queue.FINISHED:
+        st.session_state.quote_retry_job_id = None
+        if job is not None and job["status"] == job_queue.DONE:
+            st.session_state.quote_journal = QuoteJournal.from_dict(job["result"])
+        elif job is not None:
+            st.session_state.quote_job_message = ("error", f"Retry failed: {job['error'].splitlines()[0]}")
+        st.rerun(scope="app")
+    st.progress(job["progress"], text=job["message"] or "Waiting for a worker...")
 
 def page_user_login_log():
     """Page for viewing user login activity."""
     st.header("📈 User Login Log")
-    user_stats_df = bundle_store.get_user_stats_df()
+    with sheet_quota.SHEET_QUOTA.priority(sheet_quota.ANALYTICS):
+        user_stats_df = bundle_store.get_user_stats_df()
     if user_stats_df.empty:
         st.info("No user login data found.")
     else:
@@ -473,33 +883,161 @@ def page_user_login_log():
 def page_quote_log():
     """Page for viewing the quote history."""
     st.header("📜 Quote Log")
-    quote_log_df = bundle_store.get_quote_log_df()
+    with sheet_quota.SHEET_QUOTA.priority(sheet_quota.ANALYTICS):
+        quote_log_df = bundle_store.get_quote_log_df()
     if quote_log_df.empty:
         st.info("No quote data found.")
     else:
         st.dataframe(quote_log_df, use_container_width=True)
 
+def page_bundle_archive():
+    """Page for compacting the bundles sheet and browsing archived revisions."""
+    st.header("🗄️ Bundle Archive")
+    hot_df = bundle_store.get_bundle_definitions_df()
+    archive_df = bundle_store.get_bundle_archive_df()
+
+    col1, col2 = st.columns(2)
+    col1.metric("Rows in 'bundles'", len(hot_df))
+    col2.metric("Rows in 'bundles_archive'", len(archive_df))
+    for issue in bundle_schema.validate(hot_df, "bundles"):
+        st.warning(f"'bundles' sheet: {issue}")
+
+    st.caption("Compaction moves superseded versions and deprecated bundles into the archive, "
+               "so only the latest version of each live bundle is read on every page.")
+    archive_deprecated = st.checkbox("Also archive deprecated bundles", value=True)
+    if st.button("Compact now", type="primary"):
+        try:
+            moved = bundle_store.compact_bundles(archive_deprecated=archive_deprecated)
+            st.success(f"Moved {moved} rows to the archive.")
+        except bundle_store.BundleConflictError as e:
+            st.error(str(e))
+        except Exception as e:
+            st.error(f"Compaction failed, nothing was lost: {e}")
+
+    if not archive_df.empty:
+        st.subheader("Archived revisions")
+        st.dataframe(archive_df, use_container_width=True)
+
+def page_export():
+    """Page for downloading the bundle store, the quote log and per-bundle analytics."""
+    st.header("⬇️ Export")
+    st.caption("The export is written to a temporary file in chunks, so it works for the full history.")
+    fmt = st.radio("Format", ["Excel (.xlsx)", "Parquet (.zip)"], horizontal=True)
+    if st.button("Prepare export", type="primary"):
+        with st.spinner("Writing export..."), sheet_quota.SHEET_QUOTA.priority(sheet_quota.ANALYTICS):
+            bundles_df = bundle_store.get_bundle_definitions_df()
+            archive_df = bundle_store.get_bundle_archive_df()
+            quote_log_df = bundle_store.get_quote_log_df()
+            tables = {
+                "bundles": bundles_df,
+                "bundles_archive": archive_df,
+                "quote_log": quote_log_df,
+                "bundle_analytics": exporter.bundle_analytics(bundles_df, quote_log_df, archive_df),
+            }
+            path = exporter.export_tables(tables, "xlsx" if fmt.startswith("Excel") else "parquet")
+        try:
+            file_name = f"bundle_export_{datetime.date.today():%Y%m%d}{os.path.splitext(path)[1]}"
+            with open(path, "rb") as f:
+                st.download_button(f"Download {file_name}", f, file_name=file_name, on_click="ignore")
+        finally:
+            os.remove(path)
+
+def page_metrics():
+    """Page for viewing request/sheet latency and throughput."""
+    st.header("⏱️ Metrics")
+    metrics = instrumentation.METRICS
+    summary = metrics.snapshot()
+    if not summary:
+        st.info("No requests recorded yet.")
+    else:
+        st.caption("Latency per Addlify endpoint and worksheet, since the server started or the last reset.")
+        st.dataframe(pd.DataFrame(summary), use_container_width=True)
+    st.subheader("Google Sheets quota")
+    st.caption("Sheets API requests against the per-minute budgets; throttled requests waited for a token.")
+    st.dataframe(pd.DataFrame(sheet_quota.SHEET_QUOTA.stats()), use_container_width=True, hide_index=True)
+    coalesced = single_flight.SINGLE_FLIGHT.stats()
+    st.caption(f"Coalesced fetches: {coalesced['shared']} calls shared one of {coalesced['calls']} fetches, "
+               f"{coalesced['in_flight']} in flight.")
+    st.subheader("Shared catalogues")
+    janitor = catalogue.SESSION_JANITOR.stats()
+    st.caption(f"{janitor['sessions']} active session(s); {janitor['evicted']} idle session(s) trimmed after "
+               f"{janitor['idle_timeout'] / 60:g} minutes.")
+    catalogues = catalogue.CATALOGUES.stats()
+    if catalogues:
+        st.dataframe(pd.DataFrame(catalogues), use_container_width=True, hide_index=True)
+
+    col1, col2, col3 = st.columns(3)
+    col1.download_button("Download JSON", metrics.to_json(), file_name="metrics.json", mime="application/json")
+    col2.download_button("Download Prometheus text", metrics.to_prometheus(), file_name="metrics.prom", mime="text/plain")
+    if col3.button("Reset metrics"):
+        metrics.reset()
+        st.rerun()
+
+def page_background_jobs():
+    """Page for following background jobs and starting a model crawl."""
+    st.header("🧵 Background Jobs")
+    queue = quoting_utils.get_job_queue()
+    jobs = queue.recent(limit=50)
+    if not jobs:
+        st.info("No jobs yet.")
+    else:
+        jobs_df = pd.DataFrame(jobs)[["kind", "owner", "status", "progress", "message", "error", "created_at", "finished_at"]]
+        for column in ("created_at", "finished_at"):
+            jobs_df[column] = pd.to_datetime(jobs_df[column], unit="s")
+        jobs_df["error"] = jobs_df["error"].str.split("\n").str[0]
+        st.dataframe(jobs_df, use_container_width=True, hide_index=True)
+        if st.button("Refresh"):
+            st.rerun()
+
+    st.subheader("Crawl Models")
+    st.caption(f"Lists every model of each series and replaces those series in {quoting_utils.MODELS_JSON_PATH}.")
+    series_file = st.file_uploader("Series map (JSON of slug -> series name)", type="json")
+    allow_partial = st.checkbox("Write the listed series even if some fail",
+                                help="Otherwise a failed series fails the crawl and the models file is left as it is.")
+    if st.button("Start crawl", disabled=series_file is None or not st.session_state.adder):
+        series_map = json.load(series_file)
+        queue.submit("crawl_models", {"series_map": series_map, "allow_partial": allow_partial},
+                     owner=st.session_state.user_id, resources={"adder": st.session_state.adder})
+        st.success(f"Crawl of {len(series_map)} series queued.")
+
 # --- Main App Logic ---
 
 def main():
     """Main function to run the Streamlit app."""
+    start_metrics_server()
+    start_tracer()
     initialize_session_state()
-    page = render_sidebar()
-
-    if page == "Bundle Builder":
-        page_bundle_builder()
-    elif page == "My Bundles":
-        page_my_bundles()
-    elif page == "All Bundles":
-        page_all_bundles()
-    elif page == "Promotion Bundles":
-        page_promotion_bundles()
-    elif page == "Quote Page":
-        page_quote()
-    elif page == "User Login Log":
-        page_user_login_log()
-    elif page == "Quote Log":
-        page_quote_log()
+    track_session()
+
+    # the whole run is one trace record (a no-op unless tracing is on), see tracer.py
+    with tracer.rerun("app") as trace:
+        page = render_sidebar()
+        trace["page"] = page
+
+        # full-page runs; fragment reruns are recorded under their own part, see timed_render
+        with instrumentation.METRICS.timer("render", part=page):
+            if page == "Bundle Builder":
+                page_bundle_builder()
+            elif page == "My Bundles":
+                page_my_bundles()
+            elif page == "All Bundles":
+                page_all_bundles()
+            elif page == "Promotion Bundles":
+                page_promotion_bundles()
+            elif page == "Quote Page":
+                page_quote()
+            elif page == "User Login Log":
+                page_user_login_log()
+            elif page == "Quote Log":
+                page_quote_log()
+            elif page == "Bundle Archive":
+                page_bundle_archive()
+            elif page == "Export":
+                page_export()
+            elif page == "Metrics":
+                page_metrics()
+            elif page == "Background Jobs":
+                page_background_jobs()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
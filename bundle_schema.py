@@ -0,0 +1,211 @@
+"""
+Typed schemas for the worksheets, so pages work on compact, validated frames instead of whatever dtypes the
+sheet read happened to produce (mostly `object`).
+
+    python bundle_schema.py --rows 100000     # memory and coercion time of a bundles sheet, raw vs typed
+"""
+import argparse
+import time
+
+from lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
+
+# column kinds:
+#   category  repeated strings (ids, names, statuses) stored once per distinct value
+#   string    free text that rarely repeats, left as object
+#   int       nullable Int32
+#   float32   quantities and prices; prices are rounded back to cents on the way out, see to_records
+#   float64   money totals, where float32's 7 significant digits aren't enough
+#   datetime  ISO timestamps as datetime64
+BUNDLES_SCHEMA = {
+    "bundle_id": "category",
+    "bundle_name": "category",
+    "bundle_version": "int",
+    "status": "category",
+    "bundle_type": "category",
+    "parent_model_id": "category",
+    "parent_group_name": "category",
+    "dependent_model_id": "category",
+    "dependent_group_name": "category",
+    "mapping_type": "category",
+    "multiple": "float32",
+    "quantity": "int",
+    "min_quantity": "int",
+    "price_override": "float32",
+    "notes": "category",
+    "created_by": "category",
+    "created_at": "datetime",
+    "source_model_json": "category",
+    "user_id": "category",
+}
+
+SCHEMAS = {
+    "bundles": BUNDLES_SCHEMA,
+    "bundles_archive": {**BUNDLES_SCHEMA, "archived_at": "datetime"},
+    "user_stats": {
+        "user_id": "string",
+        "last_login": "datetime",
+        "login_count": "int",
+    },
+    "quote_log": {
+        "timestamp": "datetime",
+        "user_id": "category",
+        "bundle_name": "category",
+        "total_value": "float64",
+        "quote_url": "string",
+    },
+}
+
+# columns rounded to cents when handed back to code that sends them on (float32 can't hold 10.99 exactly)
+MONEY_COLUMNS = ("price_override",)
+
+# columns a row can't do without
+REQUIRED_COLUMNS = {
+    "bundles": ("bundle_id", "bundle_name", "bundle_version"),
+    "bundles_archive": ("bundle_id", "bundle_name", "bundle_version"),
+    "user_stats": ("user_id",),
+    "quote_log": ("timestamp",),
+}
+
+
+def _to_category(raw):
+    return raw.astype("category")
+
+
+def _to_string(raw):
+    return raw.astype(object)
+
+
+def _to_int(raw):
+    numbers = pd.to_numeric(raw, errors="coerce")
+    # a fractional value in an integer column is bad data, not something to round away
+    return numbers.where(numbers.round() == numbers).astype("Int32")
+
+
+def _to_float32(raw):
+    return pd.to_numeric(raw, errors="coerce").astype("float32")
+
+
+def _to_float64(raw):
+    return pd.to_numeric(raw, errors="coerce").astype("float64")
+
+
+def _to_datetime(raw):
+    return pd.to_datetime(raw, errors="coerce", format="ISO8601")
+
+
+_CONVERTERS = {
+    "category": _to_category,
+    "string": _to_string,
+    "int": _to_int,
+    "float32": _to_float32,
+    "float64": _to_float64,
+    "datetime": _to_datetime,
+}
+
+
+def _count_unreadable(raw, typed):
+    # values that were there but didn't survive the conversion; blank cells are just missing, not bad
+    lost = typed.isna() & raw.notna()
+    if not lost.any():
+        return 0
+    return int((raw[lost].astype(str).str.strip() != "").sum())
+
+
+def coerce(df, table: str):
+    """
+    Returns `df` converted to the table's schema. Columns the schema doesn't know are kept as they are, missing
+    ones are added as all-missing. Problems found on the way are listed in `result.attrs["schema_issues"]`.
+
+    Args:
+        df (pd.DataFrame): A frame as read from the worksheet.
+        table (str): The worksheet name, a key of SCHEMAS.
+
+    Returns:
+        pd.DataFrame: The typed frame.
+    """
+    schema = SCHEMAS[table]
+    if df.columns.empty:
+        return df
+    issues = []
+    columns = {}
+    for column, kind in schema.items():
+        if column in df.columns:
+            raw = df[column]
+        else:
+            issues.append(f"missing column '{column}'")
+            raw = pd.Series(None, index=df.index, dtype=object)
+        typed = _CONVERTERS[kind](raw)
+        unreadable = _count_unreadable(raw, typed)
+        if unreadable:
+            issues.append(f"{unreadable} values in '{column}' are not a valid {kind}")
+        columns[column] = typed
+    for column in df.columns:
+        if column not in schema:
+            columns[column] = df[column]
+
+    typed_df = pd.DataFrame(columns, index=df.index)
+    for column in REQUIRED_COLUMNS.get(table, ()):
+        missing = int(typed_df[column].isna().sum())
+        if missing:
+            issues.append(f"{missing} rows have no '{column}'")
+    typed_df.attrs["schema_issues"] = issues
+    return typed_df
+
+
+def validate(df, table: str) -> list:
+    """Returns the schema problems of a frame (raw or typed) as readable strings, empty if there are none."""
+    issues = df.attrs.get("schema_issues")
+    return list(issues) if issues is not None else coerce(df, table).attrs.get("schema_issues", [])
+
+
+def to_records(df) -> list:
+    """
+    `df.to_dict("records")` with plain Python values: missing values become None and float32 money columns are
+    rounded back to cents, so the records are safe to send to Addlify or keep in session state.
+    """
+    plain = df.astype(object).where(df.notna(), None)
+    for column in MONEY_COLUMNS:
+        if column in plain.columns:
+            plain[column] = [None if v is None else round(float(v), 2) for v in plain[column]]
+    return plain.to_dict("records")
+
+
+def memory_report(n_rows: int) -> dict:
+    """Memory and coercion time of a `bundles` sheet of `n_rows` rows, as read from the sheet vs typed."""
+    import io
+    from fake_backends import fake_bundle_rows
+
+    # round-trip through csv so the raw frame has the dtypes a sheet read produces
+    raw = pd.read_csv(io.StringIO(fake_bundle_rows(n_rows).to_csv(index=False)))
+    start = time.perf_counter()
+    typed = coerce(raw, "bundles")
+    seconds = time.perf_counter() - start
+    raw_bytes = int(raw.memory_usage(deep=True).sum())
+    typed_bytes = int(typed.memory_usage(deep=True).sum())
+    return {
+        "rows": len(raw),
+        "raw_mb": raw_bytes / 2**20,
+        "typed_mb": typed_bytes / 2**20,
+        "ratio": raw_bytes / typed_bytes,
+        "coerce_s": seconds,
+        "issues": typed.attrs["schema_issues"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args(argv)
+    report = memory_report(args.rows)
+    print(f"bundles sheet, {report['rows']:,} rows")
+    print(f"  as read: {report['raw_mb']:8.1f} MB")
+    print(f"  typed:   {report['typed_mb']:8.1f} MB  ({report['ratio']:.1f}x smaller)")
+    print(f"  coerce:  {report['coerce_s'] * 1000:8.1f} ms")
+    for issue in report["issues"]:
+        print(f"  issue: {issue}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,78 @@
 import streamlit as st
-import pandas as pd
+import random
+import time
 import uuid
 from datetime import datetime
-from streamlit_gsheets import GSheetsConnection
+import bundle_schema
+from association_index import ASSOCIATION_INDEX, split_quoted_bundles
+from bundle_graph import BundleGraph
+from instrumentation import METRICS
+from lazy_imports import lazy_import
+from quote_plan import QUOTE_PLANS
+from sheet_quota import SHEET_QUOTA, WRITE
+from sheet_sync import SHEET_SYNC, append_rows
+from single_flight import SINGLE_FLIGHT
+
+pd = lazy_import("pandas")
 
 # --- Google Sheets Connection ---
 
+_connection_override = None
+
+def use_connection(conn):
+    """Makes every bundle_store call use `conn` instead of the Google Sheets connection (None to undo), e.g. a fake for benchmarks."""
+    global _connection_override
+    _connection_override = conn
+
 def get_connection():
     """Creates and returns a connection to Google Sheets."""
+    if _connection_override is not None:
+        return _connection_override
+    # imported here, it pulls in gspread and the google auth stack
+    from streamlit_gsheets import GSheetsConnection
     return st.connection("gsheets", type=GSheetsConnection)
 
 # --- Data Loading and Schema ---
 
-def get_worksheet(conn, worksheet_name):
-    """Retrieves a worksheet, creating it with headers if it doesn't exist."""
+# worksheets that are only ever appended to in normal use, so reads can fetch just the new rows (see sheet_sync)
+APPEND_ONLY_WORKSHEETS = ("bundles", "quote_log", "bundles_archive")
+
+# superseded and deprecated bundle revisions are moved here by compact_bundles, see below
+ARCHIVE_WORKSHEET = "bundles_archive"
+
+def _download_worksheet(conn, worksheet_name):
+    with METRICS.timer("sheet_read", worksheet=worksheet_name) as extra:
+        df = SHEET_QUOTA.run("read", lambda: conn.read(worksheet=worksheet_name, ttl=0), worksheet=worksheet_name)
+        extra["rows"] = len(df)
+    return df
+
+# worksheet -> writes made through write_worksheet, so a read after a write never joins a download started before it
+_write_generation = {}
+
+def _read_full_worksheet(conn, worksheet_name):
+    # sessions rerunning at the same moment share one download of the worksheet, each gets its own copy
+    key = ("sheet_read", id(conn), worksheet_name, _write_generation.get(worksheet_name, 0))
+    return SINGLE_FLIGHT.do(key, lambda: _download_worksheet(conn, worksheet_name), share=lambda df: df.copy())
+
+def _coerce_worksheet(worksheet_name, df):
+    with METRICS.timer("sheet_coerce", worksheet=worksheet_name) as extra:
+        extra["rows"] = len(df)
+        return bundle_schema.coerce(df, worksheet_name)
+
+def get_worksheet(conn, worksheet_name, typed=False):
+    """
+    Retrieves a worksheet, creating it with headers if it doesn't exist.
+    With `typed=True` the frame is converted to the worksheet's schema (see bundle_schema); only use those for
+    reading, write back frames read with `typed=False`.
+    """
     try:
-        df = conn.read(worksheet=worksheet_name, ttl=0)
-        return df
+        if worksheet_name in APPEND_ONLY_WORKSHEETS:
+            if typed:
+                derive = lambda df: _coerce_worksheet(worksheet_name, df)
+                return SHEET_SYNC.read_derived(conn, worksheet_name, _read_full_worksheet, "typed", derive)
+            return SHEET_SYNC.read(conn, worksheet_name, _read_full_worksheet)
+        df = _read_full_worksheet(conn, worksheet_name)
+        return _coerce_worksheet(worksheet_name, df) if typed else df
     except Exception as e:
         # A more robust way to check if the sheet or worksheet exists is needed.
         # For now, we assume an error means it needs creation.
@@ -26,21 +82,150 @@ def get_worksheet(conn, worksheet_name):
         # We will assume the worksheets 'bundles', 'user_stats', and 'quote_log' exist.
         return pd.DataFrame()
 
+def write_worksheet(conn, worksheet_name, df):
+    """Overwrites a worksheet with the given frame."""
+    with METRICS.timer("sheet_write", worksheet=worksheet_name) as extra:
+        extra["rows"] = len(df)
+        # the connection clears the worksheet and then writes it: two write requests
+        with SHEET_QUOTA.priority(WRITE):
+            result = SHEET_QUOTA.run("write", lambda: conn.update(worksheet=worksheet_name, data=df), cost=2,
+                                     worksheet=worksheet_name)
+    _write_generation[worksheet_name] = _write_generation.get(worksheet_name, 0) + 1
+    if worksheet_name in APPEND_ONLY_WORKSHEETS:
+        SHEET_SYNC.record_write(conn, worksheet_name, df)
+    return result
+
 
 def get_bundle_definitions_df():
-    """Loads the bundle definitions from the 'bundles' worksheet."""
+    """Loads the bundle definitions from the 'bundles' worksheet (typed)."""
     conn = get_connection()
-    return get_worksheet(conn, "bundles")
+    return get_worksheet(conn, "bundles", typed=True)
 
 def get_user_stats_df():
-    """Loads user login stats from the 'user_stats' worksheet."""
+    """Loads user login stats from the 'user_stats' worksheet (typed)."""
     conn = get_connection()
-    return get_worksheet(conn, "user_stats")
+    return get_worksheet(conn, "user_stats", typed=True)
 
 def get_quote_log_df():
-    """Loads the quote log from the 'quote_log' worksheet."""
+    """Loads the quote log from the 'quote_log' worksheet (typed)."""
+    conn = get_connection()
+    return get_worksheet(conn, "quote_log", typed=True)
+
+def get_bundle_archive_df():
+    """Loads the archived bundle revisions from the 'bundles_archive' worksheet (typed), creating it if needed."""
     conn = get_connection()
-    return get_worksheet(conn, "quote_log")
+    try:
+        _ensure_archive(conn)
+    except Exception:
+        pass  # get_worksheet reports why the archive can't be read
+    return get_worksheet(conn, ARCHIVE_WORKSHEET, typed=True)
+
+# --- Optimistic Concurrency ---
+
+class BundleConflictError(RuntimeError):
+    """Raised when a change to the 'bundles' worksheet kept colliding with other writers and was given up on."""
+
+CAS_MAX_ATTEMPTS = 5
+CAS_BACKOFF = 0.2  # seconds before the first retry, doubled (with jitter) after each further conflict
+
+def _compare_and_swap(conn, worksheet_name, mutate):
+    """
+    Read-modify-write of a whole worksheet that doesn't silently lose a concurrent writer's rows.
+
+    `mutate(df)` gets a fresh copy of the sheet and returns `(new_df, result, survived)`: the frame to write, the
+    value to return, and a predicate telling whether our change is still present in a later read. It can return
+    `(None, result, None)` to write nothing. Sheets has no conditional write, so the write only goes ahead if the
+    sheet's revision hasn't moved since the read, and afterwards we check the change actually stuck. Either
+    check failing retries from a fresh read with a backoff; after `CAS_MAX_ATTEMPTS` it raises BundleConflictError.
+    """
+    # the reads a write depends on go ahead of page reads, see sheet_quota
+    with SHEET_QUOTA.priority(WRITE):
+        for attempt in range(CAS_MAX_ATTEMPTS):
+            if attempt:
+                METRICS.observe("sheet_write_conflict", 0, worksheet=worksheet_name)
+                time.sleep(CAS_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+            df = SHEET_SYNC.read(conn, worksheet_name, _read_full_worksheet, max_age=0)
+            base = SHEET_SYNC.revision_of(conn, worksheet_name, df)
+            new_df, result, survived = mutate(df)
+            if new_df is None:
+                return result
+
+            if SHEET_SYNC.revision(conn, worksheet_name, _read_full_worksheet) != base:
+                continue  # someone wrote between our read and now, redo the change on top of theirs
+            write_worksheet(conn, worksheet_name, new_df)
+
+            # a writer that slipped in between the check and our write would have been overwritten by us (or us by them)
+            if SHEET_SYNC.revision(conn, worksheet_name, _read_full_worksheet) == SHEET_SYNC.revision_of(conn, worksheet_name, new_df):
+                return result
+            if survived(SHEET_SYNC.read(conn, worksheet_name, _read_full_worksheet, max_age=0)):
+                return result
+        raise BundleConflictError(
+            f"The '{worksheet_name}' sheet kept changing while saving, please try again in a moment."
+        )
+
+# ids of connections whose archive worksheet is known to exist, so only the first use checks for it
+_archive_exists = set()
+
+def _is_missing_worksheet(error):
+    # gspread's WorksheetNotFound, or the fake connection's ValueError
+    return type(error).__name__ == "WorksheetNotFound" or "not found" in str(error).lower()
+
+def _ensure_archive(conn):
+    """Creates the archive worksheet (empty, with its headers) the first time it's needed, if it doesn't exist."""
+    if id(conn) in _archive_exists:
+        return
+    try:
+        SHEET_SYNC.read(conn, ARCHIVE_WORKSHEET, _read_full_worksheet)
+    except Exception as e:
+        if not _is_missing_worksheet(e):
+            raise
+        empty = pd.DataFrame(columns=list(bundle_schema.SCHEMAS[ARCHIVE_WORKSHEET]))
+        try:
+            with SHEET_QUOTA.priority(WRITE):
+                SHEET_QUOTA.run("write", lambda: conn.create(worksheet=ARCHIVE_WORKSHEET, data=empty),
+                                worksheet=ARCHIVE_WORKSHEET)
+        except Exception as e:
+            if "already exists" not in str(e).lower():
+                raise  # otherwise another session created it first
+        _write_generation[ARCHIVE_WORKSHEET] = _write_generation.get(ARCHIVE_WORKSHEET, 0) + 1
+    _archive_exists.add(id(conn))
+
+def _read_archive(conn):
+    """A fresh read of the archive worksheet, creating it if it doesn't exist yet (nothing has been archived then)."""
+    _ensure_archive(conn)
+    return SHEET_SYNC.read(conn, ARCHIVE_WORKSHEET, _read_full_worksheet, max_age=0)
+
+def _max_version(df, bundle_name):
+    if df is None or df.empty or "bundle_name" not in df.columns:
+        return 0
+    existing = df[df["bundle_name"] == bundle_name]
+    return 0 if existing.empty else int(existing["bundle_version"].max())
+
+def _version_allocator(conn, bundle_name):
+    """
+    A `next_version(df)` for the attempts of one save: the version a new revision of `bundle_name` gets, given the
+    attempt's read of the hot sheet.
+
+    The archive is read once, after the first attempt's read: compaction appends to the archive before it removes
+    rows from the hot sheet, so whatever it has taken out of that read is already visible there. A retry only reads
+    the archive again if the hot sheet has since lost revisions of the bundle, i.e. a compaction moved them.
+    """
+    archived = {}
+
+    def next_version(df):
+        hot = _max_version(df, bundle_name)
+        if not archived or hot < archived["hot"]:
+            archived.update(hot=hot, version=_max_version(_read_archive(conn), bundle_name))
+        return max(hot, archived["version"]) + 1
+    return next_version
+
+def _version_is_ours(df, bundle_name, version, ours):
+    """True if every row of `bundle_name` at `version` matches `ours` (and there is at least one)."""
+    if df.empty:
+        return False
+    rows = df[(df["bundle_name"] == bundle_name) & (df["bundle_version"] == version)]
+    return not rows.empty and bool(ours(rows).all())
 
 # --- Bundle Management ---
 
@@ -50,16 +235,11 @@ def save_bundle(
 ):
     """
     Saves a new bundle or a new version of an existing bundle to the 'bundles' worksheet.
+    Raises BundleConflictError if concurrent saves kept getting in the way, and BundleGraphError if the bundle
+    includes a bundle that doesn't exist or would depend on itself.
     """
     conn = get_connection()
-    df = get_bundle_definitions_df()
-
-    new_version = 1
-    if not df.empty:
-        existing_bundles = df[df["bundle_name"] == bundle_name]
-        if not existing_bundles.empty:
-            new_version = existing_bundles["bundle_version"].max() + 1
-
+    get_bundle_graph().check(bundle_name, bundle_items)
     bundle_id = str(uuid.uuid4())
     created_at = datetime.now().isoformat()
     
@@ -68,7 +248,6 @@ def save_bundle(
         new_row = {
             "bundle_id": bundle_id,
             "bundle_name": bundle_name,
-            "bundle_version": new_version,
             "status": "active",
             "bundle_type": bundle_type,
             "parent_model_id": item.get("parent_model_id"),
@@ -88,10 +267,35 @@ def save_bundle(
         }
         new_rows.append(new_row)
 
-    new_df = pd.DataFrame(new_rows)
-    updated_df = pd.concat([df, new_df], ignore_index=True)
-    conn.update(worksheet="bundles", data=updated_df)
-    return bundle_id, new_version
+    next_version = _version_allocator(conn, bundle_name)
+
+    def mutate(df):
+        # the version is allocated from the same read the write is based on, and re-allocated on every retry
+        new_version = next_version(df)
+        new_df = pd.DataFrame(new_rows).assign(bundle_version=new_version)
+        updated_df = append_rows(df, new_df)
+        survived = lambda current: _version_is_ours(
+            current, bundle_name, new_version, lambda rows: rows["bundle_id"] == bundle_id
+        )
+        return updated_df, (bundle_id, new_version), survived
+
+    result = _compare_and_swap(conn, "bundles", mutate)
+    ASSOCIATION_INDEX.set_bundle(bundle_name, new_rows)
+    return result
+
+def get_bundle_history(bundle_name):
+    """
+    Retrieves every revision of a bundle, archived ones included, oldest first.
+    """
+    hot, archive = get_bundle_definitions_df(), get_bundle_archive_df()
+    if not hot.empty and not archive.empty:
+        # a revision caught mid-compaction can briefly be in both sheets
+        archive = archive[~_revision_mask(archive, _revision_keys(hot))]
+    if hot.empty and archive.empty:
+        return pd.DataFrame()
+    history = append_rows(hot, archive)
+    history = history[history["bundle_name"] == bundle_name]
+    return history.sort_values("bundle_version", kind="stable").drop(columns=["archived_at"], errors="ignore")
 
 def load_bundles(user_id=None, active_only=True):
     """
@@ -105,7 +309,7 @@ def load_bundles(user_id=None, active_only=True):
     if user_id:
         df = df[df["user_id"] == user_id]
 
-    latest_versions = df.loc[df.groupby("bundle_name")["bundle_version"].idxmax()]
+    latest_versions = df.loc[df.groupby("bundle_name", observed=True)["bundle_version"].idxmax()]
     
     if active_only:
         return latest_versions[latest_versions["status"] == "active"]
@@ -114,10 +318,13 @@ def load_bundles(user_id=None, active_only=True):
 def get_bundle_details(bundle_name, version=None):
     """
     Retrieves all items for a specific bundle name and version.
-    If version is None, it fetches the latest version.
+    If version is None, it fetches the latest version. Older versions are looked up in the archive.
     """
     df = get_bundle_definitions_df()
-    bundle_df = df[df["bundle_name"] == bundle_name]
+    bundle_df = df[df["bundle_name"] == bundle_name] if not df.empty else df
+
+    if version is not None and (bundle_df.empty or not (bundle_df["bundle_version"] == version).any()):
+        bundle_df = get_bundle_history(bundle_name)
 
     if bundle_df.empty:
         return None
@@ -129,18 +336,29 @@ def get_bundle_details(bundle_name, version=None):
 
 def delete_bundle(bundle_name, user_id):
     """
-    Deletes all versions of a bundle if the user is the owner.
+    Deletes all versions of a bundle if the user is the owner, archived ones included.
     """
     conn = get_connection()
-    df = get_bundle_definitions_df()
-    
-    bundle_to_delete = df[(df["bundle_name"] == bundle_name) & (df["user_id"] == user_id)]
-    
-    if bundle_to_delete.empty:
-        return False, "Bundle not found or you do not have permission to delete it."
 
-    df = df.drop(bundle_to_delete.index)
-    conn.update(worksheet="bundles", data=df)
+    def owned(df):
+        return df[(df["bundle_name"] == bundle_name) & (df["user_id"] == user_id)] if not df.empty else df
+
+    def mutate(df):
+        bundle_to_delete = owned(df)
+        if bundle_to_delete.empty:
+            return None, False, None
+        survived = lambda current: owned(current).empty
+        return df.drop(bundle_to_delete.index), True, survived
+
+    try:
+        deleted = _compare_and_swap(conn, "bundles", mutate)
+        if not _read_archive(conn).empty:
+            deleted = _compare_and_swap(conn, ARCHIVE_WORKSHEET, mutate) or deleted
+    except BundleConflictError as e:
+        return False, str(e)
+    if not deleted:
+        return False, "Bundle not found or you do not have permission to delete it."
+    ASSOCIATION_INDEX.remove_bundle(bundle_name)
     return True, f"Bundle '{bundle_name}' has been deleted."
 
 
@@ -150,24 +368,141 @@ def deprecate_bundle(bundle_name, user_id):
     This is done by creating a new version with the status 'deprecated'.
     """
     conn = get_connection()
-    df = get_bundle_definitions_df()
-    
-    latest_bundle_items = get_bundle_details(bundle_name)
-    if latest_bundle_items is None or latest_bundle_items.iloc[0]["user_id"] != user_id:
-        return False, "Bundle not found or you do not have permission to deprecate it."
+    created_at = datetime.now().isoformat()
 
-    new_version = latest_bundle_items["bundle_version"].iloc[0] + 1
-    
-    deprecated_rows = latest_bundle_items.copy()
-    deprecated_rows["bundle_version"] = new_version
-    deprecated_rows["status"] = "deprecated"
-    deprecated_rows["created_by"] = user_id
-    deprecated_rows["created_at"] = datetime.now().isoformat()
-    
-    updated_df = pd.concat([df, deprecated_rows], ignore_index=True)
-    conn.update(worksheet="bundles", data=updated_df)
-    
-    return True, f"Bundle '{bundle_name}' marked as deprecated (Version {new_version})."
+    def mutate(df):
+        # the latest version comes from the same read the new one is appended to
+        bundle_df = df[df["bundle_name"] == bundle_name] if not df.empty else df
+        if bundle_df.empty:
+            return None, (False, "Bundle not found or you do not have permission to deprecate it."), None
+        latest_bundle_items = bundle_df[bundle_df["bundle_version"] == bundle_df["bundle_version"].max()]
+        if latest_bundle_items.iloc[0]["user_id"] != user_id:
+            return None, (False, "Bundle not found or you do not have permission to deprecate it."), None
+
+        new_version = int(latest_bundle_items["bundle_version"].iloc[0]) + 1
+        deprecated_rows = latest_bundle_items.copy()
+        deprecated_rows["bundle_version"] = new_version
+        deprecated_rows["status"] = "deprecated"
+        deprecated_rows["created_by"] = user_id
+        deprecated_rows["created_at"] = created_at
+
+        updated_df = append_rows(df, deprecated_rows)
+        survived = lambda current: _version_is_ours(
+            current, bundle_name, new_version,
+            lambda rows: (rows["status"] == "deprecated") & (rows["created_at"] == created_at)
+        )
+        message = f"Bundle '{bundle_name}' marked as deprecated (Version {new_version})."
+        return updated_df, (True, message), survived
+
+    try:
+        success, message = _compare_and_swap(conn, "bundles", mutate)
+    except BundleConflictError as e:
+        return False, str(e)
+    if success:
+        ASSOCIATION_INDEX.remove_bundle(bundle_name)
+    return success, message
+
+# --- Bundle Graph ---
+
+_last_graph = None
+
+def get_bundle_graph():
+    """The bundles sheet as a BundleGraph, rebuilt when the sheet changes (keeping the expansions still valid)."""
+    conn = get_connection()
+
+    def build(df):
+        global _last_graph
+        _last_graph = BundleGraph(df, previous=_last_graph)
+        return _last_graph
+
+    return SHEET_SYNC.read_derived(conn, "bundles", _read_full_worksheet, "graph", build, copy=False)
+
+def expand_bundle(bundle_name, version=None):
+    """The bundle's line items with nested bundles and multi-level dependents flattened and multiplied out."""
+    return get_bundle_graph().expand(bundle_name, version)
+
+def get_quote_plan(bundle_name, version=None, list_prices=None, token=None):
+    """The bundle's compiled quote plan (priced lines and Addlify payloads), cached per revision and list prices."""
+    return QUOTE_PLANS.get(get_bundle_graph(), bundle_name, version, list_prices, token)
+
+# --- Associations ---
+
+def get_association_index():
+    """The parent -> dependent suggestion index, rebuilt from the bundles and the quote log when it's stale."""
+    if ASSOCIATION_INDEX.stale():
+        ASSOCIATION_INDEX.rebuild(get_bundle_definitions_df(), get_quote_log_df())
+    return ASSOCIATION_INDEX
+
+def suggest_dependents(parent_model_id, k=5, exclude=()):
+    """The `k` dependents most often bundled (and quoted) with the parent model, as (model_id, weight) pairs."""
+    return get_association_index().top_k(parent_model_id, k, exclude)
+
+# --- Compaction ---
+
+# a revision is one version of one bundle; deprecate_bundle reuses the bundle_id, so the version is part of the key
+def _revision_keys(df):
+    return set(zip(df["bundle_id"].astype(str), df["bundle_version"].astype(int)))
+
+def _revision_mask(df, keys):
+    return pd.Series(
+        [k in keys for k in zip(df["bundle_id"].astype(str), df["bundle_version"].astype(int))],
+        index=df.index, dtype=bool,
+    )
+
+def _rows_to_archive(df, archive_deprecated=True):
+    """Superseded revisions of every bundle, plus every revision of bundles whose latest one is deprecated."""
+    if df.empty:
+        return df
+    latest = df.groupby("bundle_name")["bundle_version"].transform("max")
+    stale = df["bundle_version"] < latest
+    if archive_deprecated:
+        latest_status = df[df["bundle_version"] == latest].groupby("bundle_name")["status"].first()
+        deprecated_names = latest_status.index[latest_status == "deprecated"]
+        stale |= df["bundle_name"].isin(deprecated_names)
+    return df[stale]
+
+def compact_bundles(archive_deprecated=True):
+    """
+    Moves superseded bundle revisions (and deprecated bundles) from 'bundles' into 'bundles_archive'.
+    Only the latest revision of each live bundle stays in the hot sheet; get_bundle_history and
+    get_bundle_details(version=...) still see the archived ones. Returns the number of rows moved.
+    """
+    conn = get_connection()
+    with SHEET_QUOTA.priority(WRITE):
+        current = SHEET_SYNC.read(conn, "bundles", _read_full_worksheet, max_age=0)
+    to_archive = _rows_to_archive(current, archive_deprecated)
+    if to_archive.empty:
+        return 0
+    keys = _revision_keys(to_archive)
+    archived_at = datetime.now().isoformat()
+
+    # archive first, then drop from the hot sheet: a crash in between leaves duplicates (harmless, skipped on the
+    # next run) rather than lost rows, and a save can always see a revision in one of the two sheets
+    def append_to_archive(archive):
+        if not archive.empty:
+            already = _revision_mask(to_archive, _revision_keys(archive))
+            rows = to_archive[~already]
+        else:
+            rows = to_archive
+        if rows.empty:
+            return None, None, None
+        rows = rows.assign(archived_at=archived_at)
+        updated = append_rows(archive, rows)
+        survived = lambda current: keys <= _revision_keys(current) if not current.empty else False
+        return updated, None, survived
+
+    def drop_from_hot(df):
+        archived = _revision_mask(df, keys) if not df.empty else pd.Series(dtype=bool)
+        if not archived.any():
+            return None, 0, None
+        survived = lambda current: current.empty or not _revision_mask(current, keys).any()
+        return df[~archived], int(archived.sum()), survived
+
+    _ensure_archive(conn)
+    _compare_and_swap(conn, ARCHIVE_WORKSHEET, append_to_archive)
+    moved = _compare_and_swap(conn, "bundles", drop_from_hot)
+    METRICS.observe("bundle_compaction", 0, rows=moved)
+    return moved
 
 # --- Logging ---
 
@@ -177,7 +512,8 @@ def log_user_login(user_id):
         return
 
     conn = get_connection()
-    df = get_user_stats_df()
+    with SHEET_QUOTA.priority(WRITE):
+        df = get_worksheet(conn, "user_stats")
     
     now = datetime.now().isoformat()
 
@@ -194,14 +530,15 @@ def log_user_login(user_id):
             "last_login": now,
             "login_count": 1
         }])
-        df = pd.concat([df, new_row], ignore_index=True)
+        df = append_rows(df, new_row)
         
-    conn.update(worksheet="user_stats", data=df)
+    write_worksheet(conn, "user_stats", df)
 
 def log_quote(user_id, bundle_name, total_value, quote_url):
     """Logs a created quote to the 'quote_log' worksheet."""
     conn = get_connection()
-    df = get_quote_log_df()
+    with SHEET_QUOTA.priority(WRITE):
+        df = get_worksheet(conn, "quote_log")
     
     new_row = pd.DataFrame([{
         "timestamp": datetime.now().isoformat(),
@@ -211,5 +548,6 @@ def log_quote(user_id, bundle_name, total_value, quote_url):
         "quote_url": quote_url
     }])
     
-    updated_df = pd.concat([df, new_row], ignore_index=True)
-    conn.update(worksheet="quote_log", data=updated_df)
\ No newline at end of file
+    updated_df = append_rows(df, new_row)
+    write_worksheet(conn, "quote_log", updated_df)
+    ASSOCIATION_INDEX.add_quote(split_quoted_bundles(bundle_name))
\ No newline at end of file
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+DEFAULT_KEEP_VERSIONS = 2  # versions of each catalogue kept for sessions still holding an older handle
+DEFAULT_IDLE_TIMEOUT = float(os.environ.get("BUNDLE_QUOTER_SESSION_IDLE_TIMEOUT", 30 * 60))  # seconds
+SWEEP_INTERVAL = 60.0  # seconds between sweeps for idle sessions
+
+# per-session values rebuilt on the next run that needs them, dropped from idle sessions; the user's line edits,
+# pending quote update and last quote's journal (which the retry needs) are never dropped
+EVICTABLE_SESSION_KEYS = ("contacts_by_company", "recent_companies", "quote_plans")
+
+
+def checksum(data) -> str:
+    """A content hash of JSON-like data, so identical downloads publish as the same version."""
+    encoded = json.dumps(data, sort_keys=True, default=str, separators=(",", ":")).encode()
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+class Catalogue:
+    """
+    One immutable version of a shared data set (the company list, the models list). Sessions keep only its
+    `version`; values computed from it (a search index, a DataFrame, list prices) are built once with `derived`
+    and shared by every session on that version. Never modify `data` or a derived value.
+    """
+    __slots__ = ("name", "version", "data", "checksum", "published_at", "_derived", "_lock")
+
+    def __init__(self, name, version, data, checksum):
+        self.name = name
+        self.version = version
+        self.data = data
+        self.checksum = checksum
+        self.published_at = time.time()
+        self._derived = {}
+        self._lock = threading.RLock()  # a build may use another derived value
+
+    def derived(self, key: str, build):
+        """`build(data)`, computed on first use and kept with this version."""
+        with self._lock:
+            if key not in self._derived:
+                self._derived[key] = build(self.data)
+            return self._derived[key]
+
+
+class CatalogueRegistry:
+    """
+    The process-wide catalogues, by name and version.
+
+    Publishing data identical to the latest version returns that version, so a burst of logins downloading the
+    same company list holds it once. Only the newest `keep_versions` of each catalogue are kept; a session whose
+    version was dropped gets None and loads its data again, since the latest version may have been published
+    from someone else's (differing) download.
+    """
+
+    def __init__(self, keep_versions: int = DEFAULT_KEEP_VERSIONS):
+        self.keep_versions = keep_versions
+        self._catalogues = {}  # name -> OrderedDict(version -> Catalogue), oldest first
+        self._lock = threading.Lock()
+
+    def publish(self, name: str, data) -> Catalogue:
+        """
+        Registers `data` as the newest version of catalogue `name`.
+
+        Args:
+            name (str): The catalogue, e.g. "companies".
+            data: JSON-like data; it belongs to the registry from now on and must not be modified.
+
+        Returns:
+            Catalogue: The new version, or the latest one if it holds the same data.
+        """
+        digest = checksum(data)
+        with self._lock:
+            versions = self._catalogues.setdefault(name, OrderedDict())
+            if versions:
+                latest = next(reversed(versions.values()))
+                if latest.checksum == digest:
+                    return latest
+                version = latest.version + 1
+            else:
+                version = 1
+            catalogue = versions[version] = Catalogue(name, version, data, digest)
+            while len(versions) > self.keep_versions:
+                versions.popitem(last=False)
+        return catalogue
+
+    def get(self, name: str, version: int = None) -> Catalogue:
+        """
+        The catalogue at `version`, or the latest if it's None. None if that version is no longer kept or nothing
+        was published.
+        """
+        with self._lock:
+            versions = self._catalogues.get(name)
+            if not versions:
+                return None
+            if version is None:
+                return next(reversed(versions.values()))
+            return versions.get(version)
+
+    def stats(self) -> list:
+        """The kept versions of every catalogue, for the admin pages."""
+        with self._lock:
+            return [
+                {"catalogue": name, "version": c.version, "items": len(c.data), "derived": ", ".join(c._derived),
+                 "published_at": c.published_at}
+                for name, versions in self._catalogues.items() for c in versions.values()
+            ]
+
+
+class SessionJanitor:
+    """
+    Drops the cheap-to-rebuild values (`EVICTABLE_SESSION_KEYS`) from Streamlit sessions nobody has used for
+    `idle_timeout` seconds, so open but forgotten tabs don't hold on to contact lists and expanded bundles.
+
+    Each script run calls `touch` with its session's state; sessions are held weakly, so the janitor never keeps
+    a closed one alive. Login, widget state and the user's edits stay, so a returning user carries on where they were.
+    """
+
+    def __init__(self, idle_timeout: float = DEFAULT_IDLE_TIMEOUT, keys=EVICTABLE_SESSION_KEYS):
+        self.idle_timeout = idle_timeout
+        self.keys = keys
+        self._sessions = {}  # session id -> (weakref to its state, last used)
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self.evicted = 0
+
+    def touch(self, session_id: str, state):
+        """Marks a session as used now, and sweeps the idle ones every SWEEP_INTERVAL."""
+        now = time.monotonic()
+        with self._lock:
+            self._sessions[session_id] = (weakref.ref(state), now)
+            due = now - self._last_sweep >= SWEEP_INTERVAL
+            if due:
+                self._last_sweep = now
+        if due:
+            self.sweep(now)
+
+    def sweep(self, now: float = None) -> int:
+        """Evicts the idle sessions' values now; returns how many sessions were trimmed."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            idle = []
+            for session_id, (ref, last_used) in list(self._sessions.items()):
+                state = ref()
+                if state is None:
+                    del self._sessions[session_id]
+                elif now - last_used >= self.idle_timeout:
+                    idle.append(state)
+                    del self._sessions[session_id]
+        for state in idle:
+            for key in self.keys:
+                try:
+                    del state[key]
+                except KeyError:
+                    pass
+        self.evicted += len(idle)
+        return len(idle)
+
+    def stats(self) -> dict:
+        """Tracked and trimmed sessions, for the admin pages."""
+        with self._lock:
+            return {"sessions": len(self._sessions), "evicted": self.evicted, "idle_timeout": self.idle_timeout}
+
+
+# the process-wide instances, shared by every Streamlit session
+CATALOGUES = CatalogueRegistry()
+SESSION_JANITOR = SessionJanitor()
@@ -0,0 +1,179 @@
+import bisect
+import difflib
+import heapq
+import itertools
+import re
+import unicodedata
+
+DEFAULT_LIMIT = 20
+# tokens too common in company names to narrow anything down; they still match, but never on their own
+STOP_TOKENS = frozenset({"pty", "ltd", "limited", "inc", "co", "company", "the", "and", "of", "australia", "aust"})
+FUZZY_MIN_SIMILARITY = 0.75  # difflib ratio for a misspelt token to count as a match
+FUZZY_CANDIDATES = 200  # vocabulary tokens sharing the most trigrams with a misspelt token that get compared to it
+FUZZY_MAX_EXPANSIONS = 10  # vocabulary tokens a misspelt query token may stand for
+
+_COMPANY_ID_IN_URL = re.compile(r"/companies/([^/]+)/quotes/")
+
+
+def normalize(text) -> str:
+    """Lower case, accents and punctuation dropped, whitespace collapsed, e.g. "Café-Bar Pty. Ltd." -> "cafe bar pty ltd"."""
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode()
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", text.lower()).split())
+
+
+def tokenize(text) -> list:
+    """The normalized tokens of `text`."""
+    return normalize(text).split()
+
+
+def _trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def company_label(company: dict) -> str:
+    """How a company is shown in the quote page's picker."""
+    return f"{company.get('displayName', '')} ({company.get('amplifyId', '')})"
+
+
+def recent_company_ids(quote_log_df, user_id, limit: int = DEFAULT_LIMIT) -> list:
+    """The companies a user quoted most recently, newest first, from the company id in each logged quote url."""
+    if quote_log_df is None or quote_log_df.empty or "quote_url" not in quote_log_df.columns:
+        return []
+    mine = quote_log_df[quote_log_df["user_id"].astype(str) == str(user_id)]
+    if "timestamp" in mine.columns:
+        mine = mine.sort_values("timestamp", ascending=False)
+    ids = []
+    for url in mine["quote_url"].tolist():
+        match = _COMPANY_ID_IN_URL.search(str(url))
+        if match and match.group(1) not in ids:
+            ids.append(match.group(1))
+            if len(ids) >= limit:
+                break
+    return ids
+
+
+class CompanyIndex:
+    """
+    A search index over the company list's `displayName` and `amplifyId`, built once when the list is loaded.
+
+    Names are normalized and split into tokens. A query matches a company when every query token is a prefix of
+    one of its tokens ("omr ele" finds "Omron Electronics"); a query token that prefixes nothing is matched
+    fuzzily instead (the tokens sharing most trigrams with it, ranked by edit similarity), so small typos still
+    find the company. The vocabulary is kept sorted, so a prefix lookup is a binary search rather than a scan of
+    every company.
+    """
+
+    def __init__(self, companies: list, id_key: str = "customerId"):
+        self.companies = companies
+        self.id_key = id_key
+        self.labels = [company_label(c) for c in companies]
+        self._alphabetical = sorted(range(len(companies)), key=lambda i: self.labels[i].lower())
+        self._position = {c.get(id_key): i for i, c in enumerate(companies)}
+        postings = {}  # token -> company positions
+        self._name_tokens = []
+        for i, company in enumerate(companies):
+            name_tokens = tokenize(company.get("displayName"))
+            self._name_tokens.append(name_tokens)
+            for token in set(name_tokens + tokenize(company.get("amplifyId"))):
+                postings.setdefault(token, []).append(i)
+        self._vocabulary = sorted(postings)
+        self._postings = [postings[t] for t in self._vocabulary]
+        self._by_trigram = {}  # trigram -> vocabulary positions
+        for v, token in enumerate(self._vocabulary):
+            for trigram in _trigrams(token):
+                self._by_trigram.setdefault(trigram, []).append(v)
+
+    def __len__(self):
+        return len(self.companies)
+
+    def _prefixed(self, token):
+        # vocabulary positions of every token starting with `token`
+        start = bisect.bisect_left(self._vocabulary, token)
+        end = bisect.bisect_left(self._vocabulary, token + "\x7f", lo=start)
+        return range(start, end)
+
+    def _fuzzy(self, token):
+        # vocabulary positions of the tokens most like `token`: candidates share trigrams with it, then the closest
+        # by edit similarity win, compared whole and as a prefix so a misspelt half-typed word still matches
+        shared = {}
+        for trigram in _trigrams(token):
+            for v in self._by_trigram.get(trigram, ()):
+                shared[v] = shared.get(v, 0) + 1
+        candidates = heapq.nlargest(FUZZY_CANDIDATES, shared, key=shared.__getitem__)
+        matcher = difflib.SequenceMatcher(a=token, autojunk=False)
+        scored = []
+        for v in candidates:
+            word = self._vocabulary[v]
+            similarity = 0.0
+            for target in (word, word[:len(token)]):
+                matcher.set_seq2(target)
+                if matcher.real_quick_ratio() >= FUZZY_MIN_SIMILARITY and matcher.quick_ratio() >= FUZZY_MIN_SIMILARITY:
+                    similarity = max(similarity, matcher.ratio())
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                scored.append((similarity, v))
+        scored.sort(reverse=True)
+        return [(v, similarity) for similarity, v in scored[:FUZZY_MAX_EXPANSIONS]]
+
+    def _matches(self, token):
+        # company position -> how well it matches this query token: 1 for the whole token, less for a prefix or typo
+        scores = {}
+        prefixed = self._prefixed(token)
+        if len(prefixed):
+            for v in prefixed:
+                score = 1.0 if self._vocabulary[v] == token else 0.5 + 0.4 * len(token) / len(self._vocabulary[v])
+                for i in self._postings[v]:
+                    if score > scores.get(i, 0.0):
+                        scores[i] = score
+        else:
+            for v, similarity in self._fuzzy(token):
+                for i in self._postings[v]:
+                    if 0.5 * similarity > scores.get(i, 0.0):
+                        scores[i] = 0.5 * similarity
+        return scores
+
+    def search(self, query: str, limit: int = DEFAULT_LIMIT, recent=()) -> list:
+        """
+        Returns the positions (in `companies`) of the best `limit` matches for `query`, best first.
+
+        Args:
+            query (str): What the user typed; empty lists the recent companies, then the rest by name.
+            limit (int): How many results.
+            recent (iterable): Company ids the user used recently, most recent first. Matching ones are ranked
+                first, in that order.
+
+        Returns:
+            list: Positions into `companies` (and `labels`).
+        """
+        recent_positions = [self._position[c] for c in recent if c in self._position]
+        tokens = tokenize(query)
+        if not tokens:
+            seen = set(recent_positions)
+            rest = (i for i in self._alphabetical if i not in seen)
+            return (recent_positions + list(itertools.islice(rest, limit)))[:limit]
+
+        # the distinctive tokens must all match; common ones like "pty" only rank
+        required = [t for t in tokens if t not in STOP_TOKENS] or tokens
+        scores = None
+        for token in required:
+            matches = self._matches(token)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {i: s + matches[i] for i, s in scores.items() if i in matches}
+            if not scores:
+                return []
+        for token in tokens:
+            if token not in required:
+                for i, s in self._matches(token).items():
+                    if i in scores:
+                        scores[i] += 0.1 * s
+        first = tokens[0]
+        for i in scores:
+            name = self._name_tokens[i]
+            if name and name[0].startswith(first):
+                scores[i] += 0.25  # "omron" should rank "Omron Electronics" above "Acme (Omron reseller)"
+
+        recency = {i: n for n, i in enumerate(recent_positions)}
+        ranked = sorted(scores, key=lambda i: (i not in recency, recency.get(i, 0), -scores[i], self.labels[i]))
+        return ranked[:limit]
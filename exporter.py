@@ -0,0 +1,201 @@
+"""
+Streaming exports of the bundle store, the quote log and per-bundle analytics.
+
+Frames are written in chunks of EXPORT_CHUNK_ROWS rows straight to a file on disk: Excel through xlsxwriter's
+constant_memory mode (each row is flushed as soon as the next one starts), Parquet as one row group per chunk.
+Neither builds the whole export in memory, so full histories export fine.
+"""
+import os
+import tempfile
+import zipfile
+
+from lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
+
+EXPORT_CHUNK_ROWS = 5_000
+EXCEL_MAX_ROWS = 1_048_576  # per worksheet, header included
+
+
+def iter_chunks(df, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """Yields consecutive slices of `df` of at most `chunk_rows` rows."""
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def _excel_rows(chunk):
+    # plain Python values; missing ones become None, which is written as a blank cell
+    plain = chunk.astype(object).where(chunk.notna(), None)
+    for row in plain.itertuples(index=False, name=None):
+        yield [value.to_pydatetime() if isinstance(value, pd.Timestamp) else value for value in row]
+
+
+def _column_writers(worksheet, df):
+    # one writer per column picked from its dtype, instead of xlsxwriter guessing the type of every cell
+    writers = []
+    for dtype in df.dtypes:
+        if pd.api.types.is_bool_dtype(dtype):
+            writers.append(worksheet.write_boolean)
+        elif pd.api.types.is_numeric_dtype(dtype):
+            writers.append(worksheet.write_number)
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            writers.append(worksheet.write_datetime)
+        else:
+            writers.append(lambda row, col, value, _write=worksheet.write: _write(row, col, value if isinstance(value, (int, float)) else str(value)))
+    return writers
+
+
+def _start_worksheet(workbook, name, part, columns):
+    title = name if part == 1 else f"{name} ({part})"
+    worksheet = workbook.add_worksheet(title[:31])  # Excel's limit on sheet names
+    worksheet.write_row(0, 0, [str(c) for c in columns])
+    return worksheet
+
+
+def export_excel(path: str, tables: dict, chunk_rows: int = EXPORT_CHUNK_ROWS) -> str:
+    """
+    Writes each frame to its own worksheet of an .xlsx file, row by row.
+
+    Args:
+        path (str): The file to write.
+        tables (dict): Worksheet name -> frame. A frame longer than Excel allows continues on "<name> (2)" etc.
+        chunk_rows (int): Rows converted per step.
+
+    Returns:
+        str: The path written.
+    """
+    import xlsxwriter  # only loaded when someone exports
+
+    workbook = xlsxwriter.Workbook(path, {
+        "constant_memory": True,
+        "default_date_format": "yyyy-mm-dd hh:mm:ss",
+        "nan_inf_to_errors": True,
+        "strings_to_urls": False,
+        "strings_to_formulas": False,
+    })
+    try:
+        for name, df in tables.items():
+            part = 1
+            worksheet = _start_worksheet(workbook, name, part, df.columns)
+            writers = _column_writers(worksheet, df)
+            row_index = 1
+            for chunk in iter_chunks(df, chunk_rows):
+                for values in _excel_rows(chunk):
+                    if row_index >= EXCEL_MAX_ROWS:
+                        part += 1
+                        worksheet = _start_worksheet(workbook, name, part, df.columns)
+                        writers = _column_writers(worksheet, df)
+                        row_index = 1
+                    for col, (write, value) in enumerate(zip(writers, values)):
+                        if value is not None:
+                            write(row_index, col, value)
+                    row_index += 1
+    finally:
+        workbook.close()
+    return path
+
+
+def export_parquet(path: str, df, chunk_rows: int = EXPORT_CHUNK_ROWS) -> str:
+    """
+    Writes a frame to a Parquet file, one row group per chunk.
+
+    Args:
+        path (str): The file to write.
+        df (pd.DataFrame): The frame.
+        chunk_rows (int): Rows per row group.
+
+    Returns:
+        str: The path written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # categoricals are written as plain values: a categorical slice carries every category of the whole frame,
+    # which would repeat the full dictionary in each row group. Parquet dictionary-encodes each row group itself.
+    plain = {c: object for c, dtype in df.dtypes.items() if isinstance(dtype, pd.CategoricalDtype)}
+    # the schema comes from the whole frame, so a chunk that happens to be all missing in a column still fits
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(schema):
+        if pa.types.is_dictionary(field.type):
+            schema = schema.set(i, field.with_type(field.type.value_type))
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in iter_chunks(df, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk.astype(plain), schema=schema, preserve_index=False))
+    return path
+
+
+def export_parquet_zip(path: str, tables: dict, chunk_rows: int = EXPORT_CHUNK_ROWS) -> str:
+    """Writes each frame to its own Parquet file and bundles them into one .zip at `path`."""
+    with tempfile.TemporaryDirectory() as tmp, zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+        for name, df in tables.items():
+            file_name = f"{name}.parquet"
+            export_parquet(os.path.join(tmp, file_name), df, chunk_rows)
+            # Parquet is already compressed; storing it avoids a second pass
+            archive.write(os.path.join(tmp, file_name), file_name)
+    return path
+
+
+def bundle_analytics(bundles_df, quote_log_df=None, archive_df=None):
+    """
+    One row per bundle: its latest version, status, type, owner, item count, priced total, how many revisions
+    exist (archived ones included) and how often and when it was last quoted.
+    """
+    import pricing
+    from association_index import split_quoted_bundles
+
+    if bundles_df.empty:
+        return pd.DataFrame()
+    latest_version = bundles_df.groupby("bundle_name", observed=True)["bundle_version"].transform("max")
+    latest = bundles_df[bundles_df["bundle_version"] == latest_version]
+    priced = pricing.price_lines(latest, apply_multiple=True)
+    per_bundle = priced.groupby("bundle_name", observed=True).agg(
+        bundle_version=("bundle_version", "max"),
+        status=("status", "first"),
+        bundle_type=("bundle_type", "first"),
+        created_by=("created_by", "first"),
+        created_at=("created_at", "first"),
+        items=("dependent_model_id", "count"),
+        total=("line_total", "sum"),
+    )
+
+    revisions = bundles_df[["bundle_name", "bundle_version"]]
+    if archive_df is not None and not archive_df.empty:
+        revisions = pd.concat([revisions, archive_df[["bundle_name", "bundle_version"]]], ignore_index=True)
+    revisions = revisions.astype({"bundle_name": object}).drop_duplicates()
+    per_bundle["revisions"] = revisions.groupby("bundle_name").size().reindex(per_bundle.index.astype(object)).to_numpy()
+
+    per_bundle["times_quoted"] = 0
+    per_bundle["last_quoted"] = pd.NaT
+    if quote_log_df is not None and not quote_log_df.empty and "bundle_name" in quote_log_df.columns:
+        quoted = pd.DataFrame(
+            [(name, ts) for names, ts in zip(quote_log_df["bundle_name"], quote_log_df["timestamp"])
+             for name in split_quoted_bundles(names)],
+            columns=["bundle_name", "timestamp"],
+        )
+        if not quoted.empty:
+            quoted["timestamp"] = pd.to_datetime(quoted["timestamp"], errors="coerce", format="ISO8601")
+            stats = quoted.groupby("bundle_name").agg(times_quoted=("timestamp", "size"), last_quoted=("timestamp", "max"))
+            index = per_bundle.index.astype(object)
+            per_bundle["times_quoted"] = stats["times_quoted"].reindex(index).fillna(0).astype(int).to_numpy()
+            per_bundle["last_quoted"] = stats["last_quoted"].reindex(index).to_numpy()
+    return per_bundle.reset_index()
+
+
+def export_tables(tables: dict, fmt: str, directory: str = None) -> str:
+    """
+    Writes the tables to a new temporary file in `fmt` ("xlsx" or "parquet", the latter a .zip of one Parquet
+    file per table) and returns its path. The caller deletes the file when done with it.
+    """
+    fd, path = tempfile.mkstemp(suffix=".xlsx" if fmt == "xlsx" else ".zip", dir=directory)
+    os.close(fd)
+    try:
+        if fmt == "xlsx":
+            export_excel(path, tables)
+        elif fmt == "parquet":
+            export_parquet_zip(path, tables)
+        else:
+            raise ValueError(f"Unknown export format {fmt!r}")
+    except Exception:
+        os.remove(path)
+        raise
+    return path
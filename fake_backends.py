@@ -0,0 +1,414 @@
+"""
+Local stand-ins for the store backend and Google Sheets, so the app's data paths can be benchmarked offline.
+
+    with FakeAddlifyServer(latency=0.02) as store:
+        adder = Addlify("bench@example.com", "pw", base_url=store.url)
+
+    bundle_store.use_connection(FakeGSheetsConnection({"bundles": df}))
+"""
+import datetime
+import itertools
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+_COMPANY = r"/backend-portal/customers/companies/(?P<company_id>[^/]+)"
+_QUOTE = _COMPANY + r"/quotes/(?P<quote_id>[^/]+)"
+_LINES = _QUOTE + r"/sections/(?P<section_id>[^/]+)/line-items"
+
+
+class FakeAddlifyServer:
+    """
+    A threaded local HTTP server mimicking the store endpoints `Addlify` uses: login, the all-customer list,
+    company pages, quote create/get/delete/details, line items, the series search and the order listing/pages.
+
+    Every request sleeps `latency` seconds first, so round trips cost roughly what they do against the real store.
+    State (quotes and their line items) lives in memory for the life of the server.
+    """
+
+    def __init__(self, latency: float = 0.0, n_companies: int = 100, contacts_per_company: int = 3,
+                 models_per_series: int = 50, orders_per_day: int = 5, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.n_companies = n_companies
+        self.contacts_per_company = contacts_per_company
+        self.models_per_series = models_per_series
+        self.orders_per_day = orders_per_day
+        self.quotes = {}  # quote_id -> {"company_id", "details", "sections": {section_id: {line_id: item}}}
+        self.request_counts = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-addlify", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _next_id(self, prefix):
+        with self._lock:
+            return f"{prefix}-{next(self._ids)}"
+
+    # --- fake data ---
+
+    def companies(self):
+        return [
+            {"customerId": f"company-{i}", "displayName": f"Company {i} Pty Ltd", "amplifyId": f"A{i:06d}"}
+            for i in range(self.n_companies)
+        ]
+
+    def company_page(self, company_id):
+        contacts = [
+            {"id": f"{company_id}-contact-{j}", "displayName": f"Contact {j}", "emailAddress": f"c{j}@example.com"}
+            for j in range(self.contacts_per_company)
+        ]
+        company = {"id": company_id, "displayName": company_id}
+        # `parse_company_page` stops one line short of </script>, so finish with a throwaway variable
+        return (
+            "<html><head></head><body>\n<script>\n"
+            f"let contacts = {json.dumps(contacts)};\n"
+            f"let company = {json.dumps(company)};\n"
+            "let pageLoaded = true;\n"
+            "</script>\n</body></html>\n"
+        )
+
+    def quote_page(self, quote_id):
+        quote = self.quotes[quote_id]
+        sections = [
+            {"id": section_id, "lineItems": list(lines.values())}
+            for section_id, lines in quote["sections"].items()
+        ]
+        main = {"id": quote_id, **quote["details"]}
+        return (
+            "<html><body>\n<script>\n"
+            f"var activeQuoteBody = {json.dumps({'id': quote_id, 'sections': sections})};\n"
+            "</script>\n<script>\n"
+            "var participants = [];\n"
+            "var customerContactDataSource = [];\n"
+            "</script>\n<script>\n"
+            f"var quote = {json.dumps(main)};\n"
+            "</script>\n</body></html>\n"
+        )
+
+    def series_models(self, series_name):
+        return [
+            {"id": str(uuid.uuid5(uuid.NAMESPACE_DNS, f"{series_name}-{i}")),
+             "modelNumber": f"{series_name}-{i}", "skuCode": f"SKU{i:05d}"}
+            for i in range(self.models_per_series)
+        ]
+
+    def orders(self, start_date, end_date):
+        day = datetime.date.fromisoformat(start_date)
+        orders = []
+        while day <= datetime.date.fromisoformat(end_date):
+            for k in range(self.orders_per_day):
+                orders.append({"id": f"order-{day:%Y%m%d}-{k}", "orderNumber": f"SO{day:%y%m%d}{k:03d}",
+                               "createdAt": day.isoformat(), "companyId": f"company-{k % self.n_companies}"})
+            day += datetime.timedelta(days=1)
+        return orders
+
+    def order_page(self, order_id):
+        fields = {"Order Number": order_id.upper(), "Purchase Order Number": f"PO-{order_id[6:]}",
+                  "Status": "Dispatched", "Order Total": "$1,234.50"}
+        fields_html = "".join(f'<div class="display-field"><h6>{k}</h6>\n<p> {v} </p></div>' for k, v in fields.items())
+        return (
+            "<html><body>\n<div class=\"page\"><h6>Order</h6></div>\n"
+            f'<div class="col display-fields-container">{fields_html}</div>\n'
+            "<p>Footer</p>\n</body></html>\n"
+        )
+
+    # --- routing ---
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+            def log_message(self, *args):
+                pass
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                if "json" in (self.headers.get("Content-Type") or ""):
+                    return json.loads(raw or b"{}")
+                return {k: v[0] for k, v in parse_qs(raw.decode()).items()}
+
+            def _send(self, status, body, content_type="application/json", headers=None):
+                data = (json.dumps(body) if content_type == "application/json" else body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _dispatch(self, method):
+                if fake.latency:
+                    time.sleep(fake.latency)
+                path = urlsplit(self.path).path
+                request_body = self._body()  # always drain it, the connection is kept alive
+                with fake._lock:
+                    key = f"{method} {re.sub(r'/(company|contact|quote|section|line|order)-[^/]+', '/{id}', path)}"
+                    fake.request_counts[key] = fake.request_counts.get(key, 0) + 1
+                try:
+                    status, body, content_type, headers = fake.route(method, path, lambda: request_body, self.path)
+                except KeyError:
+                    status, body, content_type, headers = 404, {"message": "Not found"}, "application/json", None
+                self._send(status, body, content_type, headers)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def do_PUT(self):
+                self._dispatch("PUT")
+
+            def do_DELETE(self):
+                self._dispatch("DELETE")
+
+        return Handler
+
+    def route(self, method, path, read_body, raw_path):
+        """Returns (status, body, content_type, headers) for a request, raising KeyError for unknown routes."""
+        html = "text/html"
+        if method == "POST" and path == "/backend-portal/auth/login":
+            body = read_body()
+            if not body.get("emailAddress") or not body.get("password"):
+                return 200, {"message": "Invalid email address or password"}, "application/json", None
+            return 200, {"message": "Success"}, "application/json", {"Set-Cookie": "session=fake; Path=/"}
+        if method == "GET" and path == "/backend-portal/customers/all-customer-data":
+            return 200, {"customerData": {"allCustomers": {"dataSource": self.companies()}}}, "application/json", None
+        if method == "GET" and path == "/series/full-search":
+            query = parse_qs(urlsplit(raw_path).query)
+            names = json.loads(query["filter"][0])["restrictToSeriesNames"]
+            return 200, {"results": [m for n in names for m in self.series_models(n)]}, "application/json", None
+
+        if method == "GET" and path == "/backend-portal/orders/dateRange":
+            query = parse_qs(urlsplit(raw_path).query)
+            return 200, self.orders(query["startDate"][0], query["endDate"][0]), "application/json", None
+        m = re.fullmatch(r"/backend-portal/orders/(?P<order_id>[^/]+)", path)
+        if m and method == "GET":
+            return 200, self.order_page(m["order_id"]), html, None
+
+        m = re.fullmatch(_LINES + r"(?:/(?P<line_id>[^/]+))?", path)
+        if m:
+            lines = self.quotes[m["quote_id"]]["sections"][m["section_id"]]
+            body = read_body()
+            if method == "POST" and not m["line_id"]:
+                line_id = self._next_id("line")
+                with self._lock:
+                    lines[line_id] = {"id": line_id, "modelId": body.get("modelId"),
+                                      "pricePerUnit": body.get("pricePerUnit"),
+                                      "desiredQuantity": 1, "minimumQuantity": 1}
+                return 200, {"id": line_id}, "application/json", None
+            if method == "PUT" and m["line_id"]:
+                with self._lock:
+                    lines[m["line_id"]].update(body)
+                return 200, {"message": "Success"}, "application/json", None
+            if method == "DELETE" and m["line_id"]:
+                with self._lock:
+                    lines.pop(m["line_id"])
+                return 200, {"message": "Success"}, "application/json", None
+            raise KeyError(path)
+
+        m = re.fullmatch(_COMPANY + r"/quotes/create", path)
+        if m and method == "POST":
+            quote_id = self._next_id("quote")
+            with self._lock:
+                self.quotes[quote_id] = {"company_id": m["company_id"], "details": read_body(),
+                                         "sections": {self._next_id("section"): {}}}
+            return 200, {"quoteId": quote_id}, "application/json", None
+
+        m = re.fullmatch(_QUOTE + r"(?P<details>/details)?", path)
+        if m:
+            if method == "GET" and not m["details"]:
+                return 200, self.quote_page(m["quote_id"]), html, None
+            if method == "PUT" and m["details"]:
+                with self._lock:
+                    self.quotes[m["quote_id"]]["details"].update(read_body())
+                return 200, {"message": "Success"}, "application/json", None
+            if method == "DELETE" and not m["details"]:
+                with self._lock:
+                    self.quotes.pop(m["quote_id"])
+                return 200, {"message": "Success"}, "application/json", None
+
+        m = re.fullmatch(_COMPANY, path)
+        if m and method == "GET":
+            return 200, self.company_page(m["company_id"]), html, None
+        raise KeyError(path)
+
+
+class _FakeWorksheet:
+    """
+    The gspread `Worksheet` call `sheet_sync` uses to probe and fetch appended rows.
+
+    Cells render like the Sheets API's: with "UNFORMATTED_VALUE" as the raw number or text, with the default
+    "FORMATTED_VALUE" as displayed text, numbers in a "#,##0.##" format (so "1,234.5"), which is what
+    sets a formatted read apart from the connection's full read.
+    """
+
+    def __init__(self, conn, name):
+        self.conn = conn
+        self.name = name
+
+    @staticmethod
+    def _cell(value, value_render_option="FORMATTED_VALUE"):
+        if pd.isna(value):
+            return ""
+        if hasattr(value, "item"):
+            value = value.item()  # numpy scalars, as the API's JSON would give them
+        if value_render_option == "UNFORMATTED_VALUE":
+            return value
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return f"{value:,.2f}".rstrip("0").rstrip(".")
+        return str(value)
+
+    def _grid(self, value_render_option):
+        # the header row then the data rows, trailing empty rows dropped like the API does
+        df = self.conn._peek(self.name)
+        grid = [list(df.columns)] + [[self._cell(v, value_render_option) for v in row]
+                                     for row in df.itertuples(index=False)]
+        while grid and all(v == "" for v in grid[-1]):
+            grid.pop()
+        return grid
+
+    def get_values(self, range_name, value_render_option="FORMATTED_VALUE", date_time_render_option=None):
+        m = re.fullmatch(r"([A-Z]+)(\d*):([A-Z]+)(\d*)", range_name)
+        first_col, last_col = _column_number(m[1]), _column_number(m[3])
+        first_row, last_row = int(m[2] or 1), int(m[4]) if m[4] else None
+        rows = self._grid(value_render_option)[first_row - 1:last_row]
+        width = max(0, last_col - first_col + 1)
+        self.conn._sleep(len(rows) * width / max(len(self.conn._peek(self.name).columns), 1))
+        return [(row[first_col - 1:last_col] + [""] * width)[:width] for row in rows]
+
+
+def _column_number(letters):
+    """A -> 1, AA -> 27."""
+    n = 0
+    for letter in letters:
+        n = n * 26 + ord(letter) - 64
+    return n
+
+
+class _FakeClient:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def _select_worksheet(self, spreadsheet=None, folder_id=None, worksheet=None):
+        if worksheet not in self.conn.worksheets:
+            raise ValueError(f"Worksheet {worksheet!r} not found")
+        return _FakeWorksheet(self.conn, worksheet)
+
+
+class FakeGSheetsConnection:
+    """
+    An in-memory stand-in for `GSheetsConnection`, with the same `read`/`create`/`update` surface bundle_store uses
+    (and, through `.client`, the narrow gspread calls `sheet_sync` makes).
+
+    Each call sleeps `latency` seconds (plus `latency_per_row` per row moved) to mimic the Sheets API.
+    """
+
+    def __init__(self, worksheets: dict = None, latency: float = 0.0, latency_per_row: float = 0.0):
+        self.worksheets = {name: df.copy() for name, df in (worksheets or {}).items()}
+        self.latency = latency
+        self.latency_per_row = latency_per_row
+        self.reads = 0
+        self.writes = 0
+        self.client = _FakeClient(self)
+        self._lock = threading.Lock()
+
+    def _peek(self, worksheet):
+        with self._lock:
+            return self.worksheets[worksheet]
+
+    def _sleep(self, rows):
+        # the fixed latency is per call, `rows` can be fractional for narrow (single column) calls
+        delay = self.latency + self.latency_per_row * rows
+        if delay:
+            time.sleep(delay)
+
+    def read(self, worksheet=None, ttl=None, **options):
+        with self._lock:
+            self.reads += 1
+            if worksheet not in self.worksheets:
+                raise ValueError(f"Worksheet {worksheet!r} not found")
+            df = self.worksheets[worksheet].copy()
+        self._sleep(len(df))
+        return df
+
+    def create(self, worksheet=None, data=None, **options):
+        with self._lock:
+            self.writes += 1
+            if worksheet in self.worksheets:
+                raise ValueError(f"A sheet with the name {worksheet!r} already exists")
+            self.worksheets[worksheet] = (pd.DataFrame() if data is None else data.reset_index(drop=True).copy())
+        self._sleep(0 if data is None else len(data))
+        return data
+
+    def update(self, worksheet=None, data=None, **options):
+        with self._lock:
+            self.writes += 1
+            self.worksheets[worksheet] = data.reset_index(drop=True).copy()
+        self._sleep(len(data))
+        return data
+
+
+def fake_bundle_rows(n_rows: int, rows_per_bundle: int = 5, n_users: int = 10) -> pd.DataFrame:
+    """A `bundles` sheet of roughly `n_rows` rows, each bundle a root plus dependents, in the app's schema."""
+    rows = []
+    n_bundles = max(1, n_rows // rows_per_bundle)
+    for b in range(n_bundles):
+        bundle_id = str(uuid.uuid4())
+        user = f"user{b % n_users}@example.com"
+        root = f"model-{b}-0"
+        for i in range(rows_per_bundle):
+            rows.append({
+                "bundle_id": bundle_id,
+                "bundle_name": f"Bundle {b}",
+                "bundle_version": 1,
+                "status": "active",
+                "bundle_type": "Promotion" if b % 7 == 0 else "Standard",
+                "parent_model_id": None if i == 0 else root,
+                "parent_group_name": "root" if i == 0 else f"M{b}-0",
+                "dependent_model_id": f"model-{b}-{i}",
+                "dependent_group_name": f"M{b}-{i}",
+                "mapping_type": "root" if i == 0 else "Objective",
+                "multiple": 1.0,
+                "quantity": 1 + i % 3,
+                "min_quantity": 1,
+                "price_override": 10.0 + i,
+                "notes": "",
+                "created_by": user,
+                "created_at": "2025-01-01T00:00:00",
+                "source_model_json": "",
+                "user_id": user,
+            })
+    return pd.DataFrame(rows)
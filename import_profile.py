@@ -0,0 +1,59 @@
+"""
+Import-time profile of the app's cold start, from `python -X importtime`.
+
+    python import_profile.py                       # cold import of bundle_quoter_app, 5 runs
+    python import_profile.py --touch pandas addlify  # as above, then also load what the quote page needs
+
+Each run is a fresh interpreter, so the numbers are what a new Streamlit worker pays before the first render.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+
+def profile_once(module: str, touch: list) -> dict:
+    """Returns {imported module: cumulative microseconds} plus "__total__" for one cold import."""
+    code = f"import {module}"
+    for name in touch:
+        # make lazily imported modules actually load, as a page using them would
+        code += f"; import {name}; {name}.__doc__"
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                         capture_output=True, text=True, check=True).stderr
+    totals = {}
+    for line in out.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # the name is indented two spaces per nesting level; keep the top level and what it imports directly,
+        # each entry's cumulative time includes everything it pulled in
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            totals["__total__"] = totals.get("__total__", 0) + int(cumulative)
+        if depth <= 1 and name.strip() != module:
+            totals[name.strip()] = totals.get(name.strip(), 0) + int(cumulative)
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="bundle_quoter_app")
+    parser.add_argument("--touch", nargs="*", default=[], help="modules to force-load after the import")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    runs = [profile_once(args.module, args.touch) for _ in range(args.runs)]
+    names = {n for r in runs for n in r}
+    medians = {n: statistics.median(r.get(n, 0) for r in runs) for n in names}
+
+    total = medians.pop("__total__")
+    print(f"Cold import of {args.module}{' + ' + ', '.join(args.touch) if args.touch else ''}: "
+          f"{total / 1000:.0f} ms (median of {args.runs})")
+    print(f"{'imported module':<40}{'ms':>8}")
+    for name, us in sorted(medians.items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+        print(f"{name:<40}{us / 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
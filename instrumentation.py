@@ -0,0 +1,189 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# upper bounds (seconds) of the latency histogram buckets, Prometheus style
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Series:
+    """Latency histogram plus counters for one metric name + label set."""
+
+    __slots__ = ("count", "errors", "total", "min", "max", "bytes", "rows", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.bytes = 0
+        self.rows = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # the last one is +Inf
+
+    def add(self, seconds, nbytes, rows, error):
+        self.count += 1
+        self.errors += int(error)
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+        self.bytes += nbytes or 0
+        self.rows += rows or 0
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def quantile(self, q):
+        # estimated from the buckets, good enough to see where the time goes
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                bound = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else self.max
+                return min(max(bound, self.min), self.max)
+        return self.max
+
+
+class Metrics:
+    """
+    A small, thread-safe, process-wide store of timers and counters.
+
+    Every observation is grouped by a metric name (e.g. "addlify_request") and its labels (e.g. method and endpoint),
+    and keeps a latency histogram, error count, bytes and rows moved. `snapshot`, `to_json` and `to_prometheus`
+    export the lot.
+    """
+
+    def __init__(self):
+        self._series = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def observe(self, name: str, seconds: float, nbytes: int = 0, rows: int = 0, error: bool = False, **labels):
+        """Records one timed operation."""
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series()
+            series.add(seconds, nbytes, rows, error)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """
+        Times the enclosed block. The yielded dict can be given "bytes"/"rows" to record alongside the latency;
+        an exception counts as an error and is re-raised.
+        """
+        extra = {"bytes": 0, "rows": 0}
+        start = time.perf_counter()
+        error = False
+        try:
+            yield extra
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, extra["bytes"], extra["rows"], error, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self.started_at = time.time()
+
+    def snapshot(self) -> list:
+        """One summary dict per series: counts, latency min/mean/p50/p95/max (ms), throughput, bytes and rows."""
+        with self._lock:
+            items = [(name, dict(labels), s) for (name, labels), s in self._series.items()]
+            uptime = max(time.time() - self.started_at, 1e-9)
+            summary = []
+            for name, labels, s in items:
+                summary.append({
+                    "metric": name,
+                    **labels,
+                    "count": s.count,
+                    "errors": s.errors,
+                    "per_minute": round(s.count / uptime * 60, 2),
+                    "mean_ms": round(s.total / s.count * 1000, 1),
+                    "min_ms": round(s.min * 1000, 1),
+                    "p50_ms": round(s.quantile(0.5) * 1000, 1),
+                    "p95_ms": round(s.quantile(0.95) * 1000, 1),
+                    "max_ms": round(s.max * 1000, 1),
+                    "total_s": round(s.total, 3),
+                    "bytes": s.bytes,
+                    "rows": s.rows,
+                })
+        return sorted(summary, key=lambda r: r["total_s"], reverse=True)
+
+    def to_json(self) -> str:
+        return json.dumps({"started_at": self.started_at, "series": self.snapshot()}, indent=2)
+
+    def to_prometheus(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        def fmt_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+        with self._lock:
+            by_name = {}
+            for (name, labels), s in sorted(self._series.items()):
+                by_name.setdefault(name, []).append((labels, s))
+            # one family at a time: its HELP/TYPE, then its samples for every label set
+            lines = []
+            for name, series in by_name.items():
+                lines.append(f"# HELP {name}_seconds Latency of {name}.")
+                lines.append(f"# TYPE {name}_seconds histogram")
+                for labels, s in series:
+                    cumulative = 0
+                    for bound, n in zip(LATENCY_BUCKETS + ("+Inf",), s.buckets):
+                        cumulative += n
+                        lines.append(f"{name}_seconds_bucket{fmt_labels(labels, [('le', bound)])} {cumulative}")
+                    lines.append(f"{name}_seconds_sum{fmt_labels(labels)} {s.total}")
+                    lines.append(f"{name}_seconds_count{fmt_labels(labels)} {s.count}")
+                for counter, help_text in (("errors", "Failed"), ("bytes", "Bytes moved by"), ("rows", "Rows moved by")):
+                    lines.append(f"# HELP {name}_{counter}_total {help_text} {name}.")
+                    lines.append(f"# TYPE {name}_{counter}_total counter")
+                    for labels, s in series:
+                        lines.append(f"{name}_{counter}_total{fmt_labels(labels)} {getattr(s, counter)}")
+        return "\n".join(lines) + "\n"
+
+
+# the process-wide instance used by addlify, async_addlify and bundle_store
+METRICS = Metrics()
+
+
+def serve_metrics(port: int, host: str = "127.0.0.1", metrics: Metrics = METRICS) -> ThreadingHTTPServer:
+    """
+    Serves `/metrics` (Prometheus text) and `/metrics.json` from a daemon thread so a local scraper can read them.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith("/metrics.json"):
+                body, content_type = metrics.to_json(), "application/json"
+            elif self.path.startswith("/metrics"):
+                body, content_type = metrics.to_prometheus(), "text/plain; version=0.0.4"
+            else:
+                self.send_error(404)
+                return
+            data = body.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass  # keep scrapes out of the streamlit logs
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,228 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_DB_PATH = os.environ.get("BUNDLE_QUOTER_JOBS_DB", "jobs.sqlite3")
+DEFAULT_WORKERS = 4
+PROGRESS_INTERVAL = 0.25  # seconds between progress writes of one job, so a tight loop doesn't hammer the table
+KEEP_FINISHED = 2 * 24 * 3600  # seconds a finished job (and its result) is kept
+PRUNE_INTERVAL = 3600  # seconds between prunes, run from submit
+
+# job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+INTERRUPTED = "interrupted"  # the process stopped before the job finished
+FINISHED = (DONE, FAILED, INTERRUPTED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    status TEXT NOT NULL,
+    params TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    host TEXT,
+    pid INTEGER,
+    runner TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_owner_created ON jobs (owner, created_at);
+"""
+
+_COLUMNS = ("id", "kind", "owner", "status", "params", "progress", "message", "result", "error", "created_at",
+            "started_at", "finished_at", "host", "pid", "runner")
+
+# the runner ids of the queues of this process that can still run their jobs
+_LIVE_RUNNERS = set()
+
+
+def _pid_alive(pid) -> bool:
+    """Whether a process with this id runs on this machine. Not checked on Windows, where it counts as gone."""
+    if pid is None or os.name == "nt":
+        return False
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobContext:
+    """What a job handler gets besides its params: `resources` (e.g. the Addlify session) and `progress`."""
+
+    def __init__(self, queue, job_id, resources):
+        self.queue = queue
+        self.job_id = job_id
+        self.resources = resources or {}
+        self._last_write = 0.0
+
+    def progress(self, fraction: float, message: str = None):
+        """Reports how far the job is, 0..1, with an optional message. Writes are throttled to PROGRESS_INTERVAL."""
+        now = time.monotonic()
+        if fraction < 1 and now - self._last_write < PROGRESS_INTERVAL:
+            return
+        self._last_write = now
+        self.queue._update(self.job_id, progress=max(0.0, min(1.0, float(fraction))), message=message)
+
+
+class JobQueue:
+    """
+    A local job queue: a worker thread pool with every job's state in a SQLite table.
+
+    Long Addlify operations (creating a quote, refreshing the company list, crawling models) are submitted as jobs
+    so they run outside the Streamlit script thread: a rerun or a closed tab no longer loses them, and the page
+    just polls `get`. Handlers are registered per job kind and called as `handler(params, context)`; params are
+    stored as JSON, the return value is stored as the job's result. Live objects a job needs but that can't be
+    stored (the logged in Addlify session) are passed as `resources`.
+
+    Every job records the host, process id and queue (its runner id) that runs it. On start, jobs still queued or
+    running for a process on this host that is gone are marked interrupted, since their resources are gone; their
+    stored params are enough to submit them again. Jobs carrying this process's id are interrupted only if no queue
+    of this process runs them, i.e. they were left by an earlier process that had the same id, so rebuilding the
+    queue (a `st.cache_resource` clear) doesn't interrupt the jobs the old one is still running. Jobs of other live
+    processes sharing the table are left alone. Jobs of other hosts can't be checked and are left alone too, so a
+    table shared across machines needs its stale jobs cleared by hand.
+
+    Finished jobs are pruned after `keep_finished` seconds, checked at most every PRUNE_INTERVAL on submit, so
+    results such as a whole company list don't pile up in the table.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, workers: int = DEFAULT_WORKERS,
+                 keep_finished: float = KEEP_FINISHED):
+        self.path = path
+        self.keep_finished = keep_finished
+        self.host = socket.gethostname()
+        self.runner = uuid.uuid4().hex
+        self._handlers = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        existing = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("host", "TEXT"), ("pid", "INTEGER"), ("runner", "TEXT")):
+            if column not in existing:  # a table from before jobs recorded their process
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._interrupt_orphans()
+        self.prune(keep_finished)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        _LIVE_RUNNERS.add(self.runner)
+
+    def _interrupt_orphans(self):
+        rows = self._db.execute(
+            "SELECT id, host, pid, runner FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+        ).fetchall()
+        orphans = [job_id for job_id, host, pid, runner in rows if host in (None, self.host) and (
+            runner not in _LIVE_RUNNERS if pid == os.getpid() else not _pid_alive(pid)
+        )]
+        self._db.executemany(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+            [(INTERRUPTED, "The app restarted before the job finished.", time.time(), job_id) for job_id in orphans],
+        )
+
+    def register(self, kind: str, handler):
+        """Registers the function that runs jobs of this kind."""
+        self._handlers[kind] = handler
+
+    def submit(self, kind: str, params: dict = None, owner: str = "", resources: dict = None) -> str:
+        """
+        Queues a job.
+
+        Args:
+            kind (str): A registered job kind.
+            params (dict): JSON-serializable arguments for the handler, stored with the job.
+            owner (str): Who submitted it (the user's email), for listing their jobs.
+            resources (dict, optional): Live objects for the handler, not stored.
+
+        Returns:
+            str: The job id.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind {kind!r}")
+        if time.time() - self._pruned_at > PRUNE_INTERVAL:
+            self.prune(self.keep_finished)
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, owner, status, params, created_at, host, pid, runner) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, owner, QUEUED, json.dumps(params or {}, default=str), time.time(), self.host,
+                 os.getpid(), self.runner),
+            )
+        self._pool.submit(self._run, job_id, kind, params or {}, resources)
+        return job_id
+
+    def _update(self, job_id, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def _run(self, job_id, kind, params, resources):
+        self._update(job_id, status=RUNNING, started_at=time.time())
+        try:
+            result = self._handlers[kind](params, JobContext(self, job_id, resources))
+        except Exception as e:
+            self._update(job_id, status=FAILED, error=f"{e}\n\n{traceback.format_exc()}", finished_at=time.time())
+        else:
+            self._update(job_id, status=DONE, progress=1.0, result=json.dumps(result, default=str),
+                         finished_at=time.time())
+
+    @staticmethod
+    def _row(row) -> dict:
+        job = dict(zip(_COLUMNS, row))
+        for column in ("params", "result"):
+            job[column] = json.loads(job[column]) if job[column] else None
+        return job
+
+    def get(self, job_id: str) -> dict:
+        """The job as a dict of its columns (params and result decoded), or None if there is no such job."""
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def recent(self, owner: str = None, limit: int = 20) -> list:
+        """The latest jobs, newest first, optionally only one owner's. Results are left out to keep this cheap."""
+        columns = ", ".join(c if c != "result" else "NULL" for c in _COLUMNS)
+        query = f"SELECT {columns} FROM jobs"
+        args = ()
+        if owner is not None:
+            query += " WHERE owner = ?"
+            args = (owner,)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY created_at DESC LIMIT ?", (*args, limit)).fetchall()
+        return [self._row(row) for row in rows]
+
+    def prune(self, older_than: float = KEEP_FINISHED) -> int:
+        """Deletes jobs finished more than `older_than` seconds ago, returns how many."""
+        with self._lock:
+            self._pruned_at = time.time()
+            cursor = self._db.execute(
+                f"DELETE FROM jobs WHERE status IN ({', '.join('?' * len(FINISHED))}) AND finished_at < ?",
+                (*FINISHED, time.time() - older_than),
+            )
+        return cursor.rowcount
+
+    def shutdown(self, wait: bool = True):
+        """Stops the workers (after the running jobs if `wait`) and closes the table."""
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+        if wait:  # otherwise the running jobs still finish, and a later queue must leave them alone
+            _LIVE_RUNNERS.discard(self.runner)
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,25 @@
+import importlib
+import importlib.util
+import sys
+
+
+def lazy_import(name: str):
+    """
+    Returns the module `name` without executing it until one of its attributes is first used.
+
+    Used for the heavy dependencies (pandas, the Sheets connection, requests/bs4, the excel writers) so a cold
+    start of the app only pays for the libraries the page being rendered actually touches:
+
+        pd = lazy_import("pandas")
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
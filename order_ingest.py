@@ -0,0 +1,278 @@
+"""
+Incremental ingestion of the store's order history into a local Parquet store, so order data (e.g. which bundles
+actually convert) can be analysed without scraping years of order pages again.
+
+The date range is fetched in windows of `--window-days`; each window's new order pages are fetched concurrently,
+parsed with lxml off the event loop and written as one Parquet part file. Orders already in the store are skipped,
+and windows that completed (and are over) are not listed again, so an interrupted run picks up where it stopped.
+
+    ADDLIFY_EMAIL=... ADDLIFY_PASSWORD=... python order_ingest.py --start 2023-01-01 --end 2024-12-31
+    python order_ingest.py --start 2024-01-01 --end 2024-03-31 --compact   # one part file afterwards
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+from addlify import order_id_of, parse_order_page
+from lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
+
+DEFAULT_STORE_DIR = "order_store"
+DEFAULT_WINDOW_DAYS = 7
+WINDOWS_FILE = "windows.json"  # the completed windows, next to the part files
+
+# columns every stored order has; the listing's and the order page's fields come after them
+ORDER_KEY_COLUMNS = ("order_id", "window_start", "window_end", "fetched_at")
+
+
+def date_windows(start: datetime.date, end: datetime.date, days: int = DEFAULT_WINDOW_DAYS) -> list:
+    """Splits [start, end] (both inclusive) into consecutive (start, end) windows of at most `days` days."""
+    windows = []
+    while start <= end:
+        window_end = min(start + datetime.timedelta(days=days - 1), end)
+        windows.append((start, window_end))
+        start = window_end + datetime.timedelta(days=1)
+    return windows
+
+
+def column_name(field: str) -> str:
+    """A field heading or JSON key as a column name, e.g. "Purchase Order Number" -> "purchase_order_number"."""
+    name = re.sub(r"([a-z0-9])([A-Z])", r"\1_\2", str(field).strip())
+    return re.sub(r"[^0-9a-zA-Z]+", "_", name).strip("_").lower() or "field"
+
+
+def order_record(order_id, listing: dict, fields: dict, window) -> dict:
+    """
+    One stored row: the key columns, the listing's scalar values prefixed "list_" and the page's fields. Values are
+    kept as strings so every part file agrees on the column types.
+    """
+    record = {
+        "order_id": str(order_id),
+        "window_start": window[0].isoformat(),
+        "window_end": window[1].isoformat(),
+        "fetched_at": datetime.datetime.now().isoformat(),
+    }
+    for key, value in listing.items():
+        if not isinstance(value, (dict, list)) and value is not None:
+            record[f"list_{column_name(key)}"] = str(value)
+    for key, value in fields.items():
+        column = column_name(key)
+        if column not in record:
+            record[column] = value
+    return record
+
+
+class OrderStore:
+    """
+    A directory of Parquet part files holding the ingested orders, keyed by `order_id`.
+
+    Each ingested window is written as its own part file (to a temporary name first, so a crash never leaves half
+    a file), so ingesting more never rewrites what is there. `read` stitches the parts together, keeping the latest
+    fetch of each order; `compact` rewrites them as one file.
+    """
+
+    def __init__(self, directory: str = DEFAULT_STORE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._ids = None  # the stored order ids, loaded on first use
+        self._lock = threading.Lock()
+
+    def _parts(self) -> list:
+        return sorted(os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith(".parquet"))
+
+    def order_ids(self) -> set:
+        """The ids of every stored order (only the order_id column is read)."""
+        import pyarrow.parquet as pq
+
+        with self._lock:
+            if self._ids is None:
+                self._ids = set()
+                for part in self._parts():
+                    self._ids.update(pq.read_table(part, columns=["order_id"]).column("order_id").to_pylist())
+            return set(self._ids)
+
+    def completed_windows(self) -> set:
+        """The (start, end) iso date pairs of the windows ingested without failures."""
+        path = os.path.join(self.directory, WINDOWS_FILE)
+        if not os.path.exists(path):
+            return set()
+        with open(path) as f:
+            return {tuple(w) for w in json.load(f)}
+
+    def mark_complete(self, window):
+        """Records a window as fully ingested."""
+        windows = self.completed_windows() | {(window[0].isoformat(), window[1].isoformat())}
+        path = os.path.join(self.directory, WINDOWS_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(sorted(windows), f)
+        os.replace(path + ".tmp", path)
+
+    def append(self, records: list) -> str:
+        """Writes the records as a new part file and returns its path, or None if there were none."""
+        if not records:
+            return None
+        df = pd.DataFrame(records)
+        columns = list(ORDER_KEY_COLUMNS) + sorted(c for c in df.columns if c not in ORDER_KEY_COLUMNS)
+        name = f"part-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet"
+        path = os.path.join(self.directory, name)
+        df[columns].astype(object).where(df[columns].notna(), None).to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        with self._lock:
+            if self._ids is not None:
+                self._ids.update(df["order_id"])
+        return path
+
+    def read(self, columns=None):
+        """
+        Every stored order, one row each (the latest fetch wins).
+
+        Args:
+            columns (list, optional): Only read these columns (order_id and fetched_at are always read).
+
+        Returns:
+            pd.DataFrame: The orders.
+        """
+        import pyarrow.parquet as pq
+
+        frames = []
+        for part in self._parts():
+            if columns is None:
+                frames.append(pd.read_parquet(part))
+            else:
+                available = set(pq.read_schema(part).names)
+                wanted = [c for c in dict.fromkeys(["order_id", "fetched_at", *columns]) if c in available]
+                frames.append(pd.read_parquet(part, columns=wanted))
+        if not frames:
+            return pd.DataFrame(columns=list(ORDER_KEY_COLUMNS))
+        df = pd.concat(frames, ignore_index=True)
+        return (df.sort_values("fetched_at", kind="stable")
+                .drop_duplicates("order_id", keep="last")
+                .reset_index(drop=True))
+
+    def compact(self) -> str:
+        """Rewrites every part file as a single one, dropping superseded fetches. Returns the new file's path."""
+        parts = self._parts()
+        if len(parts) <= 1:
+            return parts[0] if parts else None
+        df = self.read()
+        path = self.append(df.to_dict("records"))
+        for part in parts:
+            os.remove(part)
+        return path
+
+
+async def _fetch_order(adder, order_id):
+    text = await adder.get_order_page(order_id)
+    # lxml parsing is CPU work, keep it off the event loop so the other page fetches carry on
+    return await asyncio.to_thread(parse_order_page, text)
+
+
+async def ingest_orders(adder, store: OrderStore, start: datetime.date, end: datetime.date,
+                        window_days: int = DEFAULT_WINDOW_DAYS, refresh: bool = False, on_window=None) -> dict:
+    """
+    Fetches the orders placed between `start` and `end` into `store`.
+
+    Args:
+        adder (AsyncAddlify): A logged in async client; its `max_concurrency` bounds the concurrent page fetches.
+        store (OrderStore): Where the orders go.
+        start (datetime.date): The first day.
+        end (datetime.date): The last day.
+        window_days (int): Days listed per dateRange request.
+        refresh (bool): Fetch every window and order again, even the ones already stored.
+        on_window (callable, optional): Called with each window's stats dict as it is stored, e.g. to print progress.
+
+    Returns:
+        dict: Totals: windows, windows_skipped, orders_listed, orders_fetched, orders_failed, seconds. A window
+            whose listing couldn't be parsed, or listed an order without an id, counts a failure (order id None)
+            and is not marked complete.
+    """
+    started = time.perf_counter()
+    totals = {"windows": 0, "windows_skipped": 0, "orders_listed": 0, "orders_fetched": 0, "orders_failed": 0}
+    completed = set() if refresh else store.completed_windows()
+    today = datetime.date.today()
+    for window in date_windows(start, end, window_days):
+        totals["windows"] += 1
+        # a window reaching today can still get orders, so it is listed again every run
+        if (window[0].isoformat(), window[1].isoformat()) in completed and window[1] < today:
+            totals["windows_skipped"] += 1
+            continue
+
+        records, failed = [], []
+        try:
+            orders = await adder.get_orders_by_date(window[0].isoformat(), window[1].isoformat())
+        except ValueError as e:
+            # a listing we can't read is not an empty window, it stays incomplete and is listed again next run
+            orders = []
+            failed.append((None, str(e)))
+        known = set() if refresh else store.order_ids()
+        listings = {}
+        for order in orders:
+            order_id = order_id_of(order)
+            if order_id is None:
+                failed.append((None, f"Listed without an id: {json.dumps(order, default=str)[:200]}"))
+            elif order_id not in known:
+                listings.setdefault(order_id, order)
+        results = await asyncio.gather(*(_fetch_order(adder, order_id) for order_id in listings),
+                                       return_exceptions=True)
+        for (order_id, listing), fields in zip(listings.items(), results):
+            if isinstance(fields, Exception):
+                failed.append((order_id, str(fields) or repr(fields)))
+            else:
+                records.append(order_record(order_id, listing, fields, window))
+        store.append(records)
+        if not failed:
+            store.mark_complete(window)
+
+        totals["orders_listed"] += len(orders)
+        totals["orders_fetched"] += len(records)
+        totals["orders_failed"] += len(failed)
+        if on_window is not None:
+            on_window({"window": window, "listed": len(orders), "fetched": len(records), "failed": failed})
+    totals["seconds"] = time.perf_counter() - started
+    return totals
+
+
+async def _run(args):
+    from async_addlify import AsyncAddlify
+
+    store = OrderStore(args.store)
+    email, password = os.environ.get("ADDLIFY_EMAIL"), os.environ.get("ADDLIFY_PASSWORD")
+    if not email or not password:
+        raise SystemExit("Set ADDLIFY_EMAIL and ADDLIFY_PASSWORD.")
+
+    def report(stats):
+        start, end = stats["window"]
+        print(f"{start} .. {end}: {stats['listed']} listed, {stats['fetched']} fetched, {len(stats['failed'])} failed")
+        for order_id, error in stats["failed"]:
+            print(f"  {order_id or 'listing'}: {error}")
+
+    async with AsyncAddlify(email, password, max_concurrency=args.concurrency, base_url=args.base_url) as adder:
+        totals = await ingest_orders(adder, store, args.start, args.end, args.window_days, args.refresh, report)
+    print(f"{totals['orders_fetched']} orders stored, {totals['orders_failed']} failed, "
+          f"{totals['windows_skipped']}/{totals['windows']} windows skipped, {totals['seconds']:.1f}s")
+    if args.compact:
+        print(f"compacted into {store.compact()}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start", type=datetime.date.fromisoformat, required=True, help="first day, yyyy-mm-dd")
+    parser.add_argument("--end", type=datetime.date.fromisoformat, default=datetime.date.today(), help="last day")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR, help="directory of the Parquet store")
+    parser.add_argument("--window-days", type=int, default=DEFAULT_WINDOW_DAYS)
+    parser.add_argument("--concurrency", type=int, default=10, help="order pages fetched at once")
+    parser.add_argument("--refresh", action="store_true", help="fetch stored orders and completed windows again")
+    parser.add_argument("--compact", action="store_true", help="rewrite the store as one file afterwards")
+    parser.add_argument("--base-url", help="talk to another store, e.g. fake_backends.FakeAddlifyServer")
+    asyncio.run(_run(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
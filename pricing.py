@@ -0,0 +1,122 @@
+from lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# columns of the models list that may carry a list price, first match wins
+LIST_PRICE_COLUMNS = ("listPrice", "list_price", "price", "unitPrice")
+
+
+def _frame(lines):
+    if isinstance(lines, pd.DataFrame):
+        return lines
+    return pd.DataFrame(list(lines))
+
+
+def _numeric(df, column, default):
+    if column not in df.columns:
+        return pd.Series(default, index=df.index, dtype="float64")
+    return pd.to_numeric(df[column], errors="coerce").astype("float64")
+
+
+def _unique_index(series):
+    # Series.map needs a unique index, the last entry for an id wins
+    return series if series.index.is_unique else series[~series.index.duplicated(keep="last")]
+
+
+def list_prices_from_models(models_df):
+    """A model id -> list price Series from the models list, or None if it has no price column."""
+    if models_df is None or models_df.empty or "id" not in models_df.columns:
+        return None
+    for column in LIST_PRICE_COLUMNS:
+        if column in models_df.columns:
+            prices = pd.to_numeric(models_df[column], errors="coerce")
+            prices = pd.Series(prices.to_numpy(), index=models_df["id"].astype(str)).dropna()
+            # the list is bucketed by series, so a model in two series is listed twice: keep one price per id
+            return _unique_index(prices)
+    return None
+
+
+def price_lines(lines, quantity_col="quantity", price_col="price_override", list_prices=None,
+                model_col="dependent_model_id", apply_multiple=False):
+    """
+    Prices line items in one vectorized pass.
+
+    The unit price is the line's price override, else its list price; lines with neither are flagged
+    `missing_price` and count as 0. The quantity is raised to `min_quantity` where it is below it (flagged
+    `below_min_quantity`) and rounded up to whole units.
+
+    Args:
+        lines (pd.DataFrame | list): Line items, a frame or a list of dicts.
+        quantity_col (str): The quantity column, e.g. "quantity_edited" after the quote page's editor.
+        price_col (str): The price override column.
+        list_prices (pd.Series | dict, optional): List price per model id, for the fallback price and discounts.
+            A "list_price" column on the lines is used if this isn't given.
+        model_col (str): The model id column, to look the list prices up.
+        apply_multiple (bool): Multiply the quantity by the "multiple" column, for raw bundle rows (lines from
+            bundle_store.expand_bundle are already multiplied).
+
+    Returns:
+        pd.DataFrame: A copy of the lines with effective_quantity, unit_price, line_total, list_total, discount,
+            below_min_quantity and missing_price columns added.
+    """
+    df = _frame(lines).copy()
+    quantity = _numeric(df, quantity_col, 0.0).fillna(0.0)
+    if apply_multiple:
+        quantity = quantity * _numeric(df, "multiple", 1.0).fillna(1.0)
+    min_quantity = _numeric(df, "min_quantity", 0.0).fillna(0.0)
+    effective = np.ceil(np.maximum(quantity, min_quantity) - 1e-9)
+
+    if list_prices is not None and model_col in df.columns:
+        list_price = df[model_col].astype(str).map(_unique_index(pd.Series(list_prices, dtype="float64")))
+    else:
+        list_price = _numeric(df, "list_price", np.nan)
+    override = _numeric(df, price_col, np.nan)
+    unit_price = override.where(override.notna(), list_price)
+
+    df["effective_quantity"] = effective
+    df["unit_price"] = unit_price.round(2)
+    df["line_total"] = (unit_price.fillna(0.0) * effective).round(2)
+    df["list_total"] = (list_price * effective).round(2)
+    df["discount"] = (df["list_total"] - df["line_total"]).round(2)
+    df["below_min_quantity"] = quantity < min_quantity
+    df["missing_price"] = unit_price.isna()
+    return df
+
+
+def summarize(priced, by="bundle_name") -> dict:
+    """
+    Totals of a frame from `price_lines`.
+
+    Args:
+        priced (pd.DataFrame): The priced lines.
+        by (str): The column to subtotal by, skipped if the lines don't have it.
+
+    Returns:
+        dict: total, list_total, discount, discount_pct (of the list total, None without list prices), lines,
+            missing_prices, below_min_quantity, and subtotals (a frame per `by` value, or None).
+    """
+    if priced.empty:
+        return {"total": 0.0, "list_total": None, "discount": None, "discount_pct": None, "lines": 0,
+                "missing_prices": 0, "below_min_quantity": 0, "subtotals": None}
+    total = float(priced["line_total"].sum())
+    has_list = priced["list_total"].notna()
+    list_total = float(priced.loc[has_list, "list_total"].sum()) if has_list.any() else None
+    discount = float(priced.loc[has_list, "discount"].sum()) if has_list.any() else None
+    subtotals = None
+    if by in priced.columns:
+        groups = priced.groupby(by, observed=True, dropna=False)
+        # min_count keeps "no list price" as missing instead of a 0 list total
+        subtotals = groups[["line_total", "list_total", "discount"]].sum(min_count=1)
+        subtotals.insert(0, "lines", groups.size())
+        subtotals = subtotals.rename(columns={"line_total": "total"}).reset_index()
+    return {
+        "total": round(total, 2),
+        "list_total": None if list_total is None else round(list_total, 2),
+        "discount": None if discount is None else round(discount, 2),
+        "discount_pct": round(100 * discount / list_total, 2) if list_total else None,
+        "lines": len(priced),
+        "missing_prices": int(priced["missing_price"].sum()),
+        "below_min_quantity": int(priced["below_min_quantity"].sum()),
+        "subtotals": subtotals,
+    }
@@ -0,0 +1,171 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from quote_plan import PAYLOAD_KEYS
+
+DEFAULT_MAX_WORKERS = 8  # line item calls in flight at once; requests' connection pool keeps 10 per host
+
+
+def _number(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _normalized(line: dict) -> tuple:
+    # what decides whether a line needs an update: the price to the cent and whole quantities
+    return (
+        round(_number(line.get("pricePerUnit")), 2),
+        int(_number(line.get("desiredQuantity"), 1)),
+        int(_number(line.get("minimumQuantity"), 1)),
+    )
+
+
+def existing_lines(quote_info: dict, section_id=None) -> list:
+    """
+    The line items of a quote as payload-like dicts with their `line_id` and `section_id`.
+
+    Args:
+        quote_info (dict): From `get_quote_info`.
+        section_id (str, optional): Only this section's lines; defaults to the last section, where new lines go.
+
+    Returns:
+        list: One dict per line with line_id, section_id and the PAYLOAD_KEYS.
+    """
+    sections = quote_info.get("sections", [])
+    if not sections:
+        return []
+    if section_id is None:
+        section_id = sections[-1]["id"]
+    lines = []
+    for section in sections:
+        if section["id"] != section_id:
+            continue
+        for item in section.get("lineItems", []):
+            line = {"line_id": item.get("id"), "section_id": section_id}
+            line.update({key: item.get(key) for key in PAYLOAD_KEYS})
+            lines.append(line)
+    return lines
+
+
+class QuoteDelta:
+    """
+    The line item calls that turn a quote section into a target list of payloads: `adds` (payloads), `updates`
+    and `deletes` (dicts with the `line_id` and, for updates, the new `payload`). `unchanged` counts the lines that
+    already match and cost no call.
+    """
+
+    def __init__(self, adds=(), updates=(), deletes=(), unchanged=0):
+        self.adds = list(adds)
+        self.updates = list(updates)
+        self.deletes = list(deletes)
+        self.unchanged = unchanged
+
+    def __len__(self):
+        return len(self.adds) + len(self.updates) + len(self.deletes)
+
+    def summary(self) -> dict:
+        """The number of calls of each kind, plus the unchanged lines."""
+        return {"add": len(self.adds), "update": len(self.updates), "delete": len(self.deletes),
+                "unchanged": self.unchanged}
+
+
+def diff_quote(existing: list, target: list) -> QuoteDelta:
+    """
+    Computes the fewest line item calls that make `existing` match `target`.
+
+    Lines are matched per model: a target identical to an existing line of that model keeps it, the remaining
+    targets update the model's remaining lines in order, and whatever is left over on either side is added or
+    deleted. A model quoted twice is handled as two lines.
+
+    Args:
+        existing (list): From `existing_lines`.
+        target (list): Payload dicts (see `quote_plan.payloads`).
+
+    Returns:
+        QuoteDelta: The calls to make.
+    """
+    existing_by_model = {}
+    for line in existing:
+        existing_by_model.setdefault(str(line.get("modelId")), []).append(line)
+    target_by_model = {}
+    for payload in target:
+        target_by_model.setdefault(str(payload["modelId"]), []).append(payload)
+
+    delta = QuoteDelta()
+    for model in dict.fromkeys(list(target_by_model) + list(existing_by_model)):
+        lines = list(existing_by_model.get(model, ()))
+        pending = []
+        for payload in target_by_model.get(model, ()):
+            wanted = _normalized(payload)
+            same = next((line for line in lines if _normalized(line) == wanted), None)
+            if same is not None:
+                lines.remove(same)
+                delta.unchanged += 1
+            else:
+                pending.append(payload)
+        for payload in pending:
+            if lines:
+                line = lines.pop(0)
+                delta.updates.append({"line_id": line["line_id"], "payload": payload, "before": line})
+            else:
+                delta.adds.append(payload)
+        delta.deletes.extend({"line_id": line["line_id"], "before": line} for line in lines)
+    return delta
+
+
+def _call(adder, company_id, quote_id, section_id, op, item):
+    if op == "add":
+        return adder.add_item_to_quote(company_id, quote_id, section_id, item["modelId"], item["pricePerUnit"],
+                                       item["desiredQuantity"], item["minimumQuantity"])[-1]
+    if op == "update":
+        payload = item["payload"]
+        return adder.update_quote_line_item(company_id, quote_id, section_id, item["line_id"], payload["pricePerUnit"],
+                                            payload["desiredQuantity"], payload["minimumQuantity"])
+    return adder.delete_quote_line_item(company_id, quote_id, section_id, item["line_id"])
+
+
+def apply_quote_diff(adder, company_id, quote_id, section_id, delta: QuoteDelta,
+                     max_workers: int = DEFAULT_MAX_WORKERS, on_call=None) -> list:
+    """
+    Makes the delta's calls concurrently on a thread pool.
+
+    Args:
+        adder (Addlify): A logged in session.
+        company_id (str): The quote's company.
+        quote_id (str): The quote.
+        section_id (str): The section the delta was computed for.
+        delta (QuoteDelta): From `diff_quote`.
+        max_workers (int): Calls in flight at once.
+        on_call (callable, optional): Called with (done, total, result) as each call finishes.
+
+    Returns:
+        list: One result dict per call (op, model_id, line_id, status, error, latency_ms), in completion order.
+    """
+    calls = [("delete", d) for d in delta.deletes] + [("update", u) for u in delta.updates] + [("add", a) for a in delta.adds]
+    if not calls:
+        return []
+
+    def run(op, item):
+        start = time.perf_counter()
+        status, error = None, None
+        try:
+            response = _call(adder, company_id, quote_id, section_id, op, item)
+            status = response.status_code
+            if status >= 400:
+                error = f"{op} failed ({status}): {response.text[:200]!r}"
+        except Exception as e:
+            error = str(e) or repr(e)
+        model = item.get("modelId") or item.get("payload", item.get("before", {})).get("modelId")
+        return {"op": op, "model_id": model, "line_id": item.get("line_id"), "status": status, "error": error,
+                "latency_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+    results = []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(calls)), thread_name_prefix="quote-diff") as pool:
+        futures = [pool.submit(run, op, item) for op, item in calls]
+        for future in as_completed(futures):
+            results.append(future.result())
+            if on_call is not None:
+                on_call(len(results), len(calls), results[-1])
+    return results
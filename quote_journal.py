@@ -0,0 +1,165 @@
+import threading
+import time
+from datetime import datetime
+
+from lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
+
+# the state of a journal line
+PENDING = "pending"  # not sent yet
+ADDED = "added"  # on the quote with its quantities set
+FAILED = "failed"  # the last attempt failed; `line_id` is set if the line was created but its quantities weren't
+SKIPPED = "skipped"  # never sent, e.g. it has no price
+
+# the columns of the journal's line items table, in the order the report shows them
+JOURNAL_COLUMNS = ("line", "bundle_name", "dependent_group_name", "dependent_model_id", "unit_price", "quantity",
+                   "min_quantity", "status", "attempts", "line_id", "add_status", "update_status", "latency_ms",
+                   "error", "completed_at")
+
+
+class QuoteJournal:
+    """
+    The outcome of every line item sent to one Addlify quote, recorded as each line completes.
+
+    Each line keeps the line id Addlify gave it, the HTTP statuses of the add and update requests, how long it
+    took, the error if it failed and how many attempts it took. The journal outlives the submission (the quote
+    page keeps it in session state), so the failed lines can be downloaded as an Excel report and re-submitted
+    to the same quote with `submit(adder, retry=True)` instead of creating the quote again. A line that was
+    created but whose quantities couldn't be set is retried with an update only, so it isn't added twice.
+    """
+
+    def __init__(self, company_id, quote_id, section_id, quote_url=None):
+        self.company_id = company_id
+        self.quote_id = quote_id
+        self.section_id = section_id
+        self.quote_url = quote_url
+        self.created_at = datetime.now().isoformat()
+        self.lines = []
+        self._lock = threading.Lock()
+
+    def to_dict(self) -> dict:
+        """The journal as plain data, e.g. to store as a background job's result."""
+        with self._lock:
+            lines = [dict(line) for line in self.lines]
+        return {"company_id": self.company_id, "quote_id": self.quote_id, "section_id": self.section_id,
+                "quote_url": self.quote_url, "created_at": self.created_at, "lines": lines}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        """Rebuilds a journal from `to_dict`, e.g. to retry the failed lines of a quote created in the background."""
+        journal = cls(data["company_id"], data["quote_id"], data["section_id"], data.get("quote_url"))
+        journal.created_at = data.get("created_at", journal.created_at)
+        journal.lines = [dict(line) for line in data.get("lines", [])]
+        return journal
+
+    def add_lines(self, priced):
+        """
+        Adds the lines to send, from a frame of `pricing.price_lines`. Lines without a price are recorded as skipped.
+
+        Args:
+            priced (pd.DataFrame): The priced line items, with effective_quantity, unit_price and missing_price.
+        """
+        for item in priced.to_dict("records"):
+            min_quantity = item.get("min_quantity")
+            line = {c: None for c in JOURNAL_COLUMNS}
+            line.update({
+                "line": len(self.lines) + 1,
+                "bundle_name": item.get("bundle_name"),
+                "dependent_group_name": item.get("dependent_group_name"),
+                "dependent_model_id": item.get("dependent_model_id"),
+                "unit_price": None if item["missing_price"] else float(item["unit_price"]),
+                "quantity": int(item["effective_quantity"]),
+                "min_quantity": int(min_quantity) if pd.notna(min_quantity) else 1,
+                "status": PENDING,
+                "attempts": 0,
+            })
+            if item["missing_price"]:
+                line.update(status=SKIPPED, error="No price", completed_at=datetime.now().isoformat())
+            self.lines.append(line)
+
+    def submit(self, adder, retry=False, on_line=None) -> dict:
+        """
+        Sends the pending lines (and the failed ones if `retry`) to the quote, one at a time, recording each outcome.
+
+        Args:
+            adder (Addlify): A logged in session.
+            retry (bool): Also re-send the lines that failed before.
+            on_line (callable, optional): Called with (done, total, line) after each line, e.g. for a progress bar.
+
+        Returns:
+            dict: The line counts per status, see `counts`.
+        """
+        todo = [line for line in self.lines if line["status"] == PENDING or (retry and line["status"] == FAILED)]
+        for done, line in enumerate(todo, start=1):
+            self._send_line(adder, line)
+            if on_line is not None:
+                on_line(done, len(todo), line)
+        return self.counts()
+
+    def _send_line(self, adder, line):
+        start = time.perf_counter()
+        add_response = update_response = None
+        error = None
+        try:
+            if line["line_id"] is None:
+                # two steps, so the line id is kept as soon as the line exists: if setting the quantities fails
+                # the retry only updates it
+                add_response = adder.new_quote_line_item(
+                    self.company_id, self.quote_id, self.section_id, line["dependent_model_id"], line["unit_price"])
+                if add_response.status_code >= 400:
+                    raise RuntimeError(f"Adding the line failed ({add_response.status_code}): {add_response.text[:200]!r}")
+                with self._lock:
+                    line["line_id"] = add_response.json()["id"]
+            update_response = adder.update_quote_line_item(
+                self.company_id, self.quote_id, self.section_id, line["line_id"],
+                line["unit_price"], line["quantity"], line["min_quantity"])
+            if update_response.status_code >= 400:
+                error = f"Setting the quantities failed ({update_response.status_code}): {update_response.text[:200]!r}"
+        except Exception as e:
+            error = str(e) or repr(e)
+        with self._lock:
+            line["attempts"] += 1
+            line["status"] = FAILED if error else ADDED
+            line["error"] = error
+            if add_response is not None:
+                line["add_status"] = add_response.status_code
+            line["update_status"] = None if update_response is None else update_response.status_code
+            line["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            line["completed_at"] = datetime.now().isoformat()
+
+    def failed(self) -> list:
+        """The lines whose last attempt failed."""
+        return [line for line in self.lines if line["status"] == FAILED]
+
+    def counts(self) -> dict:
+        """The number of lines per status."""
+        counts = {PENDING: 0, ADDED: 0, FAILED: 0, SKIPPED: 0}
+        for line in self.lines:
+            counts[line["status"]] += 1
+        return counts
+
+    def to_frame(self, statuses=None):
+        """The journal as a frame, one row per line, optionally only the lines with one of `statuses`."""
+        with self._lock:
+            rows = [dict(line) for line in self.lines if statuses is None or line["status"] in statuses]
+        return pd.DataFrame(rows, columns=list(JOURNAL_COLUMNS))
+
+    def tables(self) -> dict:
+        """The journal as export tables: the failed and skipped lines first, then every line and the quote details."""
+        counts = self.counts()
+        summary = pd.DataFrame({
+            "field": ["company_id", "quote_id", "section_id", "quote_url", "created_at"] + list(counts),
+            "value": [self.company_id, self.quote_id, self.section_id, self.quote_url, self.created_at]
+                     + [str(n) for n in counts.values()],
+        })
+        return {
+            "failed_lines": self.to_frame((FAILED, SKIPPED)),
+            "all_lines": self.to_frame(),
+            "quote": summary,
+        }
+
+    def export_excel(self, path: str) -> str:
+        """Writes the journal to an .xlsx report at `path`, see `tables`."""
+        import exporter
+        return exporter.export_excel(path, self.tables())
@@ -0,0 +1,175 @@
+import threading
+import time
+from collections import OrderedDict
+
+import pricing
+from lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
+
+DEFAULT_MAX_PLANS = 256  # compiled plans kept by the process-wide cache, least recently used dropped first
+
+# what Addlify's add/update line item calls take, see Addlify.add_item_to_quote
+PAYLOAD_KEYS = ("modelId", "pricePerUnit", "desiredQuantity", "minimumQuantity")
+
+
+def prices_token(list_prices):
+    """A hash of a list price Series, so plans priced with different list prices are cached apart."""
+    if list_prices is None:
+        return None
+    return int(pd.util.hash_pandas_object(pd.Series(list_prices, dtype="float64")).sum())
+
+
+def payloads(priced) -> list:
+    """The Addlify payload of each priced line (from `pricing.price_lines`) that has a price, in order."""
+    sendable = priced[~priced["missing_price"]]
+    min_quantity = pd.to_numeric(sendable["min_quantity"], errors="coerce").fillna(1)
+    return [
+        dict(zip(PAYLOAD_KEYS, (str(model), round(float(price), 2), int(quantity), int(minimum))))
+        for model, price, quantity, minimum in zip(sendable["dependent_model_id"], sendable["unit_price"],
+                                                   sendable["effective_quantity"], min_quantity)
+    ]
+
+
+class QuotePlan:
+    """
+    A bundle revision compiled for quoting: its expanded line items priced once (override, else list price;
+    quantities rounded up and raised to their minimum) and the Addlify payloads they turn into.
+
+    Plans are immutable and shared between sessions through `QuotePlanCache`; `build_quote` combines them with the
+    quote page's edits.
+    """
+    __slots__ = ("bundle_name", "key", "lines", "payloads", "compiled_at")
+
+    def __init__(self, bundle_name, key, lines, compiled_at=None):
+        self.bundle_name = bundle_name
+        self.key = key
+        self.lines = lines
+        self.payloads = tuple(payloads(lines))
+        self.compiled_at = compiled_at or time.time()
+
+    def line_items(self) -> list:
+        """The plan's lines as dicts for the quote page's editor (quantity and price_override as compiled)."""
+        return self.lines.astype(object).where(self.lines.notna(), None).to_dict("records")
+
+
+def compile_plan(bundle_name, key, lines, list_prices=None) -> QuotePlan:
+    """
+    Compiles a bundle's expanded lines into a plan.
+
+    Args:
+        bundle_name (str): The bundle.
+        key: Its `BundleGraph.expansion_key`, kept for invalidation.
+        lines (list): The dicts of `BundleGraph.expand`.
+        list_prices (pd.Series | dict, optional): List price per model id, for lines without a price override.
+
+    Returns:
+        QuotePlan: The plan.
+    """
+    df = pd.DataFrame(list(lines))
+    if df.empty:
+        df = pd.DataFrame(columns=["dependent_model_id", "dependent_group_name", "quantity", "min_quantity",
+                                   "price_override"])
+    df.insert(0, "bundle_name", bundle_name)
+    if list_prices is not None:
+        # kept on the lines, so overrides can be re-priced without the full list (see build_quote)
+        df["list_price"] = df["dependent_model_id"].astype(str).map(pd.Series(list_prices, dtype="float64"))
+    priced = pricing.price_lines(df)
+    # the editor shows these, so what it starts from is what would be sent
+    priced["quantity"] = priced["effective_quantity"].astype(int)
+    priced["price_override"] = priced["price_override"].astype("float64")
+    return QuotePlan(bundle_name, key, priced)
+
+
+def build_quote(plans, edits=None):
+    """
+    The priced lines of a quote from its bundles' plans and the quote page's edits.
+
+    Unedited lines are taken from the plans as compiled; only lines whose quantity or price was changed are priced
+    again, and lines removed in the editor are dropped.
+
+    Args:
+        plans (list): The QuotePlans of the selected bundles, in order.
+        edits (pd.DataFrame, optional): The editor's frame, indexed like the concatenated plan lines, with
+            `quantity` and `price_override` columns.
+
+    Returns:
+        pd.DataFrame: Priced lines as from `pricing.price_lines`, ready for `payloads` or `QuoteJournal.add_lines`.
+    """
+    if not plans:
+        return pricing.price_lines(pd.DataFrame(columns=["dependent_model_id", "quantity", "price_override"]))
+    lines = pd.concat([plan.lines for plan in plans], ignore_index=True)
+    if edits is None:
+        return lines
+    lines = lines.loc[lines.index.intersection(edits.index)]
+    edited = edits.reindex(lines.index)
+    quantity = pd.to_numeric(edited["quantity"], errors="coerce")
+    price = pd.to_numeric(edited["price_override"], errors="coerce").astype("float64")
+    same_price = (price == lines["price_override"]) | (price.isna() & lines["price_override"].isna())
+    changed = (quantity != lines["quantity"]) | ~same_price
+    if changed.any():
+        repriced = pricing.price_lines(lines.loc[changed].assign(quantity=quantity[changed], price_override=price[changed]))
+        lines = lines.copy()
+        lines.loc[changed, repriced.columns] = repriced
+    return lines
+
+
+class QuotePlanCache:
+    """
+    Compiled plans per (expansion key, list prices), least recently used dropped beyond `max_plans`.
+
+    The expansion key holds the bundle's revision and those of the bundles it includes, so a new revision of either
+    simply misses and compiles a new plan; the stale one ages out.
+    """
+
+    def __init__(self, max_plans: int = DEFAULT_MAX_PLANS):
+        self.max_plans = max_plans
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, graph, bundle_name, version=None, list_prices=None, token=None) -> QuotePlan:
+        """
+        The bundle's plan, compiled on a miss.
+
+        Args:
+            graph (BundleGraph): The current bundle graph.
+            bundle_name (str): The bundle.
+            version (int, optional): A specific revision, defaults to the latest active one.
+            list_prices (pd.Series | dict, optional): List price per model id.
+            token (optional): `prices_token(list_prices)`, if the caller already has it.
+
+        Returns:
+            QuotePlan: The plan.
+        """
+        if list_prices is not None and token is None:
+            token = prices_token(list_prices)
+        key = (graph.expansion_key(bundle_name, version), token)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                self.hits += 1
+                return plan
+            self.misses += 1
+        plan = compile_plan(bundle_name, key, graph.expand(bundle_name, version), list_prices)
+        with self._lock:
+            self._plans[key] = plan
+            while len(self._plans) > self.max_plans:
+                self._plans.popitem(last=False)
+        return plan
+
+    def clear(self):
+        """Drops every plan."""
+        with self._lock:
+            self._plans.clear()
+
+    def stats(self) -> dict:
+        """Size and hit counts, for the admin pages."""
+        with self._lock:
+            return {"plans": len(self._plans), "hits": self.hits, "misses": self.misses}
+
+
+# the process-wide cache, shared by every Streamlit session
+QUOTE_PLANS = QuotePlanCache()
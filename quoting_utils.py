@@ -1,24 +1,60 @@
 import streamlit as st
-from addlify import Addlify
+import pricing
+from job_queue import JobQueue
+from lazy_imports import lazy_import
+from quote_journal import QuoteJournal
+from request_recorder import RequestRecorder
+from session_registry import AddlifySessionRegistry
+from single_flight import SINGLE_FLIGHT
 import json
+import os
+
+pd = lazy_import("pandas")
 
 COMPANY_LIST_URL = (
     "https://store.omron.com.au/backend-portal/customers/all-customer-data?cached=true"
 )
 MODELS_JSON_PATH = "model-list-reduced-250904.json"
+# opt-in debugging: keep the last N requests of each Addlify session in a ring buffer (0 = off)
+RECORD_REQUESTS = int(os.environ.get("ADDLIFY_RECORD_REQUESTS", "0"))
+
+def _new_addlify(email, password):
+    """Logs a fresh Addlify session in, with a request recorder if enabled."""
+    # requests/bs4 are only needed once someone logs in
+    from addlify import Addlify
+    recorder = RequestRecorder(capacity=RECORD_REQUESTS) if RECORD_REQUESTS else None
+    return Addlify(email, password, recorder=recorder)
+
+@st.cache_resource
+def get_session_registry():
+    """The process-wide registry of logged in Addlify sessions, shared by every Streamlit session."""
+    return AddlifySessionRegistry(session_factory=_new_addlify)
 
-def login_to_addlify(email, password):
-    """Attempts to log into Addlify and returns an Addlify object."""
+def login_to_addlify(email, password, holder=None):
+    """
+    Attempts to log into Addlify (reusing a live session for this user if there is one) and returns an Addlify object.
+    `holder` is the Streamlit session logging in, see `AddlifySessionRegistry.acquire`.
+    """
     try:
-        adder = Addlify(email, password)
-        if not getattr(adder, "logged_in", False):
+        adder = get_session_registry().acquire(email, password, holder=holder)
+        if adder is None:
             return None, "Login failed. Check credentials."
         return adder, "✅ Logged in"
     except Exception as e:
         return None, f"Login error: {e}"
 
+def logout_of_addlify(email, holder=None):
+    """Lets go of the user's shared Addlify session, closing it if no other Streamlit session uses it."""
+    get_session_registry().release(email, holder=holder)
+
 def fetch_all_companies(adder):
-    """Fetch all customers via the authenticated Addlify session."""
+    """Fetch all customers via the authenticated Addlify session (concurrent calls of one user share one request)."""
+    # what the list holds depends on who asks, and a denied or expired session must only fail its own user, so
+    # only the same user's calls are coalesced (their tabs and a refresh job)
+    key = ("companies", COMPANY_LIST_URL, adder.email.strip().lower())
+    return SINGLE_FLIGHT.do(key, lambda: _fetch_all_companies(adder), share=list)
+
+def _fetch_all_companies(adder):
     resp = adder.get(COMPANY_LIST_URL, headers={"Accept": "application/json"})
     if resp.status_code != 200:
         raise RuntimeError(f"Failed to fetch companies ({resp.status_code}): {resp.text[:200]!r}")
@@ -29,7 +65,10 @@ def fetch_all_companies(adder):
         raise RuntimeError(f"Unexpected JSON structure in companies response: {e}")
 
 def load_models():
-    """Load and flatten your local models JSON file."""
+    """Load and flatten your local models JSON file (concurrent calls share one read)."""
+    return SINGLE_FLIGHT.do(("models", MODELS_JSON_PATH), _load_models, share=list)
+
+def _load_models():
     try:
         with open(MODELS_JSON_PATH, "r") as f:
             data = json.load(f)
@@ -76,8 +115,97 @@ def get_public_quote_url(company_id, quote_id):
     return f"https://store.omron.com.au/backend-portal/customers/companies/{company_id}/quotes/{quote_id}"
 
 def calculate_total_value(line_items):
-    """Calculates the total value of a list of line items."""
-    total = 0
-    for item in line_items:
-        total += item.get('price_override_edited', 0) * item.get('quantity_edited', 0)
-    return total
\ No newline at end of file
+    """Calculates the total value of the edited line items (a list of dicts or a frame), see pricing.price_lines."""
+    priced = pricing.price_lines(line_items, quantity_col='quantity_edited', price_col='price_override_edited')
+    return pricing.summarize(priced)["total"]
+
+# --- Background Jobs ---
+
+def create_quote_job(params, context):
+    """
+    Job: creates a quote and adds its line items, recording each in a QuoteJournal (returned as a dict).
+    Params: company_id, title, expiry_date, contact_id, lines (priced line records), bundle_names, total_value, user_id.
+
+    Once the quote exists the job must not fail, or the user would create it again: if adding its line items can't
+    start, the result is the quote with an "error" (and no lines sent); a failure to log it to the quote log is
+    returned as "log_error".
+    """
+    import bundle_store
+
+    adder = context.resources["adder"]
+    context.progress(0.0, "Creating quote...")
+    quote_id, quote_url = create_new_quote(adder, params["company_id"], params["title"], params["expiry_date"], params["contact_id"])
+    try:
+        sections = get_quote_info(adder, params["company_id"], quote_id).get("sections", [])
+        if not sections:
+            raise RuntimeError("The new quote has no section to add line items to.")
+        journal = QuoteJournal(params["company_id"], quote_id, sections[-1]["id"], quote_url)
+        journal.add_lines(pd.DataFrame(params["lines"]))
+        context.progress(0.1, "Adding line items...")
+        journal.submit(adder, on_line=lambda done, total, line: context.progress(0.1 + 0.9 * done / total, f"Sent {done}/{total} line items"))
+        result = journal.to_dict()
+    except Exception as e:
+        result = {"company_id": params["company_id"], "quote_id": quote_id, "quote_url": quote_url,
+                  "error": f"The quote was created, but its line items couldn't be added: {e}"}
+    try:
+        bundle_store.log_quote(params["user_id"], ", ".join(params["bundle_names"]), params["total_value"], quote_url)
+    except Exception as e:
+        result["log_error"] = str(e)
+    return result
+
+def retry_quote_lines_job(params, context):
+    """Job: re-sends a quote's failed line items. Params: journal (`QuoteJournal.to_dict`). Returns the journal."""
+    journal = QuoteJournal.from_dict(params["journal"])
+    context.progress(0.0, "Re-sending the failed line items to the same quote...")
+    journal.submit(context.resources["adder"], retry=True,
+                   on_line=lambda done, total, line: context.progress(done / total, f"Sent {done}/{total} line items"))
+    return journal.to_dict()
+
+def refresh_companies_job(params, context):
+    """Job: fetches the company list again."""
+    context.progress(0.0, "Fetching companies (this call is slow on the store's side)...")
+    return fetch_all_companies(context.resources["adder"])
+
+def crawl_models_job(params, context):
+    """
+    Job: lists the models of every series and writes them to the models JSON (slug -> models), which `load_models`
+    reads. Only the listed series are replaced, the file's other series are kept. Params: series_map (slug -> series
+    display name), path (defaults to MODELS_JSON_PATH), allow_partial (write the series that were listed even if
+    others failed; by default any failure fails the job and leaves the file as it is).
+    """
+    from addlify import Addlify, series_search_params
+
+    adder = context.resources["adder"]
+    series_map = params["series_map"]
+    listed, failed = {}, []
+    for i, (slug, series_name) in enumerate(series_map.items()):
+        context.progress(i / len(series_map), f"Listing {series_name} ({i + 1}/{len(series_map)})")
+        try:
+            response = adder.get(Addlify.URL_LIST_SERIES_MODELS, params=series_search_params(series_name))
+            response.raise_for_status()
+            listed[slug] = response.json().get("results", [])
+        except Exception as e:
+            failed.append([slug, str(e)])
+    if failed and not (params.get("allow_partial") and listed):
+        raise RuntimeError(f"{len(failed)} of {len(series_map)} series could not be listed, the models JSON was not "
+                           f"changed: " + "; ".join(f"{slug}: {error}" for slug, error in failed))
+    path = params.get("path") or MODELS_JSON_PATH
+    all_data = {}
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            all_data = json.load(f)
+    all_data.update(listed)
+    with open(path + ".tmp", "w") as f:
+        json.dump(all_data, f)
+    os.replace(path + ".tmp", path)
+    return {"path": path, "series": len(listed), "models": sum(len(m) for m in listed.values()), "failed": failed}
+
+@st.cache_resource
+def get_job_queue():
+    """The process-wide background job queue, shared by every Streamlit session."""
+    queue = JobQueue()
+    queue.register("create_quote", create_quote_job)
+    queue.register("retry_quote_lines", retry_quote_lines_job)
+    queue.register("refresh_companies", refresh_companies_job)
+    queue.register("crawl_models", crawl_models_job)
+    return queue
@@ -0,0 +1,83 @@
+import json
+import threading
+import time
+from collections import deque
+
+DEFAULT_CAPACITY = 200
+DEFAULT_MAX_BODY_CHARS = 2000
+
+
+class RequestRecorder:
+    """
+    A bounded, thread-safe ring buffer of recent HTTP requests, for debugging.
+
+    Each record keeps the method, the URL template (so ids don't leak into grouping), status, size, latency
+    and the first `max_body_chars` of the request and response bodies. Once `capacity` records are held the
+    oldest is dropped, so memory stays flat however long the process lives.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, max_body_chars: int = DEFAULT_MAX_BODY_CHARS):
+        self.capacity = capacity
+        self.max_body_chars = max_body_chars
+        self._records = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._total = 0
+
+    def _truncate(self, body):
+        if body is None:
+            return None
+        if isinstance(body, bytes):
+            # only decode what we keep, response bodies can be megabytes of html
+            if len(body) > self.max_body_chars:
+                kept = body[:self.max_body_chars].decode("utf-8", errors="replace")
+                return kept + f"... [{len(body) - self.max_body_chars} bytes truncated]"
+            body = body.decode("utf-8", errors="replace")
+        elif not isinstance(body, str):
+            try:
+                body = json.dumps(body, default=str)
+            except (TypeError, ValueError):
+                body = repr(body)
+        if len(body) > self.max_body_chars:
+            return body[:self.max_body_chars] + f"... [{len(body) - self.max_body_chars} chars truncated]"
+        return body
+
+    def record(self, method: str, url: str, url_template: str, status, nbytes: int, latency: float,
+               request_body=None, response_body=None, error: str = None):
+        """Adds one request to the buffer, truncating the bodies."""
+        entry = {
+            "timestamp": time.time(),
+            "method": method.upper(),
+            "url": url,
+            "url_template": url_template,
+            "status": status,
+            "bytes": nbytes,
+            "latency_ms": round(latency * 1000, 2),
+            "request_body": self._truncate(request_body),
+            "response_body": self._truncate(response_body),
+            "error": error,
+        }
+        with self._lock:
+            self._records.append(entry)
+            self._total += 1
+
+    def last(self):
+        """The most recent record, or None."""
+        with self._lock:
+            return self._records[-1] if self._records else None
+
+    def export(self) -> list:
+        """A copy of the buffered records, oldest first."""
+        with self._lock:
+            return list(self._records)
+
+    def to_json(self, indent: int = 2) -> str:
+        """The buffered records as a JSON string, e.g. for a download button."""
+        return json.dumps({"total_recorded": self._total, "records": self.export()}, indent=indent, default=str)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._records)
@@ -0,0 +1,146 @@
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_SESSIONS = 32
+DEFAULT_IDLE_TIMEOUT = 60 * 60  # seconds a session may sit unused before it is evicted
+
+
+class AddlifySessionRegistry:
+    """
+    A process-wide registry of logged in `Addlify` sessions, keyed by user email.
+
+    Streamlit throws away `st.session_state` on every page reload or new tab, which used to mean a full
+    `URL_LOGIN` POST each time. The registry keeps the authenticated session (cookies and warm connections)
+    so that any Streamlit session presenting the same credentials reuses it until its cookies expire.
+
+    Every Streamlit session (tab) using a session holds it: `acquire` adds the holder and `release` removes it,
+    and the session is only closed once its last holder let go, so logging out in one tab doesn't pull the
+    session from under the user's other tabs. Tabs closed without logging out never release; their sessions
+    go when idle, evicted least-recently-used first. A session is in use as long as it sends requests (its
+    `last_request` time), not just when it was last acquired.
+    """
+
+    def __init__(self, max_sessions: int = DEFAULT_MAX_SESSIONS, idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+                 session_factory=None):
+        if session_factory is None:
+            from addlify import Addlify
+            session_factory = Addlify
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.session_factory = session_factory
+        self._salt = os.urandom(16)
+        self._entries = OrderedDict()  # email -> {"adder", "secret", "last_used", "holders"}
+        self._lock = threading.Lock()
+
+    def _key(self, email: str) -> str:
+        return email.strip().lower()
+
+    def _secret(self, email: str, password: str) -> bytes:
+        # never keep the raw password around just to compare it later
+        return hashlib.pbkdf2_hmac("sha256", f"{self._key(email)}:{password}".encode(), self._salt, 50_000)
+
+    @staticmethod
+    def _cookies_expired(adder) -> bool:
+        now = time.time()
+        return any(c.expires is not None and c.expires <= now for c in adder.cookies)
+
+    @staticmethod
+    def _last_used(entry) -> float:
+        # acquired at login, then used by every request the session sends from tabs and jobs
+        return max(entry["last_used"], getattr(entry["adder"], "last_request", None) or 0.0)
+
+    def _evict_idle(self, now: float):
+        evicted = []
+        by_use = sorted(self._entries, key=lambda k: self._last_used(self._entries[k]))
+        for key in by_use:
+            too_many = len(self._entries) > self.max_sessions
+            if not too_many and now - self._last_used(self._entries[key]) < self.idle_timeout:
+                break
+            evicted.append(self._entries.pop(key)["adder"])
+        return evicted
+
+    def acquire(self, email: str, password: str, holder=None):
+        """
+        Returns a logged in `Addlify` for the user, reusing an existing session where possible.
+
+        Args:
+            email (str): The Addlify login email, used as the registry key.
+            password (str): The password, checked against the one the cached session was created with.
+            holder (str, optional): Who will use the session, e.g. the Streamlit session id; pass the same to
+                `release` when done.
+
+        Returns:
+            Addlify: The logged in session, or None if the login failed.
+        """
+        key = self._key(email)
+        secret = self._secret(email, password)
+        now = time.time()
+        with self._lock:
+            evicted = self._evict_idle(now)
+            entry = self._entries.get(key)
+            if entry and hmac.compare_digest(entry["secret"], secret):
+                adder = entry["adder"]
+                if adder.logged_in and not self._cookies_expired(adder):
+                    entry["last_used"] = now
+                    if holder is not None:
+                        entry["holders"].add(holder)
+                    self._entries.move_to_end(key)
+                    reused = True
+                else:
+                    reused = False
+            else:
+                reused = False
+        for stale in evicted:
+            stale.close()
+        if reused:
+            return adder
+
+        # log in outside the lock, this is the slow part
+        adder = self.session_factory(email, password)
+        if not getattr(adder, "logged_in", False):
+            adder.close()
+            return None
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            # the tabs holding the session this one replaces (cookies expired) carry on with the new one
+            holders = previous["holders"] if previous else set()
+            if holder is not None:
+                holders.add(holder)
+            self._entries[key] = {"adder": adder, "secret": secret, "last_used": time.time(), "holders": holders}
+            evicted = self._evict_idle(time.time())
+        if previous and previous["adder"] is not adder:
+            previous["adder"].close()
+        for stale in evicted:
+            stale.close()
+        return adder
+
+    def release(self, email: str, holder=None):
+        """
+        Lets go of the user's session for `holder`, e.g. on logout. The session is dropped (and closed) once
+        nobody holds it any more.
+        """
+        key = self._key(email)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry["holders"].discard(holder)
+            if entry["holders"]:
+                return
+            del self._entries[key]
+        entry["adder"].close()
+
+    def stats(self) -> dict:
+        """A small summary of the registry, handy for the admin pages."""
+        now = time.time()
+        with self._lock:
+            return {
+                "sessions": len(self._entries),
+                "max_sessions": self.max_sessions,
+                "idle_seconds": {k: round(now - self._last_used(e), 1) for k, e in self._entries.items()},
+                "holders": {k: len(e["holders"]) for k, e in self._entries.items()},
+            }
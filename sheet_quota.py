@@ -0,0 +1,193 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from instrumentation import METRICS
+
+# Sheets API allows 60 read and 60 write requests per minute per user (the service account is one user) by default;
+# set these to what the project's quota page says, 0 for no limit
+DEFAULT_BUDGETS = {
+    "read": int(os.environ.get("BUNDLE_QUOTER_SHEET_READS_PER_MINUTE", "60")),
+    "write": int(os.environ.get("BUNDLE_QUOTER_SHEET_WRITES_PER_MINUTE", "60")),
+}
+BURST_FRACTION = 0.25  # of a minute's budget that may go out at once
+ANALYTICS_RESERVE = 0.5  # of the burst analytics reads leave untouched, so user actions never queue behind them
+QUOTA_RETRIES = 5
+QUOTA_BACKOFF = 1.0  # seconds before the first retry after a quota error, doubled (with jitter) after each further one
+QUOTA_MAX_BACKOFF = 32.0
+
+# priorities, most urgent first
+WRITE = 0  # writes and the reads of a read-modify-write
+INTERACTIVE = 1  # what a page needs to render, the default
+ANALYTICS = 2  # log and export pages, index rebuilds
+PRIORITY_NAMES = {WRITE: "write", INTERACTIVE: "interactive", ANALYTICS: "analytics"}
+
+
+def is_quota_error(error) -> bool:
+    """Whether an exception from gspread / the connection is the API's 429 rate limit answer."""
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        return True
+    # not a bare "429", which a row number, an id or a range like A429 in any other error would match
+    text = str(error)
+    return "RESOURCE_EXHAUSTED" in text or "Quota exceeded" in text
+
+
+class _Bucket:
+    __slots__ = ("per_minute", "capacity", "tokens", "updated", "blocked_until", "waiting", "used", "recent",
+                 "throttled", "quota_errors")
+
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self.capacity = max(1.0, per_minute * BURST_FRACTION)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # set after a quota error, nothing goes out before it
+        self.waiting = [0] * len(PRIORITY_NAMES)
+        self.used = 0
+        self.recent = deque()  # monotonic times of the requests of the last minute
+        self.throttled = 0
+        self.quota_errors = 0
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.per_minute / 60.0)
+        self.updated = now
+
+
+class SheetQuota:
+    """
+    Client-side rate limiting of Google Sheets API requests, so a busy server stays under the per-minute quota
+    instead of running into 429s.
+
+    Each operation ("read", "write") has a token bucket holding a quarter of its per-minute budget and refilling at
+    the budget's rate; a request takes a token, or waits until one is there. Waiters go in priority order: writes
+    (and the reads a write depends on) first, then page reads, then analytics reads, which also leave half the burst
+    alone so they can't starve the others. The priority is set per thread with `priority(...)`.
+
+    A quota error anyway (other processes share the quota) pauses that operation for everyone with an exponential
+    backoff and retries. Every request is reported to METRICS as "sheet_quota_wait"; `stats` has the totals.
+    """
+
+    def __init__(self, budgets: dict = None):
+        self._buckets = {op: _Bucket(per_minute) for op, per_minute in (budgets or DEFAULT_BUDGETS).items()}
+        self._cond = threading.Condition()
+        self._local = threading.local()
+
+    def configure(self, budgets: dict):
+        """Replaces the per-minute budgets (operation -> requests, 0 for no limit), resetting the counts."""
+        with self._cond:
+            self._buckets = {op: _Bucket(per_minute) for op, per_minute in budgets.items()}
+            self._cond.notify_all()
+
+    @contextmanager
+    def priority(self, level: int):
+        """Runs the block's Sheets requests (on this thread) at `level`, e.g. `with SHEET_QUOTA.priority(WRITE):`."""
+        previous = getattr(self._local, "priority", INTERACTIVE)
+        self._local.priority = level
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def current_priority(self) -> int:
+        """The priority requests from this thread get."""
+        return getattr(self._local, "priority", INTERACTIVE)
+
+    def acquire(self, operation: str, cost: int = 1) -> float:
+        """Takes `cost` tokens for `operation`, waiting for them as long as needed. Returns the seconds waited."""
+        level = self.current_priority()
+        started = time.monotonic()
+        with self._cond:
+            bucket = self._buckets[operation]
+            cost = min(cost, bucket.capacity)
+            reserve = bucket.capacity * ANALYTICS_RESERVE if level == ANALYTICS else 0.0
+            bucket.waiting[level] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    bucket.refill(now)
+                    if bucket.per_minute <= 0:
+                        break
+                    ahead = any(bucket.waiting[:level])
+                    if not ahead and now >= bucket.blocked_until and bucket.tokens - cost >= reserve:
+                        break
+                    if now >= bucket.blocked_until:
+                        delay = max(cost + reserve - bucket.tokens, 0.0) * 60.0 / bucket.per_minute
+                    else:
+                        delay = bucket.blocked_until - now
+                    # woken early when someone ahead of us is served
+                    self._cond.wait(max(delay, 0.01))
+                if bucket.per_minute > 0:
+                    bucket.tokens -= cost
+                bucket.used += cost
+                bucket.recent.extend([now] * int(cost))
+                while bucket.recent and bucket.recent[0] < now - 60.0:
+                    bucket.recent.popleft()
+                waited = now - started
+                if waited > 0.001:
+                    bucket.throttled += 1
+            finally:
+                bucket.waiting[level] -= 1
+                self._cond.notify_all()
+        METRICS.observe("sheet_quota_wait", waited, operation=operation, priority=PRIORITY_NAMES[level])
+        return waited
+
+    def _backoff(self, operation, seconds):
+        with self._cond:
+            bucket = self._buckets[operation]
+            bucket.quota_errors += 1
+            bucket.tokens = 0.0
+            bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def run(self, operation: str, fn, cost: int = 1, **labels):
+        """
+        Calls `fn()` once the quota allows it, retrying with backoff while it fails with a quota error.
+
+        Args:
+            operation (str): "read" or "write".
+            fn (callable): Makes the request(s).
+            cost (int): How many API requests `fn` makes.
+            **labels: Extra labels for the "sheet_quota_error" metric, e.g. worksheet.
+
+        Returns:
+            What `fn` returns.
+        """
+        for attempt in range(QUOTA_RETRIES + 1):
+            self.acquire(operation, cost)
+            try:
+                return fn()
+            except Exception as e:
+                if not is_quota_error(e) or attempt == QUOTA_RETRIES:
+                    raise
+                delay = min(QUOTA_MAX_BACKOFF, QUOTA_BACKOFF * 2 ** attempt) * random.uniform(0.5, 1.5)
+                METRICS.observe("sheet_quota_error", delay, operation=operation, **labels)
+                self._backoff(operation, delay)
+
+    def stats(self) -> list:
+        """Per operation: budget, requests in the last minute and in total, tokens left, throttles and quota errors."""
+        rows = []
+        with self._cond:
+            now = time.monotonic()
+            for operation, bucket in self._buckets.items():
+                bucket.refill(now)
+                while bucket.recent and bucket.recent[0] < now - 60.0:
+                    bucket.recent.popleft()
+                rows.append({
+                    "operation": operation,
+                    "budget_per_minute": bucket.per_minute,
+                    "last_minute": len(bucket.recent),
+                    "total": bucket.used,
+                    "tokens": round(bucket.tokens, 1),
+                    "throttled": bucket.throttled,
+                    "quota_errors": bucket.quota_errors,
+                    "paused_for": round(max(bucket.blocked_until - now, 0.0), 1),
+                })
+        return rows
+
+
+# the process-wide limiter, shared by every Streamlit session
+SHEET_QUOTA = SheetQuota()
@@ -0,0 +1,259 @@
+import hashlib
+import threading
+import time
+
+from instrumentation import METRICS
+from lazy_imports import lazy_import
+from sheet_quota import SHEET_QUOTA
+
+pd = lazy_import("pandas")
+
+DEFAULT_PROBE_INTERVAL = 2.0  # seconds a snapshot is trusted without asking the sheet
+DEFAULT_FULL_REFRESH_INTERVAL = 300.0  # safety net: re-download everything at least this often
+# render cells the way the connection's full read (gspread_dataframe, evaluating formulas) does, so appended rows
+# parse exactly like a reload: raw numbers rather than their display format, dates as their formatted text
+RENDER_OPTIONS = {"value_render_option": "UNFORMATTED_VALUE", "date_time_render_option": "FORMATTED_STRING"}
+
+
+def _column_letter(n: int) -> str:
+    """1 -> A, 27 -> AA."""
+    letters = ""
+    while n:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _gspread_worksheet(conn, worksheet_name):
+    """The underlying gspread worksheet, or None if the connection can't give us one (e.g. a public sheet url)."""
+    client = getattr(conn, "client", None)
+    select = getattr(client, "_select_worksheet", None)
+    if select is None:
+        return None
+    try:
+        return select(worksheet=worksheet_name)
+    except Exception:
+        return None
+
+
+def _first_column(ws):
+    """The worksheet's first column, header included, rendered like the full read."""
+    # col_values can't be given the date/time render option, a one column range can
+    return [row[0] if row else "" for row in ws.get_values("A:A", **RENDER_OPTIONS)]
+
+
+def _frame_hash(frame):
+    # for connections we can't probe, the revision has to come from the content itself
+    return int(pd.util.hash_pandas_object(frame, index=False).sum()) if not frame.empty else 0
+
+
+def append_rows(frame, rows):
+    """
+    `frame` with `rows` appended, as a new frame with a fresh index.
+
+    Empty frames are left out and a column that is all NA on one side takes the other side's dtype first, so the
+    result has the dtypes pandas has always given; concatenating them as they are is deprecated and will change.
+    """
+    columns = list(dict.fromkeys([*frame.columns, *rows.columns]))
+    if rows.empty:
+        return frame.reindex(columns=columns).reset_index(drop=True)
+    if frame.empty:
+        return rows.reindex(columns=columns).reset_index(drop=True)
+    frame, rows = frame.reindex(columns=columns), rows.reindex(columns=columns)
+    for column in columns:
+        top_na, bottom_na = frame[column].isna().all(), rows[column].isna().all()
+        try:
+            if top_na and not bottom_na:
+                frame[column] = frame[column].astype(rows[column].dtype)
+            elif bottom_na and not top_na:
+                rows[column] = rows[column].astype(frame[column].dtype)
+        except (TypeError, ValueError):
+            pass  # e.g. NA into an integer column, pandas picks the dtype
+    return pd.concat([frame, rows], ignore_index=True)
+
+
+class _Snapshot:
+    __slots__ = ("conn", "frame", "row_count", "column_hash", "probed_at", "loaded_at", "derived")
+
+    def __init__(self, conn, frame):
+        self.conn = conn
+        self.frame = frame
+        self.derived = {}  # key -> a value computed from `frame`, dropped with the snapshot
+        self.row_count = len(frame)
+        self.column_hash = _column_hash(_first_column_of(frame))
+        self.probed_at = self.loaded_at = time.time()
+
+
+def _first_column_of(frame):
+    # the first column (bundle_id / timestamp), the one the sheet is probed for
+    return [] if frame.columns.empty else frame.iloc[:, 0].tolist()
+
+
+def _column_hash(values):
+    # a digest of a column's cells, the same for a parsed frame and the probed column (see _cell_key), so a rewrite
+    # anywhere in it shows, not just one of its last row
+    digest = hashlib.blake2b(digest_size=16)
+    for value in values:
+        digest.update((_cell_key(value) or "").encode())
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+def _cell_key(value):
+    # a cell as text, the same whether it came from a parsed frame (5.0, NaN) or straight from the sheet (5, "")
+    if isinstance(value, str):
+        return value or None
+    if value is None or pd.isna(value):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+class IncrementalSheetSync:
+    """
+    Keeps a local snapshot of append-only worksheets and only downloads the rows added since the last read.
+
+    The change marker is the number of data rows plus a digest of the first column. A read first probes the sheet's
+    first column (one narrow request). If nothing was appended the snapshot is returned as is; if rows were appended
+    only those are fetched and merged in. Anything that isn't a clean append - fewer rows, any different value in
+    the rows we know about, a connection we can't probe - falls back to a full read. Every writer here appends or
+    removes rows, which always shows in the first column; an edit of another column by hand in the sheet only
+    shows at the next full refresh.
+
+    Writes made through this process call `record_write`, so they never need a re-read.
+    """
+
+    def __init__(self, probe_interval: float = DEFAULT_PROBE_INTERVAL,
+                 full_refresh_interval: float = DEFAULT_FULL_REFRESH_INTERVAL):
+        self.probe_interval = probe_interval
+        self.full_refresh_interval = full_refresh_interval
+        self._snapshots = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _worksheet_lock(self, worksheet_name):
+        with self._lock:
+            return self._locks.setdefault(worksheet_name, threading.Lock())
+
+    def read(self, conn, worksheet_name, full_read, max_age=None):
+        """
+        Returns the worksheet as a DataFrame (a copy, safe to modify).
+
+        Args:
+            conn: The sheets connection.
+            worksheet_name (str): The worksheet to read.
+            full_read (callable): `full_read(conn, worksheet_name)` downloads the whole worksheet.
+            max_age (float, optional): Probe the sheet if the snapshot was last checked longer ago than this
+                (defaults to `probe_interval`). Pass 0 before a read-modify-write.
+        """
+        with self._worksheet_lock(worksheet_name):
+            return self._current(conn, worksheet_name, full_read, max_age).frame.copy()
+
+    def read_derived(self, conn, worksheet_name, full_read, key, derive, max_age=None, copy=True):
+        """
+        Like `read`, but returns `derive(frame)` (a copy of it), computed once per snapshot and reused until the
+        worksheet changes. `key` names the derived value, e.g. "typed". Pass `copy=False` for values that are
+        immutable or do their own locking.
+        """
+        with self._worksheet_lock(worksheet_name):
+            snapshot = self._current(conn, worksheet_name, full_read, max_age)
+            if key not in snapshot.derived:
+                snapshot.derived[key] = derive(snapshot.frame)
+            value = snapshot.derived[key]
+        return value.copy() if copy else value
+
+    def _current(self, conn, worksheet_name, full_read, max_age):
+        max_age = self.probe_interval if max_age is None else max_age
+        snapshot = self._snapshots.get(worksheet_name)
+        now = time.time()
+        if (snapshot is None or snapshot.conn is not conn
+                or now - snapshot.loaded_at > self.full_refresh_interval):
+            snapshot = self._full(conn, worksheet_name, full_read)
+        elif now - snapshot.probed_at >= max_age:
+            snapshot = self._catch_up(conn, worksheet_name, snapshot, full_read)
+        return snapshot
+
+    def revision(self, conn, worksheet_name, full_read):
+        """
+        The worksheet's current revision marker, straight from the sheet. Compare it with `revision_of` a frame to
+        tell whether the sheet still holds that frame's rows (its row count and whole first column). It costs one
+        narrow probe where the connection allows it, a full read otherwise.
+        """
+        ws = _gspread_worksheet(conn, worksheet_name)
+        if ws is None:
+            frame = full_read(conn, worksheet_name)
+            return (len(frame), _frame_hash(frame))
+        with METRICS.timer("sheet_probe", worksheet=worksheet_name) as extra:
+            first_column = SHEET_QUOTA.run("read", lambda: _first_column(ws), worksheet=worksheet_name)
+            extra["rows"] = len(first_column)
+        row_count = max(len(first_column) - 1, 0)
+        return (row_count, _column_hash(first_column[1:]))
+
+    def revision_of(self, conn, worksheet_name, frame):
+        """The revision marker the sheet would have if it held exactly `frame`, see `revision`."""
+        if _gspread_worksheet(conn, worksheet_name) is None:
+            return (len(frame), _frame_hash(frame))
+        return (len(frame), _column_hash(_first_column_of(frame)))
+
+    def record_write(self, conn, worksheet_name, frame):
+        """Makes `frame` (just written to the sheet in full) the current snapshot."""
+        with self._worksheet_lock(worksheet_name):
+            self._snapshots[worksheet_name] = _Snapshot(conn, frame.reset_index(drop=True).copy())
+
+    def invalidate(self, worksheet_name=None):
+        """Forgets one snapshot (or all), so the next read downloads the whole worksheet."""
+        with self._lock:
+            if worksheet_name is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(worksheet_name, None)
+
+    def _full(self, conn, worksheet_name, full_read):
+        snapshot = _Snapshot(conn, full_read(conn, worksheet_name).reset_index(drop=True))
+        self._snapshots[worksheet_name] = snapshot
+        return snapshot
+
+    def _catch_up(self, conn, worksheet_name, snapshot, full_read):
+        ws = _gspread_worksheet(conn, worksheet_name)
+        if ws is None or snapshot.frame.columns.empty:
+            return self._full(conn, worksheet_name, full_read)
+
+        with METRICS.timer("sheet_probe", worksheet=worksheet_name) as extra:
+            first_column = SHEET_QUOTA.run("read", lambda: _first_column(ws), worksheet=worksheet_name)
+            extra["rows"] = len(first_column)
+        row_count = max(len(first_column) - 1, 0)  # minus the header
+        known = _column_hash(first_column[1:snapshot.row_count + 1])
+        if row_count < snapshot.row_count or known != snapshot.column_hash:
+            # rows were removed or rewritten, not just appended
+            return self._full(conn, worksheet_name, full_read)
+
+        if row_count > snapshot.row_count:
+            columns = list(snapshot.frame.columns)
+            # sheet row 1 is the header, so data row i lives on sheet row i + 2
+            first_new_row = snapshot.row_count + 2
+            a1_range = f"A{first_new_row}:{_column_letter(len(columns))}{row_count + 1}"
+            with METRICS.timer("sheet_read_tail", worksheet=worksheet_name) as extra:
+                values = SHEET_QUOTA.run("read", lambda: ws.get_values(a1_range, **RENDER_OPTIONS),
+                                          worksheet=worksheet_name)
+                extra["rows"] = len(values)
+            new_rows = self._parse(values, columns)
+            frame = append_rows(snapshot.frame, new_rows)
+            snapshot = _Snapshot(conn, frame)
+            self._snapshots[worksheet_name] = snapshot
+        snapshot.probed_at = time.time()
+        return snapshot
+
+    @staticmethod
+    def _parse(values, columns):
+        # parse the cell values the same way the connection's read does (pandas' TextParser)
+        width = len(columns)
+        rows = [(list(r) + [""] * width)[:width] for r in values]
+        if not rows:
+            return pd.DataFrame(columns=columns)
+        from pandas.io.parsers import TextParser
+        return TextParser(rows, header=None, names=columns).read()
+
+
+# the process-wide instance, shared by every Streamlit session
+SHEET_SYNC = IncrementalSheetSync()
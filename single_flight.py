@@ -0,0 +1,87 @@
+import threading
+import time
+
+from instrumentation import METRICS
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: while a call for a key is in flight, further calls for that key wait for
+    it and get its result (or its exception) instead of making their own.
+
+    Nothing is cached - a call that starts after the previous one finished fetches again - so this only removes the
+    thundering herd when many sessions ask for the same thing at once (everyone logging in at nine, every page
+    rerun reading the same worksheet), it never serves stale data.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, fn, share=None):
+        """
+        Runs `fn()`, or waits for the identical call already in flight.
+
+        Args:
+            key (tuple): Identifies the call; its first item names it in the metrics, e.g. ("sheet_read", "bundles").
+            fn (callable): Makes the call.
+            share (callable, optional): Applied to the result for every caller but the one that made the call, e.g.
+                `lambda df: df.copy()` for results the callers may modify.
+
+        Returns:
+            The result of `fn()`.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                call.waiters += 1
+                self.shared += 1
+        if not leader:
+            started = time.perf_counter()
+            call.done.wait()
+            METRICS.observe("single_flight_shared", time.perf_counter() - started, error=call.error is not None,
+                            call=key[0])
+            if call.error is not None:
+                raise call.error
+            return share(call.result) if share is not None else call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self) -> int:
+        """The number of calls currently running."""
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> dict:
+        """Calls made and calls that shared another's result, for the admin pages."""
+        with self._lock:
+            return {"calls": self.calls, "shared": self.shared, "in_flight": len(self._calls)}
+
+
+# the process-wide instance, shared by every Streamlit session
+SINGLE_FLIGHT = SingleFlight()
@@ -0,0 +1,87 @@
+import json
+import threading
+import time
+
+import pytest
+
+from addlify import Addlify
+from fake_backends import FakeAddlifyServer
+from request_recorder import RequestRecorder
+
+PASSWORD = "SECRETPW"
+
+
+@pytest.fixture
+def store():
+    with FakeAddlifyServer(n_companies=3) as server:
+        yield server
+
+
+def test_recorder_never_keeps_the_password(store):
+    recorder = RequestRecorder()
+    adder = Addlify("bench@example.com", PASSWORD, recorder=recorder, base_url=store.url)
+    assert adder.logged_in
+    adder.get(Addlify.URL_LIST_CUSTOMERS)
+    adder.login("bench@example.com", PASSWORD)
+
+    records = recorder.export()
+    assert [r["url_template"] for r in records].count(Addlify.URL_LOGIN) == 2
+    assert PASSWORD not in json.dumps(records)
+
+
+def test_bodies_with_a_password_are_dropped_on_any_endpoint(store):
+    recorder = RequestRecorder()
+    adder = Addlify("bench@example.com", PASSWORD, recorder=recorder, base_url=store.url)
+    adder.post(Addlify.URL_ACCEPT_CONTACT_INVITE, json={"email": "c@example.com", "Password": PASSWORD})
+    adder.post(Addlify.URL_NEW_CUSTOMER, json={"name": "Acme"})
+
+    records = recorder.export()
+    assert PASSWORD not in json.dumps(records)
+    assert records[-1]["request_body"] == json.dumps({"name": "Acme"})
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.history = []
+        self.url = ""
+
+
+def test_an_expiry_noticed_at_once_logs_in_once(store):
+    adder = Addlify("bench@example.com", PASSWORD, base_url=store.url)
+    fresh, logins = threading.Event(), []
+
+    def login(*args):
+        logins.append(1)
+        time.sleep(0.05)
+        ok = Addlify.login(adder, *args)
+        fresh.set()
+        return ok
+
+    send = adder._send
+
+    def expired_send(method, url, *args, **kwargs):
+        if url == Addlify.URL_LOGIN:
+            return send(method, url, *args, **kwargs)
+        return Response(200 if fresh.is_set() else 401)
+
+    adder.login = login
+    adder._send = expired_send
+    responses = []
+    threads = [threading.Thread(target=lambda: responses.append(adder.get(Addlify.URL_LIST_CUSTOMERS)))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(logins) == 1
+    assert [r.status_code for r in responses] == [200] * 8
+
+
+def test_a_forbidden_request_is_not_an_expiry(store):
+    adder = Addlify("bench@example.com", PASSWORD, base_url=store.url)
+    logins = []
+    adder.login = lambda *args: logins.append(1)
+    adder._send = lambda method, url, *args, **kwargs: Response(403)
+    assert adder.get(Addlify.URL_LIST_CUSTOMERS).status_code == 403
+    assert not logins
@@ -0,0 +1,68 @@
+import pandas as pd
+import pytest
+
+from bundle_graph import BUNDLE_REFERENCE, BundleCycleError, BundleGraph
+
+
+def row(bundle, parent, model, quantity=1, mapping="Objective", version=1, status="active"):
+    return {"bundle_id": f"id-{bundle}", "bundle_name": bundle, "bundle_version": version, "status": status,
+            "parent_model_id": parent, "dependent_model_id": model, "dependent_group_name": model,
+            "mapping_type": "root" if parent is None else mapping, "multiple": 1, "quantity": quantity,
+            "min_quantity": 1, "price_override": None}
+
+
+def include(bundle, name, quantity=1):
+    return dict(row(bundle, None, None, quantity), mapping_type=BUNDLE_REFERENCE, dependent_group_name=name)
+
+
+def quantities(lines):
+    return {line["dependent_model_id"]: line["quantity"] for line in lines}
+
+
+def test_dependents_multiply_down_the_tree():
+    graph = BundleGraph(pd.DataFrame([
+        row("Kit", None, "HEAD"),
+        row("Kit", "HEAD", "CABLE", quantity=2),
+        row("Kit", "CABLE", "CLIP", quantity=3),
+    ]))
+    assert quantities(graph.expand("Kit")) == {"HEAD": 1, "CABLE": 2, "CLIP": 6}
+
+
+def test_parent_model_listed_as_a_dependent_is_not_a_cycle():
+    graph = BundleGraph(pd.DataFrame([
+        row("Flat", None, "HEAD"),
+        row("Flat", "HEAD", "HEAD", quantity=2),
+        row("Flat", "HEAD", "CABLE"),
+    ]))
+    assert quantities(graph.expand("Flat")) == {"HEAD": 3, "CABLE": 1}
+    graph.check("Flat", [row("Flat", None, "HEAD"), row("Flat", "HEAD", "HEAD", quantity=2)])
+
+
+def test_model_loop_without_a_root_expands_as_plain_lines():
+    graph = BundleGraph(pd.DataFrame([
+        row("Loop", "A", "B", quantity=2),
+        row("Loop", "B", "A", quantity=3),
+    ]))
+    assert quantities(graph.expand("Loop")) == {"B": 2, "A": 3}
+
+
+def test_included_bundles_are_scaled():
+    graph = BundleGraph(pd.DataFrame([
+        row("Inner", None, "SENSOR"),
+        row("Inner", "SENSOR", "CABLE", quantity=2),
+        row("Outer", None, "PLC"),
+        include("Outer", "Inner", quantity=2),
+    ]))
+    assert quantities(graph.expand("Outer")) == {"PLC": 1, "SENSOR": 2, "CABLE": 4}
+    assert graph.includes("Outer") == {"Inner"}
+
+
+def test_bundle_including_itself_is_a_cycle():
+    graph = BundleGraph(pd.DataFrame([
+        row("A", None, "X"), include("A", "B"),
+        row("B", None, "Y"), include("B", "A"),
+    ]))
+    with pytest.raises(BundleCycleError):
+        graph.expand("A")
+    with pytest.raises(BundleCycleError):
+        graph.check("C", [include("C", "C")])
@@ -0,0 +1,77 @@
+import pytest
+
+import bundle_store
+from fake_backends import FakeGSheetsConnection, fake_bundle_rows
+from sheet_quota import SHEET_QUOTA
+from sheet_sync import SHEET_SYNC
+
+
+def items(root, dependents):
+    rows = [{"parent_model_id": None, "parent_group_name": "root", "dependent_model_id": root,
+             "dependent_group_name": root, "mapping_type": "root", "multiple": 1, "quantity": 1, "min_quantity": 1}]
+    for model in dependents:
+        rows.append({"parent_model_id": root, "parent_group_name": root, "dependent_model_id": model,
+                     "dependent_group_name": model, "mapping_type": "Objective", "multiple": 1, "quantity": 2,
+                     "min_quantity": 1})
+    return rows
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    SHEET_QUOTA.configure({"read": 0, "write": 0})
+    SHEET_SYNC.invalidate()
+    monkeypatch.setattr(bundle_store, "_archive_exists", set())
+    monkeypatch.setattr(bundle_store, "CAS_BACKOFF", 0)
+    conn = FakeGSheetsConnection({"bundles": fake_bundle_rows(10, rows_per_bundle=5)})
+    bundle_store.use_connection(conn)
+    yield conn
+    bundle_store.use_connection(None)
+    SHEET_SYNC.invalidate()
+
+
+def test_save_creates_a_missing_archive(conn):
+    _, version = bundle_store.save_bundle("New bundle", items("m-1", ["m-2"]), "a@example.com")
+    assert version == 1
+    assert list(conn.worksheets[bundle_store.ARCHIVE_WORKSHEET].columns)[:3] == ["bundle_id", "bundle_name",
+                                                                                 "bundle_version"]
+    _, version = bundle_store.save_bundle("New bundle", items("m-1", ["m-3"]), "a@example.com")
+    assert version == 2
+
+
+def test_compaction_creates_a_missing_archive(conn):
+    bundle_store.save_bundle("Bundle 0", items("m-1", ["m-2"]), "user0@example.com")
+    assert bundle_store.compact_bundles() == 5
+    archive = conn.worksheets[bundle_store.ARCHIVE_WORKSHEET]
+    assert set(archive["bundle_version"]) == {1}
+    # the next revision still counts the archived ones
+    _, version = bundle_store.save_bundle("Bundle 0", items("m-1", ["m-3"]), "user0@example.com")
+    assert version == 3
+
+
+def test_archive_is_read_once_per_save_across_retries(conn, monkeypatch):
+    reads = []
+    read_archive = bundle_store._read_archive
+    monkeypatch.setattr(bundle_store, "_read_archive", lambda c: reads.append(1) or read_archive(c))
+
+    revision = SHEET_SYNC.revision
+    calls = []
+
+    def flaky_revision(*args):
+        calls.append(1)
+        return ("someone else wrote",) if len(calls) == 1 else revision(*args)
+
+    monkeypatch.setattr(SHEET_SYNC, "revision", flaky_revision)
+    _, version = bundle_store.save_bundle("Bundle 1", items("m-1", ["m-2"]), "user1@example.com")
+    assert version == 2
+    assert len(calls) > 2, "expected the first attempt to be retried"
+    assert len(reads) == 1
+
+
+def test_compacted_away_bundle_rereads_the_archive(conn):
+    next_version = bundle_store._version_allocator(conn, "Bundle 0")
+    hot = conn.read(worksheet="bundles")
+    assert next_version(hot) == 2
+    # a compaction moves the (deprecated) bundle out of the hot sheet between two attempts
+    archived = hot[hot["bundle_name"] == "Bundle 0"].assign(archived_at="2025-01-02T00:00:00")
+    conn.update(worksheet=bundle_store.ARCHIVE_WORKSHEET, data=archived)
+    assert next_version(hot[hot["bundle_name"] != "Bundle 0"]) == 2
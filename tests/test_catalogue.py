@@ -0,0 +1,56 @@
+import gc
+import time
+
+from catalogue import CatalogueRegistry, SessionJanitor
+
+
+def test_identical_data_publishes_as_the_same_version():
+    registry = CatalogueRegistry()
+    first = registry.publish("companies", [{"customerId": "c1"}])
+    assert registry.publish("companies", [{"customerId": "c1"}]) is first
+    second = registry.publish("companies", [{"customerId": "c1"}, {"customerId": "c2"}])
+    assert (first.version, second.version) == (1, 2)
+    assert registry.get("companies", 1) is first
+    assert registry.get("companies") is second
+    assert registry.get("models") is None
+
+
+def test_dropped_versions_are_not_swapped_for_the_latest():
+    registry = CatalogueRegistry(keep_versions=2)
+    for n in range(1, 4):
+        registry.publish("models", list(range(n)))
+    assert [row["version"] for row in registry.stats()] == [2, 3]
+    assert registry.get("models", 1) is None
+    assert registry.get("models").version == 3
+
+
+def test_derived_values_are_built_once_per_version():
+    catalogue = CatalogueRegistry().publish("companies", ["b", "a"])
+    builds = []
+    build = lambda data: builds.append(1) or sorted(data)
+    assert catalogue.derived("sorted", build) == ["a", "b"]
+    assert catalogue.derived("sorted", build) is catalogue.derived("sorted", build)
+    assert len(builds) == 1
+
+
+class State(dict):
+    pass  # weakly referenceable, like Streamlit's session state
+
+
+def test_idle_sessions_keep_the_users_edits():
+    janitor = SessionJanitor(idle_timeout=0.05)
+    idle = State(contacts_by_company={}, quote_plans=[], user_id="a", quote_line_items_edited="edits",
+                 quote_journal="journal", quote_update="update")
+    active = State(contacts_by_company={})
+    janitor.touch("idle", idle)
+    time.sleep(0.1)
+    janitor.touch("active", active)
+    assert janitor.sweep() == 1
+    assert idle == {"user_id": "a", "quote_line_items_edited": "edits", "quote_journal": "journal",
+                    "quote_update": "update"}
+    assert active == {"contacts_by_company": {}}
+
+    del active
+    gc.collect()
+    janitor.sweep()
+    assert janitor.stats()["sessions"] == 0
@@ -0,0 +1,51 @@
+import pandas as pd
+
+from company_search import CompanyIndex, recent_company_ids
+
+COMPANIES = [
+    {"customerId": "c1", "displayName": "Omron Electronics Pty Ltd", "amplifyId": "OMR001"},
+    {"customerId": "c2", "displayName": "Acme Automation (Omron reseller)", "amplifyId": "ACM002"},
+    {"customerId": "c3", "displayName": "Café Bar Pty Ltd", "amplifyId": "CAF003"},
+    {"customerId": "c4", "displayName": "Brisbane Packaging", "amplifyId": "BRI004"},
+]
+
+
+def names(index, query, **kwargs):
+    return [index.companies[i]["displayName"] for i in index.search(query, **kwargs)]
+
+
+def test_every_token_must_prefix_a_name_token():
+    index = CompanyIndex(COMPANIES)
+    assert names(index, "omr ele") == ["Omron Electronics Pty Ltd"]
+    assert names(index, "cafe") == ["Café Bar Pty Ltd"]
+    assert names(index, "bri004") == ["Brisbane Packaging"]
+    assert names(index, "omron packaging") == []
+
+
+def test_leading_name_token_ranks_first():
+    assert names(CompanyIndex(COMPANIES), "omron") == ["Omron Electronics Pty Ltd", "Acme Automation (Omron reseller)"]
+
+
+def test_common_tokens_never_match_on_their_own():
+    index = CompanyIndex(COMPANIES)
+    assert names(index, "pty cafe") == ["Café Bar Pty Ltd"]
+    assert set(names(index, "pty")) == {"Omron Electronics Pty Ltd", "Café Bar Pty Ltd"}
+
+
+def test_typos_match_fuzzily():
+    assert names(CompanyIndex(COMPANIES), "brisbnae") == ["Brisbane Packaging"]
+
+
+def test_recent_companies_come_first():
+    index = CompanyIndex(COMPANIES)
+    assert names(index, "omron", recent=["c2"])[0] == "Acme Automation (Omron reseller)"
+    assert names(index, "", recent=["c4"], limit=2) == ["Brisbane Packaging", "Acme Automation (Omron reseller)"]
+
+
+def test_recent_company_ids_are_read_from_quote_urls():
+    log = pd.DataFrame({
+        "timestamp": ["2025-01-01", "2025-01-03", "2025-01-02", "2025-01-04"],
+        "user_id": ["a", "a", "a", "b"],
+        "quote_url": [f"https://store/backend-portal/customers/companies/{c}/quotes/1" for c in ("c1", "c2", "c1", "c3")],
+    })
+    assert recent_company_ids(log, "a") == ["c2", "c1"]
@@ -0,0 +1,43 @@
+from instrumentation import Metrics
+
+
+def families(text):
+    """(family, type, [sample names]) in order, checking every sample follows its own family's TYPE line."""
+    result = []
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split()
+            result.append((name, kind, []))
+        elif line and not line.startswith("#"):
+            sample = line.split("{")[0].split()[0]
+            family, kind, samples = result[-1]
+            suffixes = ("_bucket", "_sum", "_count") if kind == "histogram" else ("",)
+            assert any(sample == family + suffix for suffix in suffixes), (sample, family)
+            samples.append(sample)
+    return result
+
+
+def test_prometheus_groups_each_family_across_label_sets():
+    metrics = Metrics()
+    metrics.observe("sheet_read", 0.02, nbytes=10, rows=3, worksheet="bundles")
+    metrics.observe("sheet_read", 0.2, error=True, worksheet="quote_log")
+    metrics.observe("addlify_request", 0.1, method="GET", endpoint="x")
+
+    found = families(metrics.to_prometheus())
+    names = [name for name, _, _ in found]
+    assert len(names) == len(set(names)), "a family's TYPE line appears twice"
+    by_name = {name: (kind, samples) for name, kind, samples in found}
+    kind, samples = by_name["sheet_read_seconds"]
+    assert kind == "histogram"
+    assert samples.count("sheet_read_seconds_count") == 2
+    assert by_name["sheet_read_errors_total"] == ("counter", ["sheet_read_errors_total"] * 2)
+
+
+def test_prometheus_values():
+    metrics = Metrics()
+    metrics.observe("sheet_read", 0.02, nbytes=10, worksheet="bundles")
+    metrics.observe("sheet_read", 0.03, nbytes=5, worksheet="bundles")
+    text = metrics.to_prometheus()
+    assert 'sheet_read_seconds_count{worksheet="bundles"} 2' in text
+    assert 'sheet_read_seconds_bucket{worksheet="bundles",le="+Inf"} 2' in text
+    assert 'sheet_read_bytes_total{worksheet="bundles"} 15' in text
@@ -0,0 +1,213 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pandas as pd
+import pytest
+
+import bundle_store
+import job_queue
+import quoting_utils
+from job_queue import DONE, INTERRUPTED, QUEUED, RUNNING, JobQueue
+from quote_journal import QuoteJournal
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+
+def wait(queue, job_id):
+    for _ in range(200):
+        job = queue.get(job_id)
+        if job["status"] in job_queue.FINISHED:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} didn't finish")
+
+
+def add_job(path, status, host, pid, finished_at=None):
+    db = sqlite3.connect(path, isolation_level=None)
+    db.execute("INSERT INTO jobs (id, kind, owner, status, created_at, finished_at, host, pid) "
+               "VALUES (?, 'echo', '', ?, ?, ?, ?, ?)", (f"{status}-{pid}", status, time.time(), finished_at, host, pid))
+    db.close()
+    return f"{status}-{pid}"
+
+
+def test_only_jobs_of_gone_processes_are_interrupted(path):
+    JobQueue(path).shutdown()
+    other = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        gone = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+        host = JobQueue(path).host
+        live = add_job(path, RUNNING, host, other.pid)
+        dead = add_job(path, QUEUED, host, int(gone.stdout))
+        remote = add_job(path, RUNNING, "another-host", other.pid + 1)
+        restarted = add_job(path, RUNNING, host, os.getpid())
+
+        queue = JobQueue(path)
+        assert queue.get(live)["status"] == RUNNING
+        assert queue.get(remote)["status"] == RUNNING
+        assert queue.get(dead)["status"] == INTERRUPTED
+        assert queue.get(restarted)["status"] == INTERRUPTED
+        queue.shutdown()
+    finally:
+        other.kill()
+        other.wait()
+
+
+def test_old_finished_jobs_are_pruned_on_submit(path, monkeypatch):
+    queue = JobQueue(path, keep_finished=60)
+    queue.register("echo", lambda params, context: params)
+    old = add_job(path, DONE, queue.host, 1, finished_at=time.time() - 120)
+    recent = add_job(path, DONE, queue.host, 2, finished_at=time.time())
+
+    wait(queue, queue.submit("echo", {"a": 1}))
+    assert queue.get(old) is not None, "pruned before PRUNE_INTERVAL passed"
+    monkeypatch.setattr(job_queue, "PRUNE_INTERVAL", 0)
+    job_id = queue.submit("echo", {"a": 2})
+    assert queue.get(old) is None
+    assert queue.get(recent) is not None
+    assert wait(queue, job_id)["result"] == {"a": 2}
+    queue.shutdown()
+
+
+class Response:
+    def __init__(self, payload=None):
+        self._payload = payload or {}
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._payload
+
+
+class QuoteAdder:
+    def __init__(self):
+        self.quotes = 0
+
+    def new_quote(self, *args):
+        self.quotes += 1
+        return Response({"quoteId": "Q1"})
+
+    def get_quote_info(self, company_id, quote_id):
+        return {"sections": [{"id": "S1"}]}
+
+    def new_quote_line_item(self, company_id, quote_id, section_id, model_id, price):
+        return Response({"id": f"line-{model_id}"})
+
+    def update_quote_line_item(self, *args):
+        return Response()
+
+
+def test_quote_is_returned_when_logging_it_fails(path, monkeypatch):
+    def log_quote(*args):
+        raise ConnectionError("sheet unavailable")
+
+    monkeypatch.setattr(bundle_store, "log_quote", log_quote)
+    queue = JobQueue(path)
+    queue.register("create_quote", quoting_utils.create_quote_job)
+    adder = QuoteAdder()
+    params = {"company_id": "C1", "title": "Quote", "expiry_date": "2025-02-01", "contact_id": "P1",
+              "lines": [{"dependent_model_id": "M1", "effective_quantity": 1, "unit_price": 10.0,
+                         "min_quantity": 1, "missing_price": False}],
+              "bundle_names": ["Kit"], "total_value": 10.0, "user_id": "a@example.com"}
+    job = wait(queue, queue.submit("create_quote", params, resources={"adder": adder}))
+    queue.shutdown()
+
+    assert job["status"] == DONE
+    assert job["result"]["quote_id"] == "Q1" and job["result"]["log_error"] == "sheet unavailable"
+    assert adder.quotes == 1
+
+
+class Context:
+    def __init__(self, adder):
+        self.resources = {"adder": adder}
+
+    def progress(self, fraction, message=None):
+        pass
+
+
+class SeriesAdder:
+    def __init__(self, models, failing=()):
+        self.models = models
+        self.failing = failing
+
+    def get(self, url, params=None):
+        series = next(name for name in self.models if name in json.dumps(params))
+        if series in self.failing:
+            raise ConnectionError("timed out")
+        return Response({"results": self.models[series]})
+
+
+def test_crawl_replaces_only_the_listed_series(tmp_path):
+    path = str(tmp_path / "models.json")
+    with open(path, "w") as f:
+        json.dump({"nx": [{"id": "old-nx"}], "cj": [{"id": "old-cj"}], "e5": [{"id": "e5"}]}, f)
+    adder = SeriesAdder({"NX": [{"id": "nx-1"}], "CJ": [{"id": "cj-1"}]}, failing=("CJ",))
+    params = {"series_map": {"nx": "NX", "cj": "CJ"}, "path": path}
+
+    with pytest.raises(RuntimeError, match="1 of 2 series"):
+        quoting_utils.crawl_models_job(params, Context(adder))
+    with open(path) as f:
+        assert json.load(f)["nx"] == [{"id": "old-nx"}]
+
+    result = quoting_utils.crawl_models_job(dict(params, allow_partial=True), Context(adder))
+    assert result["series"] == 1 and result["failed"] == [["cj", "timed out"]]
+    with open(path) as f:
+        assert json.load(f) == {"nx": [{"id": "nx-1"}], "cj": [{"id": "old-cj"}], "e5": [{"id": "e5"}]}
+
+
+def test_quote_without_sections_is_returned_with_an_error(path, monkeypatch):
+    monkeypatch.setattr(bundle_store, "log_quote", lambda *args: None)
+    adder = QuoteAdder()
+    adder.get_quote_info = lambda company_id, quote_id: {"sections": []}
+    params = {"company_id": "C1", "title": "Quote", "expiry_date": "2025-02-01", "contact_id": "P1", "lines": [],
+              "bundle_names": ["Kit"], "total_value": 0.0, "user_id": "a@example.com"}
+    result = quoting_utils.create_quote_job(params, Context(adder))
+    assert result["quote_id"] == "Q1" and "no section" in result["error"]
+    assert adder.quotes == 1
+
+
+def test_failed_lines_are_retried_in_a_job(path):
+    journal = QuoteJournal("C1", "Q1", "S1")
+    journal.add_lines(pd.DataFrame([{"dependent_model_id": "M1", "effective_quantity": 2, "unit_price": 10.0,
+                                     "min_quantity": 1, "missing_price": False}]))
+    journal.lines[0].update(status="failed", line_id="line-M1", error="connection reset")
+    queue = JobQueue(path)
+    queue.register("retry_quote_lines", quoting_utils.retry_quote_lines_job)
+    job = wait(queue, queue.submit("retry_quote_lines", {"journal": journal.to_dict()},
+                                   resources={"adder": QuoteAdder()}))
+    queue.shutdown()
+    assert job["status"] == DONE
+    assert QuoteJournal.from_dict(job["result"]).counts()["added"] == 1
+
+
+def test_rebuilt_queue_leaves_the_running_jobs_of_this_process_alone(path):
+    started, release = [], []
+
+    def slow(params, context):
+        started.append(True)
+        deadline = time.time() + 5
+        while not release and time.time() < deadline:
+            time.sleep(0.01)
+        return params
+
+    old = JobQueue(path)
+    old.register("slow", slow)
+    job_id = old.submit("slow", {"a": 1})
+    deadline = time.time() + 2
+    while not started and time.time() < deadline:
+        time.sleep(0.01)
+
+    rebuilt = JobQueue(path)  # e.g. after a st.cache_resource clear, the old pool still runs
+    assert rebuilt.get(job_id)["status"] == RUNNING
+    release.append(True)
+    assert wait(rebuilt, job_id)["status"] == DONE
+    old.shutdown()
+    rebuilt.shutdown()
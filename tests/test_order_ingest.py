@@ -0,0 +1,45 @@
+import asyncio
+import datetime
+
+import pytest
+
+from addlify import parse_order_list
+from order_ingest import OrderStore, ingest_orders
+
+DAY = datetime.date(2024, 1, 1)
+
+
+def test_known_key_wins_over_an_empty_list():
+    orders = [{"id": "o1"}]
+    assert parse_order_list({"errors": [], "orders": orders}) == orders
+    assert parse_order_list({"meta": {"count": 1}, "page": {"results": orders}}) == orders
+    assert parse_order_list({"errors": [], "rows": orders}) == orders
+    assert parse_order_list({"orders": []}) == []
+    with pytest.raises(ValueError):
+        parse_order_list({"errors": []})
+
+
+class Adder:
+    def __init__(self, payload):
+        self.payload = payload
+
+    async def get_orders_by_date(self, start_date, end_date):
+        return parse_order_list(self.payload)
+
+    async def get_order_page(self, order_id):
+        return "<html><body><div class='display-field'><h6>Status</h6><p>Dispatched</p></div></body></html>"
+
+
+def ingest(store, payload):
+    return asyncio.run(ingest_orders(Adder(payload), store, DAY, DAY, window_days=1))
+
+
+def test_window_is_complete_only_when_every_order_was_read(tmp_path):
+    store = OrderStore(str(tmp_path))
+    assert ingest(store, {"errors": []})["orders_failed"] == 1
+    assert ingest(store, [{"id": "o1"}, {"orderNumber": "SO1"}])["orders_fetched"] == 1
+    assert store.completed_windows() == set()
+
+    assert ingest(store, {"errors": [], "orders": [{"id": "o1"}, {"id": "o2"}]})["orders_fetched"] == 1
+    assert store.completed_windows() == {(DAY.isoformat(), DAY.isoformat())}
+    assert sorted(store.read()["order_id"]) == ["o1", "o2"]
@@ -0,0 +1,31 @@
+import pandas as pd
+
+from pricing import list_prices_from_models, price_lines
+
+
+def test_model_listed_in_two_series_has_one_list_price():
+    models = pd.DataFrame([
+        {"id": "M1", "series": "A", "listPrice": 10.0},
+        {"id": "M1", "series": "B", "listPrice": 10.0},
+        {"id": "M2", "series": "B", "listPrice": None},
+        {"id": "M2", "series": "C", "listPrice": 5.0},
+    ])
+    prices = list_prices_from_models(models)
+    assert prices.index.is_unique
+    assert prices.to_dict() == {"M1": 10.0, "M2": 5.0}
+
+    priced = price_lines([{"dependent_model_id": "M1", "quantity": 2}, {"dependent_model_id": "M2", "quantity": 1}],
+                         list_prices=prices)
+    assert priced["line_total"].tolist() == [20.0, 5.0]
+
+
+def test_override_wins_and_minimum_quantity_applies():
+    priced = price_lines([
+        {"dependent_model_id": "M1", "quantity": 1, "min_quantity": 3, "price_override": 8.0},
+        {"dependent_model_id": "M3", "quantity": 1.2},
+    ], list_prices={"M1": 10.0})
+    assert priced["effective_quantity"].tolist() == [3, 2]
+    assert priced["line_total"].tolist() == [24.0, 0.0]
+    assert priced["discount"].iloc[0] == 6.0
+    assert priced["below_min_quantity"].tolist() == [True, False]
+    assert priced["missing_price"].tolist() == [False, True]
@@ -0,0 +1,76 @@
+from quote_diff import apply_quote_diff, diff_quote, existing_lines
+
+
+def payload(model, price=10.0, quantity=1, min_quantity=1):
+    return {"modelId": model, "pricePerUnit": price, "desiredQuantity": quantity, "minimumQuantity": min_quantity}
+
+
+def line(line_id, model, price=10.0, quantity=1, min_quantity=1):
+    return {"line_id": line_id, "section_id": "S1", **payload(model, price, quantity, min_quantity)}
+
+
+def test_only_differing_lines_cost_a_call():
+    delta = diff_quote(
+        [line("l1", "A"), line("l2", "B", quantity=2), line("l3", "C")],
+        [payload("A", price=10.004), payload("B", quantity=3), payload("D")],
+    )
+    assert delta.summary() == {"add": 1, "update": 1, "delete": 1, "unchanged": 1}
+    assert delta.updates[0]["line_id"] == "l2" and delta.updates[0]["payload"]["desiredQuantity"] == 3
+    assert [d["line_id"] for d in delta.deletes] == ["l3"]
+    assert [a["modelId"] for a in delta.adds] == ["D"]
+
+
+def test_model_quoted_twice_keeps_its_matching_line():
+    delta = diff_quote(
+        [line("l1", "A", quantity=1), line("l2", "A", quantity=5)],
+        [payload("A", quantity=5), payload("A", quantity=2)],
+    )
+    assert delta.unchanged == 1
+    assert [(u["line_id"], u["payload"]["desiredQuantity"]) for u in delta.updates] == [("l1", 2)]
+    assert not delta.adds and not delta.deletes
+
+
+def test_existing_lines_default_to_the_last_section():
+    info = {"sections": [
+        {"id": "S0", "lineItems": [{"id": "old", "modelId": "X"}]},
+        {"id": "S1", "lineItems": [{"id": "l1", "modelId": "A", "pricePerUnit": 10.0, "desiredQuantity": 1,
+                                    "minimumQuantity": 1}]},
+    ]}
+    assert existing_lines(info) == [line("l1", "A")]
+    assert existing_lines({"sections": []}) == []
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = "nope" if status_code >= 400 else ""
+
+
+class Adder:
+    def __init__(self):
+        self.calls = []
+
+    def add_item_to_quote(self, company_id, quote_id, section_id, model_id, price, quantity, min_quantity):
+        self.calls.append(("add", model_id))
+        return Response(200), Response(200)
+
+    def update_quote_line_item(self, company_id, quote_id, section_id, line_id, price, quantity, min_quantity):
+        self.calls.append(("update", line_id))
+        return Response(500)
+
+    def delete_quote_line_item(self, company_id, quote_id, section_id, line_id):
+        self.calls.append(("delete", line_id))
+        raise ConnectionError("connection reset")
+
+
+def test_apply_reports_every_call():
+    delta = diff_quote([line("l2", "B", quantity=2), line("l3", "C")], [payload("B", quantity=3), payload("D")])
+    adder = Adder()
+    progress = []
+    results = apply_quote_diff(adder, "C1", "Q1", "S1", delta, on_call=lambda done, total, result: progress.append(done))
+    assert sorted(adder.calls) == [("add", "D"), ("delete", "l3"), ("update", "l2")]
+    by_op = {r["op"]: r for r in results}
+    assert by_op["add"]["error"] is None and by_op["add"]["model_id"] == "D"
+    assert by_op["update"]["status"] == 500 and by_op["update"]["model_id"] == "B"
+    assert by_op["delete"]["error"] == "connection reset" and by_op["delete"]["model_id"] == "C"
+    assert progress == [1, 2, 3]
@@ -0,0 +1,82 @@
+import itertools
+
+import pricing
+from quote_journal import ADDED, FAILED, SKIPPED, QuoteJournal
+
+
+class Response:
+    def __init__(self, status_code=200, payload=None):
+        self.status_code = status_code
+        self._payload = payload or {}
+        self.text = str(self._payload)
+
+    def json(self):
+        return self._payload
+
+
+class FlakyAdder:
+    """Creates lines like the store does; the first `failing_updates` quantity updates raise."""
+
+    def __init__(self, failing_updates=0):
+        self.failing_updates = failing_updates
+        self.created = []
+        self.updated = []
+        self._ids = itertools.count(1)
+
+    def new_quote_line_item(self, company_id, quote_id, section_id, model_id, price):
+        line_id = f"line-{next(self._ids)}"
+        self.created.append((model_id, line_id))
+        return Response(payload={"id": line_id})
+
+    def update_quote_line_item(self, company_id, quote_id, section_id, line_id, price, quantity, min_quantity):
+        if self.failing_updates:
+            self.failing_updates -= 1
+            raise ConnectionError("connection reset")
+        self.updated.append((line_id, quantity))
+        return Response()
+
+    def add_item_to_quote(self, company_id, quote_id, section_id, model_id, price, quantity, min_quantity):
+        added = self.new_quote_line_item(company_id, quote_id, section_id, model_id, price)
+        updated = self.update_quote_line_item(company_id, quote_id, section_id, added.json()["id"], price, quantity,
+                                              min_quantity)
+        return added, updated
+
+
+def journal():
+    priced = pricing.price_lines([
+        {"dependent_model_id": "M1", "quantity": 2, "price_override": 10.0},
+        {"dependent_model_id": "M2", "quantity": 1, "price_override": 5.0},
+        {"dependent_model_id": "M3", "quantity": 1},
+    ])
+    j = QuoteJournal("company", "quote", "section")
+    j.add_lines(priced)
+    return j
+
+
+def test_lines_are_added_and_unpriced_ones_skipped():
+    j = journal()
+    adder = FlakyAdder()
+    assert j.submit(adder) == {"pending": 0, "added": 2, "failed": 0, "skipped": 1}
+    assert [model for model, _ in adder.created] == ["M1", "M2"]
+    assert j.to_frame((SKIPPED,))["dependent_model_id"].tolist() == ["M3"]
+
+
+def test_retry_after_a_failed_update_only_updates():
+    j = journal()
+    adder = FlakyAdder(failing_updates=1)
+    assert j.submit(adder)["failed"] == 1
+    failed = j.failed()[0]
+    assert failed["line_id"] == "line-1" and failed["error"] == "connection reset"
+
+    assert j.submit(adder, retry=True)["failed"] == 0
+    assert [model for model, _ in adder.created] == ["M1", "M2"], "the failed line was added twice"
+    assert ("line-1", 2) in adder.updated
+    assert j.lines[0]["status"] == ADDED and j.lines[0]["attempts"] == 2
+
+
+def test_journal_round_trips_through_a_dict():
+    j = journal()
+    j.submit(FlakyAdder(failing_updates=1))
+    again = QuoteJournal.from_dict(j.to_dict())
+    assert again.counts() == j.counts()
+    assert again.failed()[0]["status"] == FAILED
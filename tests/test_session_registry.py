@@ -0,0 +1,79 @@
+import time
+
+from session_registry import AddlifySessionRegistry
+
+
+class FakeAddlify:
+    """Stands in for a logged in `Addlify`, counting logins and closes."""
+    logins = 0
+
+    def __init__(self, email, password):
+        FakeAddlify.logins += 1
+        self.logged_in = password == "right"
+        self.cookies = []
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_registry(**kwargs):
+    FakeAddlify.logins = 0
+    return AddlifySessionRegistry(session_factory=FakeAddlify, **kwargs)
+
+
+def test_tabs_of_one_user_share_a_session():
+    registry = make_registry()
+    first = registry.acquire("a@example.com", "right", holder="tab1")
+    second = registry.acquire("A@example.com ", "right", holder="tab2")
+    assert first is second
+    assert FakeAddlify.logins == 1
+
+
+def test_logout_in_one_tab_keeps_the_session_for_the_others():
+    registry = make_registry()
+    adder = registry.acquire("a@example.com", "right", holder="tab1")
+    registry.acquire("a@example.com", "right", holder="tab2")
+
+    registry.release("a@example.com", holder="tab1")
+    assert not adder.closed
+    assert registry.acquire("a@example.com", "right", holder="tab2") is adder
+
+    registry.release("a@example.com", holder="tab2")
+    assert adder.closed
+    assert registry.stats()["sessions"] == 0
+
+
+def test_release_without_holders_closes():
+    registry = make_registry()
+    adder = registry.acquire("a@example.com", "right")
+    registry.release("a@example.com")
+    assert adder.closed
+
+
+def test_wrong_password_doesnt_reuse_the_session():
+    registry = make_registry()
+    adder = registry.acquire("a@example.com", "right", holder="tab1")
+    assert registry.acquire("a@example.com", "wrong", holder="tab2") is None
+    assert not adder.closed
+
+
+def test_least_recently_used_sessions_are_evicted_even_when_held():
+    registry = make_registry(max_sessions=1)
+    adder = registry.acquire("a@example.com", "right", holder="tab1")
+    other = registry.acquire("b@example.com", "right", holder="tab2")
+    assert adder.closed
+    assert not other.closed
+
+
+def test_sessions_sending_requests_are_not_idle():
+    registry = make_registry(idle_timeout=60)
+    busy = registry.acquire("a@example.com", "right", holder="tab1")
+    idle = registry.acquire("b@example.com", "right", holder="tab2")
+    for entry in registry._entries.values():
+        entry["last_used"] -= 120  # both logged in two minutes ago
+    busy.last_request = time.time()  # but one is still quoting
+
+    registry.acquire("c@example.com", "right", holder="tab3")
+    assert not busy.closed
+    assert idle.closed
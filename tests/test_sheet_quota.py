@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+import sheet_quota
+from sheet_quota import ANALYTICS, INTERACTIVE, WRITE, SheetQuota
+
+
+class QuotaError(Exception):
+    def __init__(self):
+        super().__init__("429 RESOURCE_EXHAUSTED: Quota exceeded")
+
+
+def test_no_budget_never_waits():
+    quota = SheetQuota({"read": 0})
+    assert all(quota.acquire("read") < 0.01 for _ in range(100))
+    assert quota.stats()[0]["total"] == 100
+
+
+def test_burst_then_waits_for_the_refill():
+    quota = SheetQuota({"read": 600})  # a burst of 150, then one token every 0.1s
+    for _ in range(150):
+        assert quota.acquire("read") < 0.01
+    assert quota.acquire("read") == pytest.approx(0.1, abs=0.05)
+    assert quota.stats()[0]["throttled"] == 1
+
+
+def test_analytics_leave_half_the_burst():
+    quota = SheetQuota({"read": 600})  # a burst of 150, 75 of it kept from analytics
+
+    def analytics_read():
+        with quota.priority(ANALYTICS):
+            quota.acquire("read")
+
+    for _ in range(75):
+        analytics_read()
+    waiter = threading.Thread(target=analytics_read)
+    waiter.start()
+    time.sleep(0.05)
+    assert waiter.is_alive(), "analytics read went into the reserve"
+    assert quota.current_priority() == INTERACTIVE
+    assert quota.acquire("read") < 0.01, "an interactive read waited behind analytics"
+    waiter.join()
+
+
+def test_waiting_writes_go_before_reads():
+    quota = SheetQuota({"read": 600})
+    for _ in range(150):
+        quota.acquire("read")
+    served = []
+
+    def acquire(level, name):
+        with quota.priority(level):
+            quota.acquire("read")
+        served.append(name)
+
+    reader = threading.Thread(target=acquire, args=(INTERACTIVE, "read"))
+    reader.start()
+    time.sleep(0.02)
+    writer = threading.Thread(target=acquire, args=(WRITE, "write"))
+    writer.start()
+    reader.join()
+    writer.join()
+    assert served == ["write", "read"]
+
+
+def test_quota_errors_are_retried_after_a_pause(monkeypatch):
+    monkeypatch.setattr(sheet_quota, "QUOTA_BACKOFF", 0.01)
+    quota = SheetQuota({"write": 600})
+    attempts = []
+
+    def write():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise QuotaError()
+        return "written"
+
+    assert quota.run("write", write, worksheet="bundles") == "written"
+    assert len(attempts) == 3
+    assert quota.stats()[0]["quota_errors"] == 2
+    with pytest.raises(ValueError):
+        quota.run("write", lambda: int("x"))
+
+
+def test_only_rate_limit_answers_are_quota_errors():
+    class Response:
+        status_code = 429
+
+    class APIError(Exception):
+        response = Response()
+
+    assert sheet_quota.is_quota_error(APIError("too many requests"))
+    assert sheet_quota.is_quota_error(QuotaError())
+    assert not sheet_quota.is_quota_error(ValueError("Unable to parse range: bundles!A429"))
+    assert not sheet_quota.is_quota_error(KeyError("bundle 4291 not found"))
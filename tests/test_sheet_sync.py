@@ -0,0 +1,83 @@
+import pandas as pd
+import pytest
+
+from fake_backends import FakeGSheetsConnection
+from sheet_quota import SHEET_QUOTA
+from sheet_sync import IncrementalSheetSync
+
+
+def full_read(conn, worksheet_name):
+    return conn.read(worksheet=worksheet_name, ttl=0)
+
+
+def quote_log(n):
+    return pd.DataFrame({
+        "timestamp": [f"2025-01-{i + 1:02d} 09:00:00" for i in range(n)],
+        "user_id": [f"user{i}@example.com" for i in range(n)],
+        "quote_id": [1000 + i for i in range(n)],
+        "total": [1234.5 * (i + 1) for i in range(n)],
+        "lines": [i % 4 for i in range(n)],
+        "notes": [float("nan") if i % 2 else "rush" for i in range(n)],  # empty cells read as NaN
+    })
+
+
+@pytest.fixture(autouse=True)
+def unlimited_quota():
+    SHEET_QUOTA.configure({"read": 0, "write": 0})
+
+
+def test_appended_rows_parse_like_a_full_read():
+    conn = FakeGSheetsConnection({"quote_log": quote_log(3)})
+    sync = IncrementalSheetSync()
+    sync.read(conn, "quote_log", full_read)
+
+    conn.update(worksheet="quote_log", data=quote_log(8))
+    reads = conn.reads
+    incremental = sync.read(conn, "quote_log", full_read, max_age=0)
+
+    assert conn.reads == reads, "expected only the appended rows to be fetched"
+    pd.testing.assert_frame_equal(incremental, full_read(conn, "quote_log"))
+
+
+def test_nothing_appended_keeps_the_snapshot():
+    conn = FakeGSheetsConnection({"quote_log": quote_log(3)})
+    sync = IncrementalSheetSync()
+    first = sync.read(conn, "quote_log", full_read)
+    reads = conn.reads
+    assert sync.read(conn, "quote_log", full_read, max_age=0).equals(first)
+    assert conn.reads == reads
+
+
+def test_rewritten_rows_fall_back_to_a_full_read():
+    conn = FakeGSheetsConnection({"quote_log": quote_log(3)})
+    sync = IncrementalSheetSync()
+    sync.read(conn, "quote_log", full_read)
+
+    rewritten = quote_log(5)
+    rewritten.loc[2, "timestamp"] = "2024-12-31 09:00:00"
+    conn.update(worksheet="quote_log", data=rewritten)
+    reads = conn.reads
+    pd.testing.assert_frame_equal(sync.read(conn, "quote_log", full_read, max_age=0), rewritten)
+    assert conn.reads == reads + 1
+
+
+def test_numeric_first_column_matches_its_snapshot_key():
+    frame = quote_log(3)[["quote_id", "total"]]
+    conn = FakeGSheetsConnection({"quotes": frame})
+    sync = IncrementalSheetSync()
+    sync.read(conn, "quotes", full_read)
+    assert sync.revision(conn, "quotes", full_read) == sync.revision_of(conn, "quotes", frame)
+
+
+def test_rewrite_keeping_the_count_and_last_row_is_a_change():
+    conn = FakeGSheetsConnection({"quote_log": quote_log(4)})
+    sync = IncrementalSheetSync()
+    frame = sync.read(conn, "quote_log", full_read)
+    base = sync.revision_of(conn, "quote_log", frame)
+
+    # e.g. a compaction dropped a row while a save appended one, or a row was edited in place
+    rewritten = quote_log(4)
+    rewritten.loc[1, "timestamp"] = "2025-02-01 09:00:00"
+    conn.update(worksheet="quote_log", data=rewritten)
+    assert sync.revision(conn, "quote_log", full_read) != base
+    pd.testing.assert_frame_equal(sync.read(conn, "quote_log", full_read, max_age=0), rewritten)
@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return ["bundles"]
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do(("sheet_read", "bundles"), fetch)))
+    leader.start()
+    while not flight.in_flight():
+        pass
+    followers = [threading.Thread(target=lambda: results.append(flight.do(("sheet_read", "bundles"), fetch,
+                                                                          share=list)))
+                 for _ in range(3)]
+    for t in followers:
+        t.start()
+    while flight.stats()["shared"] < 3:
+        pass
+    release.set()
+    for t in [leader] + followers:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == [["bundles"]] * 4
+    assert len({id(r) for r in results}) == 4, "followers asked for copies"
+    assert flight.stats() == {"calls": 1, "shared": 3, "in_flight": 0}
+
+
+def test_errors_reach_every_waiter_and_are_not_kept():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ConnectionError("down")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do(("login", "a"), fail)
+        except ConnectionError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    while flight.stats()["shared"] < 1:
+        pass
+    release.set()
+    leader.join()
+    follower.join()
+    assert len(errors) == 2
+
+    assert flight.do(("login", "a"), lambda: "ok") == "ok"
+    with pytest.raises(KeyError):
+        flight.do(("other",), lambda: {}["missing"])
+    assert flight.in_flight() == 0
+
+
+class CompanyAdder:
+    def __init__(self, email, release):
+        self.email = email
+        self.release = release
+        self.calls = 0
+
+    def get(self, url, headers=None):
+        self.calls += 1
+        self.release.wait(5)
+        return self
+
+    status_code = 200
+
+    def json(self):
+        return {"customerData": {"allCustomers": {"dataSource": [{"customerId": self.email}]}}}
+
+
+def test_company_lists_are_only_shared_by_one_user():
+    import quoting_utils
+
+    release = threading.Event()
+    alice, alice_tab, bob = (CompanyAdder("a@example.com", release), CompanyAdder("A@example.com", release),
+                             CompanyAdder("b@example.com", release))
+    shared = quoting_utils.SINGLE_FLIGHT.stats()["shared"]
+    results = {}
+    threads = [threading.Thread(target=lambda a=a, n=n: results.__setitem__(n, quoting_utils.fetch_all_companies(a)))
+               for n, a in (("alice", alice), ("alice_tab", alice_tab), ("bob", bob))]
+    for t in threads:
+        t.start()
+    deadline = time.monotonic() + 2
+    while (alice.calls + alice_tab.calls + bob.calls < 2 or quoting_utils.SINGLE_FLIGHT.stats()["shared"] == shared) \
+            and time.monotonic() < deadline:
+        pass
+    release.set()
+    for t in threads:
+        t.join()
+    assert alice.calls + alice_tab.calls == 1 and bob.calls == 1
+    assert results["bob"] == [{"customerId": "b@example.com"}]
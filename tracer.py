@@ -0,0 +1,258 @@
+import contextlib
+import cProfile
+import functools
+import inspect
+import json
+import logging
+import logging.handlers
+import os
+import sys
+import threading
+import time
+
+from instrumentation import METRICS
+
+# opt in by naming the trace file, e.g. BUNDLE_QUOTER_TRACE=traces/reruns.jsonl
+TRACE_PATH = os.environ.get("BUNDLE_QUOTER_TRACE")
+SLOW_RERUN = float(os.environ.get("BUNDLE_QUOTER_TRACE_SLOW", "2.0"))  # seconds; slower reruns keep their profile
+# profiling every traced rerun costs time of its own, set to 0 to record only spans
+PROFILE_SLOW = os.environ.get("BUNDLE_QUOTER_TRACE_PROFILE", "1") != "0"
+MAX_TRACE_BYTES = 10 * 1024 * 1024  # the trace file rolls over at this size
+TRACE_BACKUPS = 5  # rolled over files kept, reruns.jsonl.1 .. .5
+MAX_SPANS = 500  # per rerun, so a loop of calls can't blow up one record
+
+NETWORK = "network"  # spans of this kind are counted as network time, everything else as compute
+
+
+def describe(value) -> dict:
+    """Size attributes of a call's result worth tracing: rows, columns and bytes of a DataFrame, len of a list."""
+    pd = sys.modules.get("pandas")
+    if pd is not None and isinstance(value, pd.DataFrame):
+        return {"rows": len(value), "columns": len(value.columns), "bytes": int(value.memory_usage(index=True).sum())}
+    if isinstance(value, (list, tuple, dict)):
+        return {"items": len(value)}
+    return {}
+
+
+class _Run:
+    __slots__ = ("part", "attrs", "started", "spans", "depth", "network_depth", "network", "dropped")
+
+    def __init__(self, part, attrs):
+        self.part = part
+        self.attrs = attrs
+        self.started = time.perf_counter()
+        self.spans = []
+        self.depth = 0
+        self.network_depth = 0  # network spans open, only the outermost one counts towards network time
+        self.network = 0.0
+        self.dropped = 0
+
+
+class Tracer:
+    """
+    Records each Streamlit rerun as a tree of timed spans and appends it as one JSON line to a rolling trace file.
+
+    A rerun is the `rerun` block around a page (or a fragment's own rerun); calls made inside it to instrumented
+    functions (see `install`) become its spans, with the size of what they returned. Each record holds the rerun's
+    wall time split into network time (Addlify requests and Sheets calls) and compute time. Reruns slower than
+    `slow_seconds` are flagged, and if profiling is on their cProfile (or pyinstrument, when installed) profile is
+    written next to the trace file.
+
+    Spans are per thread: work handed to a thread pool or a background job isn't part of the rerun's tree.
+    """
+
+    def __init__(self, path: str, slow_seconds: float = SLOW_RERUN, profile: bool = PROFILE_SLOW,
+                 max_bytes: int = MAX_TRACE_BYTES, backups: int = TRACE_BACKUPS):
+        self.path = path
+        self.slow_seconds = slow_seconds
+        self.profile = profile
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.profile_dir = os.path.join(directory, "profiles")
+        self._local = threading.local()
+        # used directly rather than through a logger, so the app's logging config can't silence the trace
+        self._handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                             encoding="utf-8")
+
+    def _current(self):
+        return getattr(self._local, "run", None)
+
+    @contextlib.contextmanager
+    def rerun(self, part: str, **attrs):
+        """
+        Traces the block as one rerun of `part` (the app or a fragment); inside another rerun it's just a span. The
+        yielded dict takes attributes for the record, e.g. the page; a "page" attribute also names the profile.
+        """
+        if self._current() is not None:
+            with self.span(part, kind="render", **attrs) as span_attrs:
+                yield span_attrs
+            return
+        run = self._local.run = _Run(part, attrs)
+        profiler = self._start_profiler() if self.profile else None
+        try:
+            yield run.attrs
+        finally:
+            self._local.run = None
+            wall = time.perf_counter() - run.started
+            profile_path = self._stop_profiler(profiler, run.attrs.get("page") or part, wall)
+            self._write(run, wall, profile_path)
+
+    @contextlib.contextmanager
+    def span(self, name: str, kind: str = "compute", **attrs):
+        """
+        Times the block as a span of the current rerun; a no-op outside one. The yielded dict can be given more
+        attributes, e.g. the result's size.
+        """
+        run = self._current()
+        if run is None:
+            yield attrs
+            return
+        start = time.perf_counter()
+        record = {"name": name, "kind": kind, "depth": run.depth, "start_ms": round((start - run.started) * 1000, 2)}
+        counted = kind == NETWORK and run.network_depth == 0
+        run.depth += 1
+        run.network_depth += kind == NETWORK
+        error = None
+        try:
+            yield attrs
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            run.depth -= 1
+            run.network_depth -= kind == NETWORK
+            if counted:
+                run.network += elapsed
+            if len(run.spans) < MAX_SPANS:
+                record["ms"] = round(elapsed * 1000, 2)
+                if attrs:
+                    record["attrs"] = attrs
+                if error:
+                    record["error"] = error
+                run.spans.append(record)
+            else:
+                run.dropped += 1
+
+    def wrap(self, fn, name: str, kind: str = "compute"):
+        """`fn` wrapped in a span named `name` that also records the size of its result."""
+        if getattr(fn, "__traced__", False):
+            return fn
+
+        @functools.wraps(fn)
+        def traced(*args, **kwargs):
+            if self._current() is None:
+                return fn(*args, **kwargs)
+            with self.span(name, kind) as attrs:
+                result = fn(*args, **kwargs)
+                attrs.update(describe(result))
+                return result
+        traced.__traced__ = True
+        return traced
+
+    def instrument_module(self, module, kind: str = "compute"):
+        """Wraps the public functions defined in `module`, so calls through the module attribute are spans."""
+        prefix = module.__name__
+        for name, value in list(vars(module).items()):
+            if (not name.startswith("_") and inspect.isfunction(value) and value.__module__ == module.__name__
+                    and not getattr(value, "__traced__", False)):
+                setattr(module, name, self.wrap(value, f"{prefix}.{name}", kind))
+
+    def instrument_class(self, cls, network=(), public: bool = True):
+        """
+        Wraps the methods named in `network` (counted as network time) and, with `public`, every other public
+        method defined on `cls`.
+        """
+        for name, value in list(vars(cls).items()):
+            if not inspect.isfunction(value) or getattr(value, "__traced__", False):
+                continue
+            if name in network:
+                setattr(cls, name, self.wrap(value, f"{cls.__name__}.{name}", NETWORK))
+            elif public and not name.startswith("_"):
+                setattr(cls, name, self.wrap(value, f"{cls.__name__}.{name}"))
+
+    def _start_profiler(self):
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                return None  # another profiler is already running (e.g. a concurrent rerun on Python 3.12+)
+            return profiler
+        profiler = Profiler()
+        profiler.start()
+        return profiler
+
+    def _stop_profiler(self, profiler, part, wall):
+        # returns the written profile's path, only kept for slow reruns
+        if profiler is None:
+            return None
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+        else:
+            profiler.stop()
+        if wall < self.slow_seconds:
+            return None
+        os.makedirs(self.profile_dir, exist_ok=True)
+        stem = os.path.join(self.profile_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{_slug(part)}-{int(wall * 1000)}ms")
+        if isinstance(profiler, cProfile.Profile):
+            profiler.dump_stats(stem + ".prof")  # python -m pstats / snakeviz
+            return stem + ".prof"
+        with open(stem + ".html", "w", encoding="utf-8") as f:
+            f.write(profiler.output_html())
+        return stem + ".html"
+
+    def _write(self, run, wall, profile_path):
+        slow = wall >= self.slow_seconds
+        record = {
+            "ts": time.time(),
+            "part": run.part,
+            "thread": threading.current_thread().name,
+            "wall_ms": round(wall * 1000, 2),
+            "network_ms": round(run.network * 1000, 2),
+            "compute_ms": round((wall - run.network) * 1000, 2),
+            "slow": slow,
+            "profile": profile_path,
+            "attrs": run.attrs,
+            "spans": run.spans,
+            "dropped_spans": run.dropped,
+        }
+        if slow:
+            METRICS.observe("slow_rerun", wall, part=run.part)
+        try:
+            self._handler.handle(logging.makeLogRecord({"msg": json.dumps(record, default=str)}))
+        except Exception:
+            pass  # tracing must never break the page
+
+
+def _slug(text):
+    return "".join(c if c.isalnum() else "_" for c in str(text)).strip("_").lower() or "rerun"
+
+
+_install_lock = threading.Lock()
+
+
+def install(tracer: Tracer):
+    """Instruments bundle_store, quoting_utils, Addlify (requests as network) and the Sheets calls (as network)."""
+    import bundle_store
+    import quoting_utils
+    from addlify import Addlify
+    from sheet_quota import SheetQuota
+
+    with _install_lock:
+        tracer.instrument_module(bundle_store)
+        tracer.instrument_module(quoting_utils)
+        tracer.instrument_class(Addlify, network=("_send",))
+        # every Sheets API request goes through the quota limiter, its wait included
+        tracer.instrument_class(SheetQuota, network=("run",), public=False)
+
+
+# the process-wide tracer, None unless BUNDLE_QUOTER_TRACE is set
+TRACER = Tracer(TRACE_PATH) if TRACE_PATH else None
+
+
+def rerun(part: str, **attrs):
+    """`TRACER.rerun` if tracing is on, else a no-op block."""
+    return TRACER.rerun(part, **attrs) if TRACER is not None else contextlib.nullcontext({})